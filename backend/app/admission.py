@@ -0,0 +1,116 @@
+"""Admission control for DB-backed routes.
+
+Each route declares a class (cheap reads, analytics, writes). A class may only
+have a bounded number of requests doing DB work at once; a request that can't
+get a slot within a short wait is shed with a 503 instead of queueing on the
+connection pool until it times out.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable
+
+# Serve an expired cached response instead of a 503 when one is available
+ADMISSION_SERVE_STALE = os.environ.get("ADMISSION_SERVE_STALE", "1") == "1"
+
+
+@dataclass(frozen=True)
+class RouteClass:
+    name: str
+    max_in_flight: int
+    max_wait: float  # seconds to wait for a slot before shedding
+    statement_timeout_ms: int
+    retry_after: int  # seconds, sent in the Retry-After header
+
+
+def _route_class(name: str, max_in_flight: int, max_wait: float, statement_timeout_ms: int) -> RouteClass:
+    prefix = f"ADMISSION_{name.upper()}"
+    return RouteClass(
+        name=name,
+        max_in_flight=int(os.environ.get(f"{prefix}_MAX_IN_FLIGHT", str(max_in_flight))),
+        max_wait=float(os.environ.get(f"{prefix}_MAX_WAIT", str(max_wait))),
+        statement_timeout_ms=int(os.environ.get(f"{prefix}_STATEMENT_TIMEOUT_MS", str(statement_timeout_ms))),
+        retry_after=int(os.environ.get(f"{prefix}_RETRY_AFTER", "2")),
+    )
+
+
+# Defaults add up to the default pool max_size (10) so admitted work never
+# queues on the pool itself.
+ROUTE_CLASSES: dict[str, RouteClass] = {
+    "read": _route_class("read", max_in_flight=6, max_wait=0.25, statement_timeout_ms=3000),
+    "analytics": _route_class("analytics", max_in_flight=2, max_wait=0.5, statement_timeout_ms=15000),
+    "write": _route_class("write", max_in_flight=2, max_wait=1.0, statement_timeout_ms=5000),
+}
+
+
+class Overloaded(Exception):
+    """Raised when a route class has no free slot; rendered as a 503."""
+
+    def __init__(self, route_class: RouteClass) -> None:
+        super().__init__(f"Too many concurrent {route_class.name} requests")
+        self.route_class = route_class
+
+
+@dataclass(frozen=True)
+class Ticket:
+    """Proof of admission handed to the route; carries its DB settings."""
+
+    route_class: str
+    statement_timeout_ms: int
+
+
+class AdmissionGate:
+    """Bounded in-flight counter with a short wait for a free slot."""
+
+    def __init__(self, route_class: RouteClass) -> None:
+        self.route_class = route_class
+        self._semaphore = asyncio.Semaphore(route_class.max_in_flight)
+        self.in_flight = 0
+        self.shed = 0
+
+    async def acquire(self) -> None:
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.route_class.max_wait)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise Overloaded(self.route_class)
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+_gates: dict[str, AdmissionGate] = {name: AdmissionGate(rc) for name, rc in ROUTE_CLASSES.items()}
+
+
+def get_gate(route_class: str) -> AdmissionGate:
+    """Return the gate for routes that must hold a slot beyond the handler (streams)."""
+    return _gates[route_class]
+
+
+def admit(route_class: str) -> Callable[[], AsyncIterator[Ticket]]:
+    """FastAPI dependency factory: hold a slot of ``route_class`` for the request."""
+    gate = _gates[route_class]
+
+    async def dependency() -> AsyncIterator[Ticket]:
+        await gate.acquire()
+        try:
+            yield Ticket(route_class=route_class, statement_timeout_ms=gate.route_class.statement_timeout_ms)
+        finally:
+            gate.release()
+
+    return dependency
+
+
+def admission_stats() -> dict[str, dict[str, int]]:
+    return {
+        name: {
+            "max_in_flight": gate.route_class.max_in_flight,
+            "in_flight": gate.in_flight,
+            "shed": gate.shed,
+        }
+        for name, gate in _gates.items()
+    }
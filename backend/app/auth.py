@@ -55,7 +55,8 @@ async def get_user_by_api_key(api_key: str) -> dict | None:
         with conn.cursor(row_factory=dict_row) as cursor:
             cursor.execute(
                 """
-                SELECT id, email, subscription_tier, api_quota_monthly, api_calls_used, api_reset_date
+                SELECT id, email, subscription_tier, api_quota_monthly, api_calls_used, api_reset_date,
+                       export_bytes_used, export_reset_date
                 FROM users
                 WHERE api_key = %s
                 """,
@@ -77,7 +78,22 @@ async def get_user_by_api_key(api_key: str) -> dict | None:
                     )
                     conn.commit()
                     user["api_calls_used"] = 0
-                
+
+                # The export allowance is monthly: it restarts on the 1st
+                month_start = date.today().replace(day=1)
+                if user["export_reset_date"] is None or user["export_reset_date"] < month_start:
+                    cursor.execute(
+                        """
+                        UPDATE users
+                        SET export_bytes_used = 0, export_reset_date = %s
+                        WHERE id = %s
+                        """,
+                        (month_start, user["id"]),
+                    )
+                    conn.commit()
+                    user["export_bytes_used"] = 0
+                    user["export_reset_date"] = month_start
+
                 return user
     return None
 
@@ -130,3 +146,27 @@ async def record_api_usage(user_id: UUID | None, api_key: str | None, endpoint:
                 )
             conn.commit()
 
+
+def record_export_usage(user_id: UUID | None, api_key: str | None, endpoint: str, bytes_sent: int) -> None:
+    """Record a bulk export, metered by bytes sent rather than by call."""
+    from app.db import get_connection
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO api_usage (api_key, endpoint, user_id, bytes_sent)
+                VALUES (%s, %s, %s, %s)
+                """,
+                (api_key or "", endpoint, user_id, bytes_sent),
+            )
+            if user_id:
+                cursor.execute(
+                    """
+                    UPDATE users
+                    SET export_bytes_used = export_bytes_used + %s
+                    WHERE id = %s
+                    """,
+                    (bytes_sent, user_id),
+                )
+            conn.commit()
@@ -0,0 +1,111 @@
+"""In-process cache for public, read-only API responses."""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from fastapi import Request
+
+# Chart data only changes once per ingest, so a few minutes of caching is safe.
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", "300"))
+# How long an expired entry may still be served when the DB is overloaded
+CACHE_STALE_SECONDS = float(os.environ.get("CACHE_STALE_SECONDS", "3600"))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "256"))
+
+# Public GET endpoints whose responses don't depend on the caller
+CACHEABLE_PREFIXES = (
+    "/leaderboard",
+    "/trending",
+    "/insights/",
+    "/most-watched",
+    "/podcast/",
+    "/compare",
+)
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    status_code: int = 200
+    media_type: str = "application/json"
+    # Precompressed copies of body keyed by content-coding ("gzip", "br")
+    variants: dict[str, bytes] = field(default_factory=dict)
+    stored_at: float = field(default_factory=time.monotonic)
+
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+
+class ResponseCache:
+    """Bounded LRU of response bodies with a fresh TTL and a longer stale window."""
+
+    def __init__(
+        self,
+        ttl: float = CACHE_TTL_SECONDS,
+        stale_ttl: float = CACHE_STALE_SECONDS,
+        max_entries: int = CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str, max_age: float) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.age() > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                return None
+            if entry.age() > max_age:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def get(self, key: str) -> CachedResponse | None:
+        """Return the entry if it is still fresh."""
+        return self._lookup(key, self.ttl)
+
+    def get_stale(self, key: str) -> CachedResponse | None:
+        """Return the entry even if expired, as long as it is within the stale window."""
+        return self._lookup(key, self.ttl + self.stale_ttl)
+
+    def set(self, key: str, entry: CachedResponse) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def is_cacheable(request: Request) -> bool:
+    return request.method == "GET" and request.url.path.startswith(CACHEABLE_PREFIXES)
+
+
+# Comma-separated list params whose order and duplicates don't change the response
+_SET_PARAMS = {"fields"}
+
+
+def _canonical(name: str, value: str) -> str:
+    if name in _SET_PARAMS:
+        return ",".join(sorted({v.strip() for v in value.split(",") if v.strip()}))
+    return value
+
+
+def cache_key(request: Request) -> str:
+    """Build a key from the path and the query params in a canonical order."""
+    params = sorted((k, _canonical(k, v)) for k, v in request.query_params.multi_items())
+    query = "&".join(f"{k}={v}" for k, v in params)
+    return f"{request.url.path}?{query}"
+
+
+response_cache = ResponseCache()
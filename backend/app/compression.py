@@ -0,0 +1,82 @@
+"""Precompressed response variants and Accept-Encoding negotiation.
+
+Cached chart payloads are identical until the next ingest, so they are
+compressed once when stored and every later hit just picks a variant.
+"""
+from __future__ import annotations
+
+import gzip
+import os
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Below this size the encoding overhead isn't worth it
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+# Fills run on the request path of every cache miss, and keys with free-text
+# search= are rarely hit twice, so stay at fast levels: br-5 is still smaller
+# than gzip-9 at a fraction of br-11's CPU
+GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "5"))
+
+# Server preference when the client accepts several encodings with equal q
+PREFERRED_ENCODINGS = ("br", "gzip")
+
+
+def compress_variants(body: bytes) -> dict[str, bytes]:
+    """Return the encoded variants worth serving for ``body`` (may be empty)."""
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return {}
+
+    variants: dict[str, bytes] = {}
+    gzipped = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(gzipped) < len(body):
+        variants["gzip"] = gzipped
+    if BROTLI_AVAILABLE:
+        brotlied = brotli.compress(body, quality=BROTLI_QUALITY)
+        if len(brotlied) < len(body):
+            variants["br"] = brotlied
+    return variants
+
+
+def parse_accept_encoding(header: str | None) -> dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q}."""
+    accepted: dict[str, float] = {}
+    if not header:
+        return accepted
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header: str | None, available: dict[str, bytes]) -> str | None:
+    """Pick the best available encoding the client accepts, or None for identity."""
+    if not available:
+        return None
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get("*", 0.0)
+
+    best: str | None = None
+    best_q = 0.0
+    for coding in PREFERRED_ENCODINGS:
+        if coding not in available:
+            continue
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
@@ -1,9 +1,11 @@
 """Database connection and utilities."""
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
 from contextlib import contextmanager
-from typing import Iterator
+from typing import Any, Iterator
 
 from dotenv import load_dotenv
 from psycopg import Connection
@@ -12,37 +14,105 @@ from psycopg_pool import ConnectionPool
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Pool sizing and lifecycle (seconds unless noted), tunable per deployment
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_IDLE = float(os.environ.get("DB_POOL_MAX_IDLE", "600"))
+DB_POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", "3600"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_OPEN_TIMEOUT = float(os.environ.get("DB_POOL_OPEN_TIMEOUT", "10"))
+DB_POOL_HEALTH_INTERVAL = float(os.environ.get("DB_POOL_HEALTH_INTERVAL", "60"))
+
+# Per-connection session settings applied by the configure hook
+DB_SEARCH_PATH = os.environ.get("DB_SEARCH_PATH", "public")
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", "15000"))
+# Server-side prepared statements break behind PgBouncer in transaction mode
+# (Supabase pooler on port 6543), so allow turning them off with "none".
+DB_PREPARE_THRESHOLD = os.environ.get("DB_PREPARE_THRESHOLD", "5")
+
 # Connection pool for better performance
 _pool: ConnectionPool | None = None
 
 
-def get_pool() -> ConnectionPool:
-    """Get or create the connection pool."""
+def _configure_connection(conn: Connection) -> None:
+    """Apply session settings to every new connection before it joins the pool."""
+    if DB_PREPARE_THRESHOLD.lower() == "none":
+        conn.prepare_threshold = None
+    else:
+        conn.prepare_threshold = int(DB_PREPARE_THRESHOLD)
+
+    conn.execute("SELECT set_config('search_path', %s, false)", (DB_SEARCH_PATH,))
+    conn.execute(
+        "SELECT set_config('statement_timeout', %s, false)",
+        (str(DB_STATEMENT_TIMEOUT_MS),),
+    )
+    # The pool requires connections to be returned idle, not inside a transaction
+    conn.commit()
+
+
+def open_pool(wait: bool = True) -> ConnectionPool:
+    """Create and open the pool, optionally waiting until min_size connections are ready."""
     global _pool
+    if _pool is not None:
+        return _pool
+
+    DATABASE_URL = os.environ.get("DATABASE_URL")
+    if not DATABASE_URL:
+        raise RuntimeError("DATABASE_URL is required. Please set it in Vercel environment variables.")
+
+    pool = ConnectionPool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=max(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+        max_idle=DB_POOL_MAX_IDLE,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+        timeout=DB_POOL_TIMEOUT,
+        configure=_configure_connection,
+        check=ConnectionPool.check_connection,
+        name="podcharts",
+        open=False,
+    )
+    try:
+        # wait=True blocks until min_size connections are connected and configured,
+        # so a broken DATABASE_URL fails at startup instead of on the first request.
+        pool.open(wait=wait, timeout=DB_POOL_OPEN_TIMEOUT)
+    except Exception as e:
+        # Log the error but don't keep a broken pool
+        pool.close()
+        raise RuntimeError(f"Failed to create database connection pool: {str(e)}")
+
+    _pool = pool
+    return _pool
+
+
+def get_pool() -> ConnectionPool:
+    """Get or create the connection pool.
+
+    The FastAPI lifespan opens the pool at startup; this lazy path remains for
+    runtimes that skip lifespan events (e.g. some serverless adapters).
+    """
     if _pool is None:
-        DATABASE_URL = os.environ.get("DATABASE_URL")
-        if not DATABASE_URL:
-            raise RuntimeError("DATABASE_URL is required. Please set it in Vercel environment variables.")
-        
-        try:
-            _pool = ConnectionPool(
-                DATABASE_URL,
-                min_size=1,
-                max_size=10,
-            )
-            _pool.open()
-        except Exception as e:
-            # Log the error but don't keep a broken pool
-            _pool = None
-            raise RuntimeError(f"Failed to create database connection pool: {str(e)}")
+        return open_pool(wait=False)
     return _pool
 
 
 @contextmanager
-def get_connection() -> Iterator[Connection]:
-    """Get a database connection from the pool."""
+def get_connection(statement_timeout_ms: int | None = None) -> Iterator[Connection]:
+    """Get a database connection from the pool.
+
+    ``statement_timeout_ms`` overrides the session default for the current
+    transaction only (``SET LOCAL`` semantics), so it never leaks to the next user
+    of the connection.
+    """
     pool = get_pool()
     with pool.connection() as conn:
+        if statement_timeout_ms is not None:
+            conn.execute(
+                "SELECT set_config('statement_timeout', %s, true)",
+                (str(statement_timeout_ms),),
+            )
         yield conn
 
 
@@ -53,3 +123,25 @@ def close_pool() -> None:
         _pool.close()
         _pool = None
 
+
+def pool_stats() -> dict[str, Any]:
+    """Return the pool's counters, or an empty dict if the pool isn't open."""
+    if _pool is None:
+        return {}
+    return dict(_pool.get_stats())
+
+
+async def run_pool_health_checks(interval: float = DB_POOL_HEALTH_INTERVAL) -> None:
+    """Periodically probe idle connections and replace the ones that died.
+
+    ``ConnectionPool.check()`` runs the check callback on every idle connection and
+    discards broken ones; the pool refills itself back up to min_size.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        if _pool is None:
+            continue
+        try:
+            await asyncio.to_thread(_pool.check)
+        except Exception as e:
+            logger.warning(f"Database pool health check failed: {type(e).__name__}: {str(e)}")
@@ -0,0 +1,221 @@
+"""Streaming bulk export of metrics history.
+
+Rows are pulled with ``COPY ... TO STDOUT`` one date-range chunk at a time and
+forwarded as they arrive, so memory stays constant regardless of range size.
+Chunks are whole days and rows are ordered by (captured_on, podcast_id): an
+interrupted download can be resumed by dropping the rows of the last day
+received and requesting again with ``from`` set to that day.
+"""
+from __future__ import annotations
+
+import json
+import os
+from contextlib import closing
+from datetime import date, timedelta
+from typing import Any, Callable, Iterator
+
+from app.db import get_connection
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+EXPORT_CHUNK_DAYS = int(os.environ.get("EXPORT_CHUNK_DAYS", "31"))
+EXPORT_MAX_DAYS = int(os.environ.get("EXPORT_MAX_DAYS", "3660"))
+EXPORT_STATEMENT_TIMEOUT_MS = int(os.environ.get("EXPORT_STATEMENT_TIMEOUT_MS", "120000"))
+# Rows buffered per NDJSON write and per Parquet row group
+EXPORT_BATCH_ROWS = int(os.environ.get("EXPORT_BATCH_ROWS", "5000"))
+EXPORT_PARQUET_ROW_GROUP = int(os.environ.get("EXPORT_PARQUET_ROW_GROUP", "50000"))
+
+# Monthly export allowance in bytes, by subscription tier; it restarts on the 1st
+# (users.export_reset_date). An export that reaches it stops at the next row (CSV) or
+# once the current NDJSON batch / Parquet row group is written.
+EXPORT_QUOTA_BYTES = {
+    "pro": int(os.environ.get("EXPORT_QUOTA_BYTES_PRO", str(5 * 1024**3))),
+    "enterprise": int(os.environ.get("EXPORT_QUOTA_BYTES_ENTERPRISE", str(50 * 1024**3))),
+}
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# (column, Postgres type) in output order
+EXPORT_COLUMNS: list[tuple[str, str]] = [
+    ("captured_on", "date"),
+    ("podcast_id", "text"),
+    ("title", "text"),
+    ("publisher", "text"),
+    ("category", "text"),
+    ("country", "text"),
+    ("rank", "int4"),
+    ("delta_7d", "int4"),
+    ("delta_30d", "int4"),
+    ("momentum_score", "float8"),
+]
+
+EXPORT_QUERY = """
+    SELECT m.captured_on, m.podcast_id, p.title, p.publisher, p.category, p.country,
+           m.rank, m.delta_7d, m.delta_30d, m.momentum_score
+    FROM metrics_daily m
+    JOIN podcasts p ON p.id = m.podcast_id
+    WHERE m.captured_on >= %(start)s AND m.captured_on <= %(end)s
+      AND (%(category)s::text IS NULL OR EXISTS (
+        SELECT 1 FROM chart_memberships cm
+        WHERE cm.podcast_id = m.podcast_id AND cm.captured_on = m.captured_on
+          AND cm.chart = %(category)s::text
+      ))
+    ORDER BY m.captured_on, m.podcast_id
+"""
+
+
+def date_chunks(start: date, end: date, days: int = EXPORT_CHUNK_DAYS) -> Iterator[tuple[date, date]]:
+    """Split [start, end] into consecutive inclusive ranges of at most ``days`` days."""
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(end, chunk_start + timedelta(days=days - 1))
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+def _copy_csv(cursor, start: date, end: date, category: str | None, header: bool) -> Iterator[bytes]:
+    statement = f"COPY ({EXPORT_QUERY}) TO STDOUT WITH (FORMAT csv, HEADER {'true' if header else 'false'})"
+    with cursor.copy(statement, {"start": start, "end": end, "category": category}) as copy:
+        for data in copy:
+            yield bytes(data)
+
+
+def _copy_rows(cursor, start: date, end: date, category: str | None) -> Iterator[tuple[Any, ...]]:
+    statement = f"COPY ({EXPORT_QUERY}) TO STDOUT WITH (FORMAT binary)"
+    with cursor.copy(statement, {"start": start, "end": end, "category": category}) as copy:
+        copy.set_types([pg_type for _, pg_type in EXPORT_COLUMNS])
+        yield from copy.rows()
+
+
+def _ndjson(rows: Iterator[tuple[Any, ...]]) -> Iterator[bytes]:
+    names = [name for name, _ in EXPORT_COLUMNS]
+    batch: list[str] = []
+    for row in rows:
+        record = dict(zip(names, row))
+        record["captured_on"] = record["captured_on"].isoformat()
+        batch.append(json.dumps(record))
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            yield ("\n".join(batch) + "\n").encode()
+            batch = []
+    if batch:
+        yield ("\n".join(batch) + "\n").encode()
+
+
+class _ParquetSink:
+    """Write-only file object that hands written bytes back to the stream."""
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data: bytes) -> int:
+        self._buffer.extend(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _parquet_schema() -> "pa.Schema":
+    arrow_types = {"date": pa.date32(), "text": pa.string(), "int4": pa.int32(), "float8": pa.float64()}
+    return pa.schema([(name, arrow_types[pg_type]) for name, pg_type in EXPORT_COLUMNS])
+
+
+def _parquet(rows: Iterator[tuple[Any, ...]]) -> Iterator[bytes]:
+    schema = _parquet_schema()
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+
+    def flush_group(batch: list[tuple[Any, ...]]) -> bytes:
+        columns = list(zip(*batch))
+        writer.write_table(pa.Table.from_arrays([pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+        return sink.drain()
+
+    batch: list[tuple[Any, ...]] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= EXPORT_PARQUET_ROW_GROUP:
+            yield flush_group(batch)
+            batch = []
+    if batch:
+        yield flush_group(batch)
+    writer.close()
+    yield sink.drain()
+
+
+def stream_metrics_export(
+    start: date,
+    end: date,
+    category: str | None,
+    fmt: str,
+    on_complete: Callable[[int], None] | None = None,
+    max_bytes: int | None = None,
+) -> Iterator[bytes]:
+    """Yield the export body in ``fmt``; ``on_complete`` receives the bytes sent.
+
+    Once ``max_bytes`` have been sent the COPY in progress is abandoned: CSV stops
+    after the current row, NDJSON and Parquet after the batch or row group being
+    encoded (a Parquet file is still closed properly). Rows stay whole, so the
+    usual resume from the last day received applies.
+    """
+    bytes_sent = 0
+
+    def over_budget() -> bool:
+        return max_bytes is not None and bytes_sent >= max_bytes
+
+    def csv_data(cursor) -> Iterator[bytes]:
+        for index, (chunk_start, chunk_end) in enumerate(date_chunks(start, end)):
+            # closing() ends the COPY before the connection goes back to the pool
+            with closing(_copy_csv(cursor, chunk_start, chunk_end, category, header=index == 0)) as copy:
+                for data in copy:
+                    if over_budget():
+                        return
+                    yield data
+
+    def rows(cursor) -> Iterator[tuple[Any, ...]]:
+        for chunk_start, chunk_end in date_chunks(start, end):
+            with closing(_copy_rows(cursor, chunk_start, chunk_end, category)) as copy:
+                for row in copy:
+                    if over_budget():
+                        return
+                    yield row
+
+    try:
+        with get_connection(statement_timeout_ms=EXPORT_STATEMENT_TIMEOUT_MS) as conn:
+            with conn.cursor() as cursor:
+                if fmt == "csv":
+                    chunks: Iterator[bytes] = csv_data(cursor)
+                elif fmt == "ndjson":
+                    chunks = _ndjson(rows(cursor))
+                else:
+                    chunks = _parquet(rows(cursor))
+
+                for data in chunks:
+                    if data:
+                        bytes_sent += len(data)
+                        yield data
+    finally:
+        if on_complete is not None:
+            on_complete(bytes_sent)
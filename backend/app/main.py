@@ -1,30 +1,65 @@
 from __future__ import annotations
 
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from datetime import date, timedelta
 from typing import Any
 from uuid import UUID
 
-from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool
 import logging
 
-from app.db import get_connection
-from app.auth import get_current_user, require_auth, require_pro, check_api_quota, record_api_usage
+from app.db import close_pool, get_connection, open_pool, pool_stats, run_pool_health_checks
+from app.auth import (
+    get_current_user,
+    require_auth,
+    require_pro,
+    check_api_quota,
+    record_api_usage,
+    record_export_usage,
+)
+from app.admission import ADMISSION_SERVE_STALE, Overloaded, Ticket, admission_stats, admit, get_gate
+from app.cache import CachedResponse, cache_key, is_cacheable, response_cache
+from app.compression import choose_encoding, compress_variants
+from app.subscriptions import run_stripe_event_worker
+
+# Apply queued Stripe events in-process; disable where a cron runs
+# scripts/process_stripe_events.py instead (e.g. serverless deployments)
+STRIPE_EVENTS_WORKER = os.environ.get("STRIPE_EVENTS_WORKER", "1") == "1"
+# Time the scheduled ingest job has before it is cancelled, for /api/admin/ingest-runs
+INGEST_CRON_WINDOW_SECONDS = float(os.environ.get("INGEST_CRON_WINDOW_SECONDS", "3600"))
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="PodCharts API", version="1.0.0")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open and warm the connection pool and start background workers on startup."""
+    tasks: list[asyncio.Task] = []
+    try:
+        await asyncio.to_thread(open_pool)
+        tasks.append(asyncio.create_task(run_pool_health_checks()))
+    except RuntimeError as e:
+        # Keep serving /health; DB routes will retry the lazy pool on demand
+        logger.error(f"Database pool warm-up failed: {str(e)}")
+    if STRIPE_EVENTS_WORKER:
+        tasks.append(asyncio.create_task(run_stripe_event_worker()))
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.to_thread(close_pool)
+
+
+app = FastAPI(title="PodCharts API", version="1.0.0", lifespan=lifespan)
 
 
 @app.middleware("http")
@@ -32,9 +67,9 @@ async def api_usage_middleware(request: Request, call_next):
     """Track API usage for rate limiting."""
     response = await call_next(request)
     
-    # Track API usage if authenticated
+    # Track API usage if authenticated (exports are metered by bytes instead)
     api_key = request.headers.get("X-API-Key")
-    if api_key and request.url.path.startswith("/api/"):
+    if api_key and request.url.path.startswith("/api/") and not request.url.path.startswith("/api/export/"):
         try:
             user = await get_current_user(api_key=api_key)
             if user:
@@ -47,6 +82,75 @@ async def api_usage_middleware(request: Request, call_next):
     return response
 
 
+def cached_response(request: Request, cached: CachedResponse, cache_status: str, **headers: str) -> Response:
+    """Render a cache entry, picking the precompressed variant the client accepts."""
+    encoding = choose_encoding(request.headers.get("accept-encoding"), cached.variants)
+    response_headers = {"X-Cache": cache_status, "Vary": "Accept-Encoding", **headers}
+    body = cached.body
+    if encoding is not None:
+        body = cached.variants[encoding]
+        response_headers["Content-Encoding"] = encoding
+    return Response(
+        content=body,
+        status_code=cached.status_code,
+        media_type=cached.media_type,
+        headers=response_headers,
+    )
+
+
+@app.middleware("http")
+async def response_cache_middleware(request: Request, call_next):
+    """Serve repeated public chart requests from the in-process cache."""
+    if not is_cacheable(request):
+        return await call_next(request)
+
+    key = cache_key(request)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached_response(request, cached, "HIT")
+
+    response = await call_next(request)
+    # Never re-store a stale copy served under load: it would look fresh again
+    if response.status_code != 200 or response.headers.get("X-Cache") == "STALE":
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    media_type = response.headers.get("content-type", "application/json")
+    # Compress once per cache fill, off the event loop; hits reuse the variants
+    variants = await asyncio.to_thread(compress_variants, body)
+    cached = CachedResponse(body=body, status_code=200, media_type=media_type, variants=variants)
+    response_cache.set(key, cached)
+    return cached_response(request, cached, "MISS")
+
+
+# Added last so it wraps the middlewares above: cached and stale responses are
+# rebuilt there and would otherwise go out without the CORS headers
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load with a fast 503, or serve a stale cached copy if one exists."""
+    if ADMISSION_SERVE_STALE and is_cacheable(request):
+        stale = response_cache.get_stale(cache_key(request))
+        if stale is not None:
+            logger.warning(f"Serving stale response for {request.url.path}: {str(exc)}")
+            return cached_response(request, stale, "STALE", Warning='110 - "Response is Stale"')
+
+    logger.warning(f"Shedding request to {request.url.path}: {str(exc)}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service is busy, please retry shortly"},
+        headers={"Retry-After": str(exc.route_class.retry_after)},
+    )
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint that doesn't require database connection."""
@@ -75,7 +179,12 @@ async def health_db():
             with conn.cursor() as cur:
                 cur.execute("SELECT 1")
                 cur.fetchone()
-        return {"status": "ok", "database": "connected"}
+        return {
+            "status": "ok",
+            "database": "connected",
+            "pool": pool_stats(),
+            "admission": admission_stats(),
+        }
     except RuntimeError as e:
         # DATABASE_URL missing or connection pool error
         logger.error(f"Database health check failed (RuntimeError): {str(e)}")
@@ -99,6 +208,146 @@ async def health_db():
         }
 
 
+# Columns the list endpoints can project with `fields=`: response key -> SQL expression.
+# `id` is always returned so clients can key rows and link to the podcast page.
+LIST_FIELDS: dict[str, str] = {
+    "id": "p.id",
+    "title": "p.title",
+    "publisher": "p.publisher",
+    "category": "p.category",
+    "country": "p.country",
+    "rank": "m.rank",
+    "delta_7d": "m.delta_7d",
+    "delta_30d": "m.delta_30d",
+    "momentum_score": "m.momentum_score",
+}
+
+# Weekly/monthly leaderboards average the daily metrics per podcast
+AGGREGATED_LIST_FIELDS: dict[str, str] = {
+    **LIST_FIELDS,
+    "rank": "AVG(m.rank)::INTEGER",
+    "delta_7d": "AVG(m.delta_7d)::INTEGER",
+    "delta_30d": "AVG(m.delta_30d)::INTEGER",
+    "momentum_score": "AVG(m.momentum_score)",
+}
+
+
+def list_columns(rank_column: str, aggregated: bool = False) -> dict[str, str]:
+    """List columns with `rank` read from ``rank_column`` (see metrics_source)."""
+    if aggregated:
+        return {**AGGREGATED_LIST_FIELDS, "rank": f"AVG({rank_column})::INTEGER"}
+    return {**LIST_FIELDS, "rank": rank_column}
+
+
+FIELDS_DESCRIPTION = f"Comma-separated fields to return (default: all). Allowed: {', '.join(LIST_FIELDS)}"
+
+
+def parse_fields(fields: str | None, allowed: dict[str, str]) -> list[str]:
+    """Validate a `fields=` value against ``allowed`` and return it in canonical order."""
+    if not fields:
+        return list(allowed)
+
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = sorted(requested - allowed.keys())
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}",
+        )
+    return [f for f in allowed if f == "id" or f in requested]
+
+
+def select_list(selected: list[str], columns: dict[str, str]) -> str:
+    return ", ".join(f"{columns[f]} AS {f}" for f in selected)
+
+
+def project_row(row: dict[str, Any], selected: list[str]) -> dict[str, Any]:
+    item = {f: row[f] for f in selected}
+    if item.get("momentum_score") is not None:
+        item["momentum_score"] = float(item["momentum_score"])
+    return item
+
+
+def metrics_source(
+    category: str | None, country: str | None, start: date, end: date
+) -> tuple[str, str, list[Any]]:
+    """FROM clause over metrics_daily ``m`` and podcasts ``p``, plus the rank column to show and sort by.
+
+    With a category or country filter the rows are driven from chart_memberships
+    (indexed by day, chart, country, rank) rather than probing it per metrics row,
+    so a filtered day is one range scan already in chart order and ``cm.rank`` is
+    the rank on that chart. A podcast listed on several matching charts keeps its
+    best rank, so it still comes back once per day.
+    """
+    if not category and not country:
+        return "metrics_daily m JOIN podcasts p ON p.id = m.podcast_id", "m.rank", []
+    conditions = ["captured_on BETWEEN %s AND %s"]
+    params: list[Any] = [start, end]
+    if category:
+        conditions.append("chart = %s")
+        params.append(category)
+    if country:
+        conditions.append("country = %s")
+        params.append(country.lower())
+    where = " AND ".join(conditions)
+    if category and country:
+        # (podcast, day, chart, country) is the primary key: already one row per podcast-day
+        charts = f"SELECT podcast_id, captured_on, rank FROM chart_memberships WHERE {where}"
+    else:
+        charts = (
+            f"SELECT podcast_id, captured_on, MIN(rank) AS rank FROM chart_memberships WHERE {where}"
+            " GROUP BY podcast_id, captured_on"
+        )
+    source = (
+        f"({charts}) cm"
+        " JOIN metrics_daily m ON m.podcast_id = cm.podcast_id AND m.captured_on = cm.captured_on"
+        " JOIN podcasts p ON p.id = m.podcast_id"
+    )
+    return source, "cm.rank", params
+
+
+HISTORY_DAYS_DESCRIPTION = "Days of history; periods past the daily retention window come back as weekly or monthly points"
+
+
+def fetch_history(cursor, podcast_ids: list[str], days: int) -> dict[str, list[dict[str, Any]]]:
+    """Rank history per podcast over the last ``days``, stitched across retention tiers.
+
+    Recent days come from metrics_daily; older periods were compacted into
+    metrics_rollup (scripts/retention.py) and are returned as one point per week
+    or month, dated by the period's first day, with ``granularity`` saying which.
+    A period is stored in exactly one tier, so the union has no overlaps.
+    """
+    today = date.today()
+    cursor.execute(
+        """
+        SELECT podcast_id, captured_on, 'day' AS granularity, rank, delta_7d, delta_30d, momentum_score
+        FROM metrics_daily
+        -- Both bounds, so only the months in range are scanned (monthly partitions)
+        WHERE podcast_id = ANY(%(ids)s) AND captured_on BETWEEN %(start)s AND %(end)s
+        UNION ALL
+        SELECT podcast_id, period_start, grain, ROUND(rank)::INTEGER, ROUND(delta_7d)::INTEGER,
+               ROUND(delta_30d)::INTEGER, momentum_score
+        FROM metrics_rollup
+        WHERE podcast_id = ANY(%(ids)s) AND period_start <= %(end)s AND period_end > %(start)s
+        ORDER BY captured_on, podcast_id
+        """,
+        {"ids": podcast_ids, "start": today - timedelta(days=days), "end": today},
+    )
+    history: dict[str, list[dict[str, Any]]] = {podcast_id: [] for podcast_id in podcast_ids}
+    for row in cursor.fetchall():
+        history[row["podcast_id"]].append(
+            {
+                "date": row["captured_on"].isoformat(),
+                "granularity": row["granularity"],
+                "rank": row["rank"],
+                "delta_7d": row["delta_7d"],
+                "delta_30d": row["delta_30d"],
+                "momentum_score": float(row["momentum_score"]) if row["momentum_score"] is not None else None,
+            }
+        )
+    return history
+
+
 @app.get("/leaderboard")
 async def get_leaderboard(
     category: str | None = Query(None, description="Filter by category"),
@@ -107,54 +356,30 @@ async def get_leaderboard(
     sort_by: str = Query("rank", description="Sort by: rank, momentum, delta_7d, delta_30d"),
     limit: int = Query(100, description="Limit results"),
     search: str | None = Query(None, description="Search by title or publisher"),
+    fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
+    ticket: Ticket = Depends(admit("read")),
 ):
     """Get leaderboard of podcasts with rankings and metrics."""
     from psycopg.rows import dict_row
     
     today = date.today()
+    aggregated = interval in ("weekly", "monthly")
+    selected = parse_fields(fields, AGGREGATED_LIST_FIELDS if aggregated else LIST_FIELDS)
     
     try:
-        with get_connection() as conn:
+        with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
                 # Determine date range based on interval
-                if interval == "weekly":
-                    start_date = today - timedelta(days=7)
-                    query = """
-                        SELECT 
-                            p.id,
-                            p.title,
-                            p.publisher,
-                            p.category,
-                            p.country,
-                            AVG(m.rank)::INTEGER as rank,
-                            AVG(m.delta_7d)::INTEGER as delta_7d,
-                            AVG(m.delta_30d)::INTEGER as delta_30d,
-                            AVG(m.momentum_score) as momentum_score,
-                            MAX(m.captured_on) as captured_on
-                        FROM metrics_daily m
-                        JOIN podcasts p ON p.id = m.podcast_id
+                if aggregated:
+                    start_date = today - timedelta(days=7 if interval == "weekly" else 30)
+                    query_date = today
+                    source, rank_column, params = metrics_source(category, country, start_date, today)
+                    query = f"""
+                        SELECT {select_list(selected, list_columns(rank_column, aggregated=True))}
+                        FROM {source}
                         WHERE m.captured_on >= %s AND m.captured_on <= %s
                     """
-                    params: list[Any] = [start_date, today]
-                elif interval == "monthly":
-                    start_date = today - timedelta(days=30)
-                    query = """
-                        SELECT 
-                            p.id,
-                            p.title,
-                            p.publisher,
-                            p.category,
-                            p.country,
-                            AVG(m.rank)::INTEGER as rank,
-                            AVG(m.delta_7d)::INTEGER as delta_7d,
-                            AVG(m.delta_30d)::INTEGER as delta_30d,
-                            AVG(m.momentum_score) as momentum_score,
-                            MAX(m.captured_on) as captured_on
-                        FROM metrics_daily m
-                        JOIN podcasts p ON p.id = m.podcast_id
-                        WHERE m.captured_on >= %s AND m.captured_on <= %s
-                    """
-                    params: list[Any] = [start_date, today]
+                    params += [start_date, today]
                 else:
                     # For daily interval, try today first, then fall back to latest available date
                     cursor.execute("SELECT MAX(captured_on) as latest_date FROM metrics_daily")
@@ -164,31 +389,13 @@ async def get_leaderboard(
                     # Use latest available date if today has no data
                     query_date = today if latest_date == today else latest_date
                     
-                    query = """
-                        SELECT 
-                            p.id,
-                            p.title,
-                            p.publisher,
-                            p.category,
-                            p.country,
-                            m.rank,
-                            m.delta_7d,
-                            m.delta_30d,
-                            m.momentum_score,
-                            m.captured_on
-                        FROM metrics_daily m
-                        JOIN podcasts p ON p.id = m.podcast_id
+                    source, rank_column, params = metrics_source(category, country, query_date, query_date)
+                    query = f"""
+                        SELECT {select_list(selected, list_columns(rank_column))}
+                        FROM {source}
                         WHERE m.captured_on = %s
                     """
-                    params: list[Any] = [query_date]
-                
-                if category:
-                    query += " AND p.category = %s"
-                    params.append(category)
-                
-                if country:
-                    query += " AND p.country = %s"
-                    params.append(country.lower())
+                    params.append(query_date)
                 
                 if search:
                     query += " AND (p.title ILIKE %s OR p.publisher ILIKE %s)"
@@ -196,24 +403,24 @@ async def get_leaderboard(
                     params.append(search_term)
                     params.append(search_term)
                 
-                if interval in ("weekly", "monthly"):
+                if aggregated:
                     query += " GROUP BY p.id, p.title, p.publisher, p.category, p.country"
                 
                 # Sorting
-                if interval in ("weekly", "monthly"):
+                if aggregated:
                     sort_column = {
-                        "rank": "AVG(m.rank)",
+                        "rank": f"AVG({rank_column})",
                         "momentum": "AVG(m.momentum_score)",
                         "delta_7d": "AVG(m.delta_7d)",
                         "delta_30d": "AVG(m.delta_30d)",
-                    }.get(sort_by, "AVG(m.rank)")
+                    }.get(sort_by, f"AVG({rank_column})")
                 else:
                     sort_column = {
-                        "rank": "m.rank",
+                        "rank": rank_column,
                         "momentum": "m.momentum_score",
                         "delta_7d": "m.delta_7d",
                         "delta_30d": "m.delta_30d",
-                    }.get(sort_by, "m.rank")
+                    }.get(sort_by, rank_column)
                 
                 query += f" ORDER BY {sort_column} ASC NULLS LAST LIMIT %s"
                 params.append(limit)
@@ -221,20 +428,7 @@ async def get_leaderboard(
                 cursor.execute(query, params)
                 rows = cursor.fetchall()
                 
-                items = [
-                    {
-                        "id": row["id"],
-                        "title": row["title"],
-                        "publisher": row["publisher"],
-                        "category": row["category"],
-                        "country": row["country"],
-                        "rank": row["rank"],
-                        "delta_7d": row["delta_7d"],
-                        "delta_30d": row["delta_30d"],
-                        "momentum_score": float(row["momentum_score"]) if row["momentum_score"] is not None else None,
-                    }
-                    for row in rows
-                ]
+                items = [project_row(row, selected) for row in rows]
                 
                 # Use the actual date from the query (might be latest available if today has no data)
                 actual_date = query_date.isoformat() if hasattr(query_date, 'isoformat') else str(query_date)
@@ -248,6 +442,8 @@ async def get_leaderboard(
                     "captured_on": actual_date,
                     "items": items,
                 }
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -258,14 +454,17 @@ async def get_leaderboard(
 async def get_trending(
     category: str | None = Query(None, description="Filter by category"),
     limit: int = Query(20, description="Limit results"),
+    fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
+    ticket: Ticket = Depends(admit("read")),
 ):
     """Get trending podcasts based on momentum and recent growth."""
     from psycopg.rows import dict_row
     
     today = date.today()
+    selected = parse_fields(fields, LIST_FIELDS)
     
     try:
-        with get_connection() as conn:
+        with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
                 # Try today first, then fall back to latest available date
                 cursor.execute("SELECT MAX(captured_on) as latest_date FROM metrics_daily")
@@ -273,33 +472,23 @@ async def get_trending(
                 latest_date = latest_date_row["latest_date"] if latest_date_row and latest_date_row["latest_date"] else today
                 query_date = today if latest_date == today else latest_date
                 
+                source, rank_column, source_params = metrics_source(category, None, query_date, query_date)
+                
                 # First, try to get podcasts with positive momentum/deltas
-                query = """
-                    SELECT 
-                        p.id,
-                        p.title,
-                        p.publisher,
-                        p.category,
-                        p.country,
-                        m.rank,
-                        m.delta_7d,
-                        m.delta_30d,
-                        m.momentum_score,
-                        m.captured_on
-                    FROM metrics_daily m
-                    JOIN podcasts p ON p.id = m.podcast_id
+                query = f"""
+                    SELECT {select_list(selected, list_columns(rank_column))}
+                    FROM {source}
                     WHERE m.captured_on = %s
                     AND (m.momentum_score IS NOT NULL AND m.momentum_score > 0 
                          OR m.delta_7d IS NOT NULL AND m.delta_7d > 0
                          OR m.delta_30d IS NOT NULL AND m.delta_30d > 0)
                 """
-                params: list[Any] = [query_date]
+                params: list[Any] = [*source_params, query_date]
                 
-                if category:
-                    query += " AND p.category = %s"
-                    params.append(category)
-                
-                query += " ORDER BY m.momentum_score DESC NULLS LAST, m.delta_7d DESC NULLS LAST, m.rank ASC LIMIT %s"
+                query += (
+                    f" ORDER BY m.momentum_score DESC NULLS LAST, m.delta_7d DESC NULLS LAST, {rank_column} ASC"
+                    " LIMIT %s"
+                )
                 params.append(limit)
                 
                 cursor.execute(query, params)
@@ -307,54 +496,22 @@ async def get_trending(
                 
                 # If no trending data (first day), show top-ranked podcasts instead
                 if not rows:
-                    query = """
-                        SELECT 
-                            p.id,
-                            p.title,
-                            p.publisher,
-                            p.category,
-                            p.country,
-                            m.rank,
-                            m.delta_7d,
-                            m.delta_30d,
-                            m.momentum_score,
-                            m.captured_on
-                        FROM metrics_daily m
-                        JOIN podcasts p ON p.id = m.podcast_id
+                    query = f"""
+                        SELECT {select_list(selected, list_columns(rank_column))}
+                        FROM {source}
                         WHERE m.captured_on = %s
                     """
-                    params = [query_date]
-                    
-                    if category:
-                        query += " AND p.category = %s"
-                        params.append(category)
+                    params = [*source_params, query_date]
                     
-                    query += " ORDER BY m.rank ASC LIMIT %s"
+                    query += f" ORDER BY {rank_column} ASC LIMIT %s"
                     params.append(limit)
                     
                     cursor.execute(query, params)
                     rows = cursor.fetchall()
                 
-                items = [
-                    {
-                        "id": row["id"],
-                        "title": row["title"],
-                        "publisher": row["publisher"],
-                        "category": row["category"],
-                        "country": row["country"],
-                        "rank": row["rank"],
-                        "delta_7d": row["delta_7d"],
-                        "delta_30d": row["delta_30d"],
-                        "momentum_score": float(row["momentum_score"]) if row["momentum_score"] is not None else None,
-                    }
-                    for row in rows
-                ]
+                items = [project_row(row, selected) for row in rows]
                 
                 # Use the actual date from the query
-                cursor.execute("SELECT MAX(captured_on) as latest_date FROM metrics_daily")
-                latest_date_row = cursor.fetchone()
-                latest_date = latest_date_row["latest_date"] if latest_date_row and latest_date_row["latest_date"] else today
-                query_date = today if latest_date == today else latest_date
                 actual_date = query_date.isoformat() if hasattr(query_date, 'isoformat') else str(query_date)
                 
                 return {
@@ -362,6 +519,8 @@ async def get_trending(
                     "captured_on": actual_date,
                     "items": items,
                 }
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -375,6 +534,7 @@ async def get_monthly_insights(
     category: str | None = Query(None, description="Filter by category"),
     country: str | None = Query(None, description="Filter by country"),
     limit: int = Query(50, description="Limit results"),
+    ticket: Ticket = Depends(admit("analytics")),
 ):
     """Get monthly insights for top podcasts in a specific month."""
     from psycopg.rows import dict_row
@@ -390,39 +550,31 @@ async def get_monthly_insights(
         last_day = monthrange(year, month)[1]
         end_date = date(year, month, last_day)
         
-        with get_connection() as conn:
+        with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
                 # Get top podcasts by average rank for the month
-                query = """
+                source, rank_column, params = metrics_source(category, country, start_date, end_date)
+                query = f"""
                     SELECT 
                         p.id,
                         p.title,
                         p.publisher,
                         p.category,
                         p.country,
-                        AVG(m.rank)::INTEGER as avg_rank,
-                        MIN(m.rank)::INTEGER as best_rank,
-                        MAX(m.rank)::INTEGER as worst_rank,
+                        AVG({rank_column})::INTEGER as avg_rank,
+                        MIN({rank_column})::INTEGER as best_rank,
+                        MAX({rank_column})::INTEGER as worst_rank,
                         AVG(m.delta_7d)::INTEGER as avg_delta_7d,
                         AVG(m.delta_30d)::INTEGER as avg_delta_30d,
                         AVG(m.momentum_score) as avg_momentum,
                         MAX(m.momentum_score) as peak_momentum,
                         COUNT(m.captured_on) as days_tracked
-                    FROM metrics_daily m
-                    JOIN podcasts p ON p.id = m.podcast_id
+                    FROM {source}
                     WHERE m.captured_on >= %s AND m.captured_on <= %s
                 """
-                params: list[Any] = [start_date, end_date]
-                
-                if category:
-                    query += " AND p.category = %s"
-                    params.append(category)
-                
-                if country:
-                    query += " AND p.country = %s"
-                    params.append(country.lower())
+                params += [start_date, end_date]
                 
-                query += """
+                query += f"""
                     GROUP BY p.id, p.title, p.publisher, p.category, p.country
                     HAVING COUNT(m.captured_on) >= 5  -- At least 5 days of data
                     ORDER BY avg_rank ASC
@@ -504,6 +656,7 @@ async def get_weekly_insights(
     category: str | None = Query(None, description="Filter by category"),
     country: str | None = Query(None, description="Filter by country"),
     limit: int = Query(50, description="Limit results"),
+    ticket: Ticket = Depends(admit("analytics")),
 ):
     """Get weekly insights for top podcasts in a specific week."""
     from psycopg.rows import dict_row
@@ -529,39 +682,31 @@ async def get_weekly_insights(
         if week_start.year != year:
             raise HTTPException(status_code=400, detail=f"Week {week} doesn't exist in year {year}")
         
-        with get_connection() as conn:
+        with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
                 # Get top podcasts by average rank for the week
-                query = """
+                source, rank_column, params = metrics_source(category, country, week_start, week_end)
+                query = f"""
                     SELECT 
                         p.id,
                         p.title,
                         p.publisher,
                         p.category,
                         p.country,
-                        AVG(m.rank)::INTEGER as avg_rank,
-                        MIN(m.rank)::INTEGER as best_rank,
-                        MAX(m.rank)::INTEGER as worst_rank,
+                        AVG({rank_column})::INTEGER as avg_rank,
+                        MIN({rank_column})::INTEGER as best_rank,
+                        MAX({rank_column})::INTEGER as worst_rank,
                         AVG(m.delta_7d)::INTEGER as avg_delta_7d,
                         AVG(m.delta_30d)::INTEGER as avg_delta_30d,
                         AVG(m.momentum_score) as avg_momentum,
                         MAX(m.momentum_score) as peak_momentum,
                         COUNT(m.captured_on) as days_tracked
-                    FROM metrics_daily m
-                    JOIN podcasts p ON p.id = m.podcast_id
+                    FROM {source}
                     WHERE m.captured_on >= %s AND m.captured_on <= %s
                 """
-                params: list[Any] = [week_start, week_end]
+                params += [week_start, week_end]
                 
-                if category:
-                    query += " AND p.category = %s"
-                    params.append(category)
-                
-                if country:
-                    query += " AND p.country = %s"
-                    params.append(country.lower())
-                
-                query += """
+                query += f"""
                     GROUP BY p.id, p.title, p.publisher, p.category, p.country
                     HAVING COUNT(m.captured_on) >= 3  -- At least 3 days of data
                     ORDER BY avg_rank ASC
@@ -643,6 +788,7 @@ async def get_most_watched(
     country: str | None = Query(None, description="Filter by country"),
     limit: int = Query(50, description="Limit results"),
     sort_by: str = Query("listen_time", description="Sort by: listen_time, listeners, engagement_score, new_episodes"),
+    ticket: Ticket = Depends(admit("analytics")),
 ):
     """Get most watched podcasts for a specific time period based on listen time metrics."""
     from psycopg.rows import dict_row
@@ -662,7 +808,7 @@ async def get_most_watched(
         }
         sort_column = sort_column_map[sort_by]
         
-        with get_connection() as conn:
+        with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
                 query = """
                     SELECT 
@@ -748,12 +894,16 @@ async def get_most_watched(
 
 
 @app.get("/podcast/{podcast_id}")
-async def get_podcast(podcast_id: str):
+async def get_podcast(
+    podcast_id: str,
+    days: int = Query(90, ge=1, le=3650, description=HISTORY_DAYS_DESCRIPTION),
+    ticket: Ticket = Depends(admit("read")),
+):
     """Get podcast details and historical rank data."""
     from psycopg.rows import dict_row
     
     try:
-        with get_connection() as conn:
+        with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
                 cursor.execute(
                     """
@@ -768,28 +918,7 @@ async def get_podcast(podcast_id: str):
                 if not podcast:
                     raise HTTPException(status_code=404, detail="Podcast not found")
                 
-                cutoff = date.today() - timedelta(days=90)
-                cursor.execute(
-                    """
-                    SELECT captured_on, rank, delta_7d, delta_30d, momentum_score
-                    FROM metrics_daily
-                    WHERE podcast_id = %s AND captured_on >= %s
-                    ORDER BY captured_on ASC
-                    """,
-                    (podcast_id, cutoff),
-                )
-                history_rows = cursor.fetchall()
-                
-                history = [
-                    {
-                        "date": row["captured_on"].isoformat(),
-                        "rank": row["rank"],
-                        "delta_7d": row["delta_7d"],
-                        "delta_30d": row["delta_30d"],
-                        "momentum_score": float(row["momentum_score"]) if row["momentum_score"] is not None else None,
-                    }
-                    for row in history_rows
-                ]
+                history = fetch_history(cursor, [podcast_id], days)[podcast_id]
                 
                 return {
                     "id": podcast["id"],
@@ -813,12 +942,14 @@ async def get_podcast(podcast_id: str):
 async def compare_podcasts(
     id1: str = Query(..., description="First podcast ID"),
     id2: str = Query(..., description="Second podcast ID"),
+    days: int = Query(90, ge=1, le=3650, description=HISTORY_DAYS_DESCRIPTION),
+    ticket: Ticket = Depends(admit("read")),
 ):
     """Compare two podcasts side-by-side with historical data."""
     from psycopg.rows import dict_row
     
     try:
-        with get_connection() as conn:
+        with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
             with conn.cursor(row_factory=dict_row) as cursor:
                 cursor.execute(
                     """
@@ -835,33 +966,7 @@ async def compare_podcasts(
                 if id2 not in podcasts:
                     raise HTTPException(status_code=404, detail=f"Podcast {id2} not found")
                 
-                cutoff = date.today() - timedelta(days=90)
-                cursor.execute(
-                    """
-                    SELECT podcast_id, captured_on, rank, delta_7d, delta_30d, momentum_score
-                    FROM metrics_daily
-                    WHERE podcast_id IN (%s, %s) AND captured_on >= %s
-                    ORDER BY captured_on ASC, podcast_id
-                    """,
-                    (id1, id2, cutoff),
-                )
-                rows = cursor.fetchall()
-                
-                series1: list[dict[str, Any]] = []
-                series2: list[dict[str, Any]] = []
-                
-                for row in rows:
-                    point = {
-                        "date": row["captured_on"].isoformat(),
-                        "rank": row["rank"],
-                        "delta_7d": row["delta_7d"],
-                        "delta_30d": row["delta_30d"],
-                        "momentum_score": float(row["momentum_score"]) if row["momentum_score"] is not None else None,
-                    }
-                    if row["podcast_id"] == id1:
-                        series1.append(point)
-                    else:
-                        series2.append(point)
+                history = fetch_history(cursor, [id1, id2], days)
                 
                 return {
                     "id1": id1,
@@ -879,8 +984,8 @@ async def compare_podcasts(
                         "category": podcasts[id2]["category"],
                     },
                     "series": [
-                        {"podcast_id": id1, "data": series1},
-                        {"podcast_id": id2, "data": series2},
+                        {"podcast_id": id1, "data": history[id1]},
+                        {"podcast_id": id2, "data": history[id2]},
                     ],
                 }
     except HTTPException:
@@ -894,11 +999,11 @@ async def compare_podcasts(
 # ========== AUTHENTICATED ENDPOINTS ==========
 
 @app.get("/api/user/me")
-async def get_user_profile(user: dict = Depends(require_auth)):
+async def get_user_profile(user: dict = Depends(require_auth), ticket: Ticket = Depends(admit("read"))):
     """Get current user profile."""
     from psycopg.rows import dict_row
     
-    with get_connection() as conn:
+    with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
         with conn.cursor(row_factory=dict_row) as cursor:
             cursor.execute(
                 """
@@ -928,16 +1033,21 @@ async def get_user_profile(user: dict = Depends(require_auth)):
 
 
 @app.get("/api/user/watchlist")
-async def get_watchlist(user: dict = Depends(require_auth)):
+async def get_watchlist(
+    fields: str | None = Query(None, description=FIELDS_DESCRIPTION),
+    user: dict = Depends(require_auth),
+    ticket: Ticket = Depends(admit("read")),
+):
     """Get user's watchlist."""
     from psycopg.rows import dict_row
     
-    with get_connection() as conn:
+    selected = parse_fields(fields, LIST_FIELDS)
+    
+    with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
         with conn.cursor(row_factory=dict_row) as cursor:
             cursor.execute(
-                """
-                SELECT p.id, p.title, p.publisher, p.category, p.country,
-                       m.rank, m.delta_7d, m.delta_30d, m.momentum_score
+                f"""
+                SELECT {select_list(selected, LIST_FIELDS)}
                 FROM user_watchlists w
                 JOIN podcasts p ON p.id = w.podcast_id
                 LEFT JOIN metrics_daily m ON m.podcast_id = p.id AND m.captured_on = CURRENT_DATE
@@ -949,29 +1059,20 @@ async def get_watchlist(user: dict = Depends(require_auth)):
             rows = cursor.fetchall()
             
             return {
-                "items": [
-                    {
-                        "id": row["id"],
-                        "title": row["title"],
-                        "publisher": row["publisher"],
-                        "category": row["category"],
-                        "country": row["country"],
-                        "rank": row["rank"],
-                        "delta_7d": row["delta_7d"],
-                        "delta_30d": row["delta_30d"],
-                        "momentum_score": float(row["momentum_score"]) if row["momentum_score"] is not None else None,
-                    }
-                    for row in rows
-                ],
+                "items": [project_row(row, selected) for row in rows],
             }
 
 
 @app.post("/api/user/watchlist/{podcast_id}")
-async def add_to_watchlist(podcast_id: str, user: dict = Depends(require_auth)):
+async def add_to_watchlist(
+    podcast_id: str,
+    user: dict = Depends(require_auth),
+    ticket: Ticket = Depends(admit("write")),
+):
     """Add podcast to user's watchlist."""
     from psycopg.rows import dict_row
     
-    with get_connection() as conn:
+    with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
         with conn.cursor(row_factory=dict_row) as cursor:
             # Verify podcast exists
             cursor.execute("SELECT id FROM podcasts WHERE id = %s", (podcast_id,))
@@ -996,9 +1097,13 @@ async def add_to_watchlist(podcast_id: str, user: dict = Depends(require_auth)):
 
 
 @app.delete("/api/user/watchlist/{podcast_id}")
-async def remove_from_watchlist(podcast_id: str, user: dict = Depends(require_auth)):
+async def remove_from_watchlist(
+    podcast_id: str,
+    user: dict = Depends(require_auth),
+    ticket: Ticket = Depends(admit("write")),
+):
     """Remove podcast from user's watchlist."""
-    with get_connection() as conn:
+    with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
         with conn.cursor() as cursor:
             cursor.execute(
                 "DELETE FROM user_watchlists WHERE user_id = %s AND podcast_id = %s",
@@ -1009,12 +1114,12 @@ async def remove_from_watchlist(podcast_id: str, user: dict = Depends(require_au
 
 
 @app.get("/api/user/api-key")
-async def get_api_key(user: dict = Depends(require_auth)):
+async def get_api_key(user: dict = Depends(require_auth), ticket: Ticket = Depends(admit("write"))):
     """Get or generate API key for user."""
     from psycopg.rows import dict_row
     import secrets
     
-    with get_connection() as conn:
+    with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
         with conn.cursor(row_factory=dict_row) as cursor:
             cursor.execute("SELECT api_key FROM users WHERE id = %s", (user["id"],))
             user_data = cursor.fetchone()
@@ -1045,192 +1150,135 @@ async def create_checkout_session(user: dict = Depends(require_auth), tier: str
 
 
 @app.post("/api/subscriptions/webhook")
-async def stripe_webhook(request: Request):
-    """Handle Stripe webhook events."""
-    from app.subscriptions import handle_webhook, update_user_subscription
-    from app.db import get_connection
-    from fastapi.responses import JSONResponse
-    import json
-    
-    event = None
-    event_type = None
-    
+async def stripe_webhook(request: Request, ticket: Ticket = Depends(admit("write"))):
+    """Verify and queue a Stripe webhook event; the worker applies it.
+
+    Events are stored by event id, so Stripe's retries of an event we already
+    have are acknowledged without being applied twice.
+    """
+    from app.subscriptions import enqueue_stripe_event, handle_webhook, notify_stripe_worker
+
+    payload = await request.body()
+    signature = request.headers.get("stripe-signature")
+    if not signature:
+        logger.warning("Missing stripe-signature header")
+        raise HTTPException(status_code=400, detail="Missing stripe-signature header")
+
     try:
-        payload = await request.body()
-        signature = request.headers.get("stripe-signature")
-        
-        logger.info(f"Received webhook request, signature: {signature[:20] if signature else 'None'}...")
-        
-        # Handle webhook signature verification
-        if not signature:
-            logger.warning("Missing stripe-signature header")
-            raise HTTPException(status_code=400, detail="Missing stripe-signature header")
-        
-        logger.info(f"Processing webhook with signature: {signature[:20]}...")
-        try:
-            event = handle_webhook(payload, signature)
-            event_type = event.get("type", "unknown")
-            logger.info(f"Webhook event type: {event_type}")
-        except ValueError as e:
-            logger.error(f"Webhook signature verification failed: {str(e)}")
-            raise HTTPException(status_code=400, detail=f"Invalid webhook signature: {str(e)}")
-        
-        # Checkout completed - new subscription created
-        if event_type == "checkout.session.completed":
-            session = event["data"]["object"]
-            # Only process if client_reference_id exists (real checkout, not test)
-            if session.get("client_reference_id"):
-                try:
-                    user_id = UUID(session["client_reference_id"])
-                    tier = session.get("metadata", {}).get("tier", "pro")
-                    subscription_id = session.get("subscription")
-                    if subscription_id:
-                        update_user_subscription(user_id, subscription_id, tier, "active")
-                except (ValueError, KeyError) as e:
-                    # Skip if user_id is invalid or missing
-                    pass
-        
-        # Subscription created/updated
-        elif event_type == "customer.subscription.created":
-            subscription = event["data"]["object"]
-            # Get user from customer metadata or subscription metadata
-            # For now, we'll handle this via checkout.session.completed
-            pass
-        
-        # Subscription updated (plan change, renewal, etc.)
-        elif event_type == "customer.subscription.updated":
-            subscription = event["data"]["object"]
-            subscription_id = subscription.get("id")
-            # Find user by subscription_id stored in database
-            with get_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Get tier from subscription metadata or price
-                    tier = subscription.get("metadata", {}).get("tier", "pro")
-                    status = subscription.get("status", "active")
-                    
-                    # Update user subscription
-                    from datetime import datetime
-                    expires_at = datetime.fromtimestamp(subscription.get("current_period_end", 0))
-                    quota = {"free": 1000, "pro": 10000, "enterprise": 100000}.get(tier, 1000)
-                    
-                    cursor.execute(
-                        """
-                        UPDATE users
-                        SET subscription_tier = %s,
-                            subscription_status = %s,
-                            subscription_expires_at = %s,
-                            api_quota_monthly = %s,
-                            updated_at = now()
-                        WHERE subscription_id = %s
-                        """,
-                        (tier, status, expires_at, quota, subscription_id),
-                    )
-                    conn.commit()
-        
-        # Subscription deleted/cancelled
-        elif event_type == "customer.subscription.deleted":
-            subscription = event["data"]["object"]
-            subscription_id = subscription.get("id")
-            # Downgrade user to free tier
-            with get_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        UPDATE users
-                        SET subscription_tier = 'free',
-                            subscription_status = 'cancelled',
-                            subscription_id = NULL,
-                            subscription_expires_at = NULL,
-                            api_quota_monthly = 1000,
-                            updated_at = now()
-                        WHERE subscription_id = %s
-                        """,
-                        (subscription_id,),
-                    )
-                    conn.commit()
-        
-        # Payment succeeded - subscription renewed
-        elif event_type == "invoice.payment_succeeded":
-            invoice = event["data"]["object"]
-            subscription_id = invoice.get("subscription")
-            if subscription_id:
-                # Subscription payment succeeded, ensure it's active
-                with get_connection() as conn:
-                    with conn.cursor() as cursor:
-                        cursor.execute(
-                            """
-                            UPDATE users
-                            SET subscription_status = 'active',
-                                updated_at = now()
-                            WHERE subscription_id = %s
-                            """,
-                            (subscription_id,),
-                        )
-                        conn.commit()
-        
-        # Payment failed - subscription at risk
-        elif event_type == "invoice.payment_failed":
-            invoice = event["data"]["object"]
-            subscription_id = invoice.get("subscription")
-            if subscription_id:
-                # Mark subscription as past_due
-                with get_connection() as conn:
-                    with conn.cursor() as cursor:
-                        cursor.execute(
-                            """
-                            UPDATE users
-                            SET subscription_status = 'past_due',
-                                updated_at = now()
-                            WHERE subscription_id = %s
-                            """,
-                            (subscription_id,),
-                        )
-                        conn.commit()
-        
-        # Customer updated
-        elif event_type == "customer.updated":
-            customer = event["data"]["object"]
-            # Handle customer updates if needed
-            pass
-        
-        # Return 200 OK for all events (even if we don't handle them)
-        # This prevents Stripe from retrying
-        return JSONResponse(content={"status": "success", "event": event_type}, status_code=200)
+        event = handle_webhook(payload, signature)
     except ValueError as e:
-        # Invalid webhook signature or payload
-        logger.error(f"ValueError in webhook handler: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=400, detail=str(e))
-    except HTTPException:
-        # Re-raise HTTP exceptions (like 400 for missing signature)
-        raise
+        logger.error(f"Webhook signature verification failed: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid webhook signature: {str(e)}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    try:
+        created = await asyncio.to_thread(enqueue_stripe_event, event, ticket.statement_timeout_ms)
     except Exception as e:
-        # Log other errors but still return 200 to prevent retries
-        logger.error(f"Exception in webhook handler: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        # Return 200 OK even on error to prevent Stripe retries
-        # Log the error for debugging
+        # Not persisted: a non-2xx makes Stripe retry delivery later
+        logger.error(f"Failed to queue Stripe event {event['id']}: {type(e).__name__}: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to queue event")
+
+    if created:
+        notify_stripe_worker()
+    logger.info(f"Webhook event {event['id']} ({event['type']}) {'queued' if created else 'duplicate'}")
+    return JSONResponse(
+        content={"status": "queued" if created else "duplicate", "event": event["type"]},
+        status_code=200,
+    )
+
+
+@app.get("/api/export/metrics")
+async def export_metrics(
+    from_date: date = Query(..., alias="from", description="First day (YYYY-MM-DD)"),
+    to_date: date = Query(..., alias="to", description="Last day (YYYY-MM-DD)"),
+    category: str | None = Query(None, description="Filter by category"),
+    format: str = Query("csv", description="Output format: csv, parquet, ndjson"),
+    user: dict = Depends(require_pro),
+    api_key: str | None = Header(None, alias="X-API-Key"),
+):
+    """Stream daily metrics joined to podcasts (Pro/Enterprise only).
+
+    Usage is metered by bytes sent. Rows are ordered by (captured_on, podcast_id);
+    to resume an interrupted download, drop the last day received and request
+    again from that day.
+    """
+    from app.export import (
+        EXPORT_CHUNK_DAYS,
+        EXPORT_FORMATS,
+        EXPORT_MAX_DAYS,
+        EXPORT_QUOTA_BYTES,
+        PYARROW_AVAILABLE,
+        stream_metrics_export,
+    )
+
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if format == "parquet" and not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Parquet export is not available on this server")
+    if from_date > to_date:
+        raise HTTPException(status_code=400, detail="'from' must be on or before 'to'")
+    if (to_date - from_date).days + 1 > EXPORT_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Export range is limited to {EXPORT_MAX_DAYS} days")
+
+    quota = EXPORT_QUOTA_BYTES.get(user.get("subscription_tier"), 0)
+    remaining = quota - (user.get("export_bytes_used") or 0)
+    if remaining <= 0:
+        raise HTTPException(status_code=429, detail="Export quota exhausted for this month")
+
+    user_id = UUID(user["id"]) if isinstance(user["id"], str) else user["id"]
+
+    def on_complete(bytes_sent: int) -> None:
         try:
-            event_type_str = event_type or (event.get("type") if event else "unknown")
-        except:
-            event_type_str = "unknown"
-        
-        return JSONResponse(
-            content={"status": "error", "event": event_type_str, "error": str(e)},
-            status_code=200
-        )
+            record_export_usage(user_id, api_key, "/api/export/metrics", bytes_sent)
+        except Exception as e:
+            logger.error(f"Failed to record export usage: {type(e).__name__}: {str(e)}")
+
+    # Exports hold a DB connection for the whole stream, so they keep an
+    # analytics slot until the last byte is sent, not just until we return.
+    gate = get_gate("analytics")
+    await gate.acquire()
+    released = False
+
+    async def release() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            gate.release()
+
+    async def body():
+        try:
+            async for chunk in iterate_in_threadpool(
+                stream_metrics_export(
+                    from_date, to_date, category, format, on_complete=on_complete, max_bytes=remaining
+                )
+            ):
+                yield chunk
+        finally:
+            await release()
+
+    filename = f"podcharts_metrics_{from_date.isoformat()}_{to_date.isoformat()}.{format}"
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Chunk-Days": str(EXPORT_CHUNK_DAYS),
+            "X-Export-Bytes-Remaining": str(remaining),
+        },
+        # Runs even if the client disconnects before the body is started
+        background=BackgroundTask(release),
+    )
 
 
 # ========== ADMIN ENDPOINTS ==========
 
 @app.get("/api/admin/stats")
-async def get_admin_stats(user: dict = Depends(require_pro)):
+async def get_admin_stats(user: dict = Depends(require_pro), ticket: Ticket = Depends(admit("analytics"))):
     """Get admin statistics (Pro/Enterprise only)."""
     from psycopg.rows import dict_row
     
-    with get_connection() as conn:
+    with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
         with conn.cursor(row_factory=dict_row) as cursor:
             # Total podcasts
             cursor.execute("SELECT COUNT(*) as count FROM podcasts")
@@ -1258,3 +1306,63 @@ async def get_admin_stats(user: dict = Depends(require_pro)):
                 "active_subscriptions": active_subscriptions,
                 "api_calls_today": api_calls_today,
             }
+
+
+@app.get("/api/admin/ingest-runs")
+async def get_ingest_runs(
+    days: int = Query(30, ge=1, le=365, description="Look back this many days"),
+    script: str | None = Query(None, description="ingest or ingest_episodes"),
+    user: dict = Depends(require_pro),
+    ticket: Ticket = Depends(admit("analytics")),
+):
+    """Ingestion run telemetry and duration trend (Pro/Enterprise only)."""
+    from psycopg.rows import dict_row
+
+    with get_connection(statement_timeout_ms=ticket.statement_timeout_ms) as conn:
+        with conn.cursor(row_factory=dict_row) as cursor:
+            cursor.execute(
+                """
+                SELECT id, script, run_id, captured_on, started_at, wall_seconds, status,
+                       stats->'stages' AS stages,
+                       (stats->>'db_seconds')::double precision AS db_seconds,
+                       stats->'http' AS http,
+                       stats->'rows' AS rows,
+                       AVG(wall_seconds) OVER (
+                         PARTITION BY script ORDER BY started_at ROWS BETWEEN 6 PRECEDING AND CURRENT ROW
+                       ) AS wall_seconds_avg7
+                FROM ingest_run_stats
+                WHERE started_at >= now() - make_interval(days => %(days)s)
+                  AND (%(script)s::text IS NULL OR script = %(script)s)
+                ORDER BY started_at
+                """,
+                {"days": days, "script": script},
+            )
+            runs = cursor.fetchall()
+
+            cursor.execute(
+                """
+                SELECT script,
+                       COUNT(*) AS runs,
+                       COUNT(*) FILTER (WHERE status <> 'ok') AS not_ok,
+                       percentile_cont(0.5) WITHIN GROUP (ORDER BY wall_seconds) AS p50_seconds,
+                       percentile_cont(0.95) WITHIN GROUP (ORDER BY wall_seconds) AS p95_seconds,
+                       MAX(wall_seconds) AS max_seconds
+                FROM ingest_run_stats
+                WHERE started_at >= now() - make_interval(days => %(days)s)
+                  AND (%(script)s::text IS NULL OR script = %(script)s)
+                GROUP BY script
+                ORDER BY script
+                """,
+                {"days": days, "script": script},
+            )
+            summary = cursor.fetchall()
+
+    for row in summary:
+        # How close the slow runs get to being cancelled
+        row["headroom_seconds"] = INGEST_CRON_WINDOW_SECONDS - row["p95_seconds"]
+    return {
+        "days": days,
+        "cron_window_seconds": INGEST_CRON_WINDOW_SECONDS,
+        "summary": summary,
+        "runs": runs,
+    }
@@ -1,21 +1,41 @@
 """Subscription and payment handling."""
 from __future__ import annotations
 
+import asyncio
+import json
+import logging
 import os
+from datetime import datetime, timedelta
 from typing import Any
 from uuid import UUID
 
 import stripe
 from dotenv import load_dotenv
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+
+from app.db import get_connection
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
 
 if STRIPE_SECRET_KEY:
     stripe.api_key = STRIPE_SECRET_KEY
 
+# Monthly API call quota by subscription tier
+TIER_QUOTAS = {"free": 1000, "pro": 10000, "enterprise": 100000}
+
+# Webhook queue worker (stripe_events table)
+STRIPE_EVENTS_BATCH_SIZE = int(os.environ.get("STRIPE_EVENTS_BATCH_SIZE", "50"))
+STRIPE_EVENTS_POLL_SECONDS = float(os.environ.get("STRIPE_EVENTS_POLL_SECONDS", "30"))
+STRIPE_EVENTS_MAX_ATTEMPTS = int(os.environ.get("STRIPE_EVENTS_MAX_ATTEMPTS", "8"))
+# Retry delay doubles per attempt: 30s, 1m, 2m, ... ~1h before the last try
+STRIPE_EVENTS_RETRY_BASE_SECONDS = float(os.environ.get("STRIPE_EVENTS_RETRY_BASE_SECONDS", "30"))
+
 
 def create_checkout_session(user_id: UUID, tier: str = "pro") -> dict[str, Any]:
     """Create Stripe checkout session for subscription."""
@@ -44,67 +64,297 @@ def create_checkout_session(user_id: UUID, tier: str = "pro") -> dict[str, Any]:
     return {"checkout_url": session.url, "session_id": session.id}
 
 
-def handle_webhook(payload: bytes, signature: str) -> dict[str, Any]:
-    """Handle Stripe webhook event."""
-    if not STRIPE_WEBHOOK_SECRET:
+def handle_webhook(payload: bytes, signature: str, secret: str | None = None) -> dict[str, Any]:
+    """Verify a Stripe webhook signature and return the event as a plain dict.
+
+    ``secret`` defaults to ``STRIPE_WEBHOOK_SECRET``; pass one explicitly to
+    verify payloads signed locally.
+    """
+    secret = secret or STRIPE_WEBHOOK_SECRET
+    if not secret:
         raise RuntimeError("STRIPE_WEBHOOK_SECRET not configured")
-    
+
     try:
-        event = stripe.Webhook.construct_event(payload, signature, STRIPE_WEBHOOK_SECRET)
+        stripe.WebhookSignature.verify_header(payload.decode("utf-8"), signature, secret)
+        event = json.loads(payload)
     except ValueError:
         raise ValueError("Invalid payload")
     except stripe.error.SignatureVerificationError:
         raise ValueError("Invalid signature")
-    
+
+    if not isinstance(event, dict) or "id" not in event or "type" not in event:
+        raise ValueError("Invalid payload")
     return event
 
 
-def update_user_subscription(user_id: UUID, subscription_id: str, tier: str, status: str) -> None:
-    """Update user subscription in database."""
-    from app.db import get_connection
-    from datetime import datetime, timedelta
-    
-    # Get subscription details from Stripe
-    expires_at = None
-    if STRIPE_SECRET_KEY and subscription_id:
-        try:
-            subscription = stripe.Subscription.retrieve(subscription_id)
-            expires_at = datetime.fromtimestamp(subscription.current_period_end)
-        except Exception:
-            expires_at = datetime.now() + timedelta(days=30)
+def subscription_key(event: dict[str, Any]) -> str:
+    """Key that orders events: the subscription they touch, else the event itself."""
+    obj = event.get("data", {}).get("object", {})
+    if event["type"].startswith("customer.subscription."):
+        key = obj.get("id")
     else:
-        expires_at = datetime.now() + timedelta(days=30)
-    
-    with get_connection() as conn:
+        key = obj.get("subscription")
+    return key or event["id"]
+
+
+def enqueue_stripe_event(event: dict[str, Any], statement_timeout_ms: int | None = None) -> bool:
+    """Persist a verified event for the worker. Returns False if it was already queued."""
+    with get_connection(statement_timeout_ms=statement_timeout_ms) as conn:
         with conn.cursor() as cursor:
-            # Update quota based on tier
-            quota = {"free": 1000, "pro": 10000, "enterprise": 100000}.get(tier, 1000)
-            
-            # First, ensure user exists
-            cursor.execute("SELECT id FROM users WHERE id = %s", (user_id,))
-            if not cursor.fetchone():
-                # Create user if doesn't exist (shouldn't happen, but safety check)
-                cursor.execute(
-                    """
-                    INSERT INTO users (id, subscription_tier, subscription_status, subscription_id, subscription_expires_at, api_quota_monthly)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    """,
-                    (user_id, tier, status, subscription_id, expires_at, quota),
-                )
-            else:
-                # Update existing user
-                cursor.execute(
-                    """
-                    UPDATE users
-                    SET subscription_tier = %s,
-                        subscription_status = %s,
-                        subscription_id = %s,
-                        subscription_expires_at = %s,
-                        api_quota_monthly = %s,
-                        updated_at = now()
-                    WHERE id = %s
-                    """,
-                    (tier, status, subscription_id, expires_at, quota, user_id),
-                )
+            cursor.execute(
+                """
+                INSERT INTO stripe_events (id, type, subscription_key, payload, event_created)
+                VALUES (%s, %s, %s, %s, COALESCE(to_timestamp(%s::double precision), now()))
+                ON CONFLICT (id) DO NOTHING
+                """,
+                (event["id"], event["type"], subscription_key(event), Jsonb(event), event.get("created")),
+            )
+            created = cursor.rowcount == 1
             conn.commit()
+    return created
+
+
+def _subscription_expires_at(subscription_id: str | None, stripe_client: Any) -> datetime:
+    """Current period end from Stripe, or 30 days out when Stripe isn't configured."""
+    if not subscription_id or not getattr(stripe_client, "api_key", None):
+        return datetime.now() + timedelta(days=30)
+    # Errors propagate so the worker retries the event instead of guessing
+    subscription = stripe_client.Subscription.retrieve(subscription_id)
+    return datetime.fromtimestamp(subscription["current_period_end"])
+
+
+def update_user_subscription(
+    cursor,
+    user_id: UUID,
+    subscription_id: str,
+    tier: str,
+    status: str,
+    stripe_client: Any = stripe,
+) -> None:
+    """Update user subscription in database."""
+    expires_at = _subscription_expires_at(subscription_id, stripe_client)
+    quota = TIER_QUOTAS.get(tier, TIER_QUOTAS["free"])
+
+    # First, ensure user exists
+    cursor.execute("SELECT id FROM users WHERE id = %s", (user_id,))
+    if not cursor.fetchone():
+        # Create user if doesn't exist (shouldn't happen, but safety check)
+        cursor.execute(
+            """
+            INSERT INTO users (id, subscription_tier, subscription_status, subscription_id, subscription_expires_at, api_quota_monthly)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            """,
+            (user_id, tier, status, subscription_id, expires_at, quota),
+        )
+    else:
+        # Update existing user
+        cursor.execute(
+            """
+            UPDATE users
+            SET subscription_tier = %s,
+                subscription_status = %s,
+                subscription_id = %s,
+                subscription_expires_at = %s,
+                api_quota_monthly = %s,
+                updated_at = now()
+            WHERE id = %s
+            """,
+            (tier, status, subscription_id, expires_at, quota, user_id),
+        )
 
+
+def apply_stripe_event(cursor, event: dict[str, Any], stripe_client: Any = stripe) -> None:
+    """Apply one Stripe event to the users table. Unhandled types are a no-op."""
+    event_type = event["type"]
+    obj = event["data"]["object"]
+
+    # Checkout completed - new subscription created
+    if event_type == "checkout.session.completed":
+        # Only process if client_reference_id exists (real checkout, not test)
+        subscription_id = obj.get("subscription")
+        if obj.get("client_reference_id") and subscription_id:
+            try:
+                user_id = UUID(obj["client_reference_id"])
+            except ValueError:
+                # Skip if user_id is invalid
+                return
+            tier = (obj.get("metadata") or {}).get("tier", "pro")
+            update_user_subscription(cursor, user_id, subscription_id, tier, "active", stripe_client)
+
+    # Subscription updated (plan change, renewal, etc.)
+    elif event_type == "customer.subscription.updated":
+        tier = (obj.get("metadata") or {}).get("tier", "pro")
+        cursor.execute(
+            """
+            UPDATE users
+            SET subscription_tier = %s,
+                subscription_status = %s,
+                subscription_expires_at = %s,
+                api_quota_monthly = %s,
+                updated_at = now()
+            WHERE subscription_id = %s
+            """,
+            (
+                tier,
+                obj.get("status", "active"),
+                datetime.fromtimestamp(obj.get("current_period_end", 0)),
+                TIER_QUOTAS.get(tier, TIER_QUOTAS["free"]),
+                obj.get("id"),
+            ),
+        )
+
+    # Subscription deleted/cancelled - downgrade user to free tier
+    elif event_type == "customer.subscription.deleted":
+        cursor.execute(
+            """
+            UPDATE users
+            SET subscription_tier = 'free',
+                subscription_status = 'cancelled',
+                subscription_id = NULL,
+                subscription_expires_at = NULL,
+                api_quota_monthly = %s,
+                updated_at = now()
+            WHERE subscription_id = %s
+            """,
+            (TIER_QUOTAS["free"], obj.get("id")),
+        )
+
+    # Payment succeeded (renewal) or failed (subscription at risk)
+    elif event_type in ("invoice.payment_succeeded", "invoice.payment_failed"):
+        if obj.get("subscription"):
+            cursor.execute(
+                """
+                UPDATE users
+                SET subscription_status = %s,
+                    updated_at = now()
+                WHERE subscription_id = %s
+                """,
+                ("active" if event_type == "invoice.payment_succeeded" else "past_due", obj["subscription"]),
+            )
+
+
+# Claim due events, oldest first. An event waits while an older event for the
+# same subscription is backing off, so a retry never lets later events jump it.
+_CLAIM_EVENTS = """
+    SELECT e.id, e.subscription_key, e.payload, e.attempts
+    FROM stripe_events e
+    WHERE e.status = 'pending'
+      AND e.next_attempt_at <= now()
+      AND NOT EXISTS (
+        SELECT 1 FROM stripe_events older
+        WHERE older.subscription_key = e.subscription_key
+          AND older.status = 'pending'
+          AND older.next_attempt_at > now()
+          AND (older.event_created, older.id) < (e.event_created, e.id)
+      )
+    ORDER BY e.event_created, e.id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+
+def _older_pending_elsewhere(cursor, key: str, claimed: list[dict[str, Any]]) -> bool:
+    """True if an older pending event for ``key`` is held by another worker."""
+    cursor.execute(
+        """
+        SELECT EXISTS (
+          SELECT 1 FROM stripe_events
+          WHERE subscription_key = %s
+            AND status = 'pending'
+            AND NOT (id = ANY(%s))
+            AND (event_created, id) < (SELECT event_created, id FROM stripe_events WHERE id = %s)
+        ) AS blocked
+        """,
+        (key, [row["id"] for row in claimed], claimed[0]["id"]),
+    )
+    return cursor.fetchone()["blocked"]
+
+
+def process_stripe_events(
+    batch_size: int = STRIPE_EVENTS_BATCH_SIZE,
+    stripe_client: Any = stripe,
+) -> dict[str, int]:
+    """Apply one batch of queued events and return per-outcome counts.
+
+    Events sharing a subscription are applied in ``created`` order; the first
+    failure in a group stops the rest of that group until it is retried.
+    Each event runs in a savepoint so one failure doesn't undo the batch.
+    """
+    counts = {"claimed": 0, "processed": 0, "retried": 0, "failed": 0, "deferred": 0}
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cursor:
+            cursor.execute(_CLAIM_EVENTS, (batch_size,))
+            rows = cursor.fetchall()
+            counts["claimed"] = len(rows)
+
+            groups: dict[str, list[dict[str, Any]]] = {}
+            for row in rows:
+                groups.setdefault(row["subscription_key"], []).append(row)
+
+            for key, group in groups.items():
+                if _older_pending_elsewhere(cursor, key, group):
+                    counts["deferred"] += len(group)
+                    continue
+                for index, row in enumerate(group):
+                    try:
+                        with conn.transaction():
+                            apply_stripe_event(cursor, row["payload"], stripe_client)
+                    except Exception as e:
+                        attempts = row["attempts"] + 1
+                        status = "failed" if attempts >= STRIPE_EVENTS_MAX_ATTEMPTS else "pending"
+                        delay = STRIPE_EVENTS_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                        cursor.execute(
+                            """
+                            UPDATE stripe_events
+                            SET status = %s,
+                                attempts = %s,
+                                last_error = %s,
+                                next_attempt_at = now() + make_interval(secs => %s)
+                            WHERE id = %s
+                            """,
+                            (status, attempts, f"{type(e).__name__}: {e}", delay, row["id"]),
+                        )
+                        logger.error(f"Stripe event {row['id']} attempt {attempts} failed ({status}): {e}")
+                        counts["failed" if status == "failed" else "retried"] += 1
+                        counts["deferred"] += len(group) - index - 1
+                        break
+                    cursor.execute(
+                        """
+                        UPDATE stripe_events
+                        SET status = 'processed', attempts = attempts + 1, last_error = NULL, processed_at = now()
+                        WHERE id = %s
+                        """,
+                        (row["id"],),
+                    )
+                    counts["processed"] += 1
+        conn.commit()
+    return counts
+
+
+_wakeup: asyncio.Event | None = None
+
+
+def notify_stripe_worker() -> None:
+    """Wake the background worker so a fresh event is applied without waiting a poll."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def run_stripe_event_worker(interval: float = STRIPE_EVENTS_POLL_SECONDS) -> None:
+    """Drain the queue whenever notified, and every ``interval`` seconds for retries."""
+    global _wakeup
+    _wakeup = asyncio.Event()
+    while True:
+        try:
+            while True:
+                counts = await asyncio.to_thread(process_stripe_events)
+                # Keep draining only while full batches are making progress
+                if counts["claimed"] < STRIPE_EVENTS_BATCH_SIZE or counts["claimed"] == counts["deferred"]:
+                    break
+        except Exception as e:
+            logger.error(f"Stripe event worker failed: {str(e)}")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
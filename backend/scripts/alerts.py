@@ -0,0 +1,263 @@
+"""Evaluate user_alerts after ingestion and deliver the fired events.
+
+Each alert type is evaluated for every enabled alert by one INSERT ... SELECT
+that starts from the day's chart movements and probes user_alerts through its
+partial index, so cost follows the number of podcasts that moved rather than
+the number of alerts. Fired events go to alert_events with one row per alert
+per day; re-running a day is a no-op.
+
+Rules:
+  rank_change     with a threshold, fires when the rank crosses it in either
+                  direction versus the previous day (leaving the chart counts as
+                  falling below); without one, on a move of ALERT_MIN_RANK_MOVE places
+  momentum_spike  momentum_score >= threshold (ALERT_DEFAULT_MOMENTUM when unset)
+  new_episode     the podcast published an episode on the previous UTC day, so
+                  each episode is reported once regardless of when ingest runs
+
+Usage:
+    python scripts/alerts.py [--date YYYY-MM-DD] [--no-deliver]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import sys
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import Any, TextIO
+
+from dotenv import load_dotenv
+from psycopg import connect
+from psycopg.rows import dict_row
+
+ALERT_MIN_RANK_MOVE = int(os.environ.get("ALERT_MIN_RANK_MOVE", "10"))
+ALERT_DEFAULT_MOMENTUM = float(os.environ.get("ALERT_DEFAULT_MOMENTUM", "10"))
+ALERT_DELIVERY_BATCH = int(os.environ.get("ALERT_DELIVERY_BATCH", "1000"))
+# stdout or file (JSON lines appended to ALERT_NOTIFIER_FILE). Unset: events are
+# recorded but left undelivered, so nothing is marked sent that no one received.
+ALERT_NOTIFIER = os.environ.get("ALERT_NOTIFIER", "")
+ALERT_NOTIFIER_FILE = os.environ.get("ALERT_NOTIFIER_FILE", "alert_events.jsonl")
+
+_INSERT_EVENT = """
+    INSERT INTO alert_events (alert_id, user_id, podcast_id, alert_type, fired_on, payload)
+"""
+
+ALERT_RULES: dict[str, str] = {
+    "rank_change": _INSERT_EVENT + """
+        WITH moves AS (
+          SELECT COALESCE(t.podcast_id, y.podcast_id) AS podcast_id,
+                 t.rank AS rank,
+                 y.rank AS previous_rank
+          FROM (SELECT podcast_id, rank FROM metrics_daily WHERE captured_on = %(day)s) t
+          FULL JOIN (SELECT podcast_id, rank FROM metrics_daily WHERE captured_on = %(day)s - 1) y
+            ON y.podcast_id = t.podcast_id
+          WHERE t.rank IS DISTINCT FROM y.rank
+            -- Without a previous day every charted podcast would look new
+            AND EXISTS (SELECT 1 FROM metrics_daily WHERE captured_on = %(day)s - 1)
+        )
+        SELECT a.id, a.user_id, a.podcast_id, a.alert_type, %(day)s,
+               jsonb_build_object('rank', m.rank, 'previous_rank', m.previous_rank, 'threshold', a.threshold)
+        FROM moves m
+        JOIN user_alerts a
+          ON a.podcast_id = m.podcast_id AND a.alert_type = 'rank_change' AND a.enabled
+        WHERE CASE
+          WHEN a.threshold IS NULL THEN abs(m.previous_rank - m.rank) >= %(min_rank_move)s
+          -- Off the chart counts as an infinitely bad rank
+          ELSE (COALESCE(m.rank, 2147483647) <= a.threshold)
+               <> (COALESCE(m.previous_rank, 2147483647) <= a.threshold)
+        END
+        ON CONFLICT (alert_id, fired_on) DO NOTHING
+    """,
+    "momentum_spike": _INSERT_EVENT + """
+        SELECT a.id, a.user_id, a.podcast_id, a.alert_type, %(day)s,
+               jsonb_build_object(
+                 'momentum_score', m.momentum_score,
+                 'rank', m.rank,
+                 'threshold', COALESCE(a.threshold, %(default_momentum)s)
+               )
+        FROM metrics_daily m
+        JOIN user_alerts a
+          ON a.podcast_id = m.podcast_id AND a.alert_type = 'momentum_spike' AND a.enabled
+        WHERE m.captured_on = %(day)s
+          AND m.momentum_score >= COALESCE(a.threshold, %(default_momentum)s)
+        ON CONFLICT (alert_id, fired_on) DO NOTHING
+    """,
+    "new_episode": _INSERT_EVENT + """
+        WITH published AS (
+          SELECT podcast_id,
+                 count(*) AS episodes,
+                 (array_agg(title ORDER BY published_at DESC))[1] AS latest_title,
+                 max(published_at) AS latest_published_at
+          FROM episodes
+          WHERE published_at >= (%(day)s - 1)::timestamp AT TIME ZONE 'UTC'
+            AND published_at < %(day)s::timestamp AT TIME ZONE 'UTC'
+          GROUP BY podcast_id
+        )
+        SELECT a.id, a.user_id, a.podcast_id, a.alert_type, %(day)s,
+               jsonb_build_object(
+                 'episodes', e.episodes,
+                 'latest_title', e.latest_title,
+                 'latest_published_at', e.latest_published_at
+               )
+        FROM published e
+        JOIN user_alerts a
+          ON a.podcast_id = e.podcast_id AND a.alert_type = 'new_episode' AND a.enabled
+        ON CONFLICT (alert_id, fired_on) DO NOTHING
+    """,
+}
+
+
+def evaluate_alerts(conn, day: date) -> dict[str, int]:
+    """Record fired alerts for ``day``; returns new events per alert type.
+
+    Runs in the caller's transaction; the caller commits.
+    """
+    params = {
+        "day": day,
+        "min_rank_move": ALERT_MIN_RANK_MOVE,
+        "default_momentum": ALERT_DEFAULT_MOMENTUM,
+    }
+    fired: dict[str, int] = {}
+    with conn.cursor() as cursor:
+        for alert_type, statement in ALERT_RULES.items():
+            cursor.execute(statement, params)
+            fired[alert_type] = cursor.rowcount
+    return fired
+
+
+class Notifier(ABC):
+    """Delivers batches of fired alert events. Subclass for email, push, etc."""
+
+    @abstractmethod
+    def send(self, events: list[dict[str, Any]]) -> None:
+        """Deliver one batch; raising leaves the batch undelivered."""
+
+    def close(self) -> None:
+        pass
+
+
+# Recipient details a stand-in notifier must not write out (stdout ends up in CI logs)
+_PRIVATE_FIELDS = {"email"}
+
+
+class StreamNotifier(Notifier):
+    """Writes each event as a JSON line to a text stream, without recipient details."""
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+
+    def send(self, events: list[dict[str, Any]]) -> None:
+        lines = (
+            json.dumps({k: v for k, v in event.items() if k not in _PRIVATE_FIELDS}, default=str) + "\n"
+            for event in events
+        )
+        self.stream.write("".join(lines))
+        self.stream.flush()
+
+
+class StdoutNotifier(StreamNotifier):
+    def __init__(self) -> None:
+        super().__init__(sys.stdout)
+
+
+class FileNotifier(StreamNotifier):
+    """Appends events to a JSON lines file; a local stand-in for a real channel."""
+
+    def __init__(self, path: str = ALERT_NOTIFIER_FILE) -> None:
+        super().__init__(open(path, "a", encoding="utf-8"))
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+def get_notifier(name: str = ALERT_NOTIFIER) -> Notifier | None:
+    """The configured notifier, or None when ALERT_NOTIFIER is unset."""
+    if not name:
+        return None
+    if name == "stdout":
+        return StdoutNotifier()
+    if name == "file":
+        return FileNotifier()
+    raise RuntimeError(f"Unknown ALERT_NOTIFIER: {name}")
+
+
+def deliver_pending(conn, notifier: Notifier, batch_size: int = ALERT_DELIVERY_BATCH) -> int:
+    """Send undelivered events in batches, committing each batch once it is sent.
+
+    Delivery is at-least-once: a batch that was sent but not committed is sent
+    again. Concurrent deliverers skip each other's locked rows.
+    """
+    delivered = 0
+    with conn.cursor(row_factory=dict_row) as cursor:
+        while True:
+            cursor.execute(
+                """
+                SELECT e.id, e.alert_id, e.user_id, u.email, e.podcast_id, p.title AS podcast_title,
+                       e.alert_type, e.fired_on, e.payload
+                FROM alert_events e
+                JOIN podcasts p ON p.id = e.podcast_id
+                LEFT JOIN users u ON u.id = e.user_id
+                WHERE e.delivered_at IS NULL
+                ORDER BY e.id
+                LIMIT %s
+                FOR UPDATE OF e SKIP LOCKED
+                """,
+                (batch_size,),
+            )
+            events = cursor.fetchall()
+            if not events:
+                break
+            notifier.send(events)
+            cursor.execute(
+                "UPDATE alert_events SET delivered_at = now() WHERE id = ANY(%s)",
+                ([event["id"] for event in events],),
+            )
+            conn.commit()
+            delivered += len(events)
+            if len(events) < batch_size:
+                break
+    return delivered
+
+
+def run_alerts(conn, day: date, deliver: bool = True) -> None:
+    """Post-ingest stage: evaluate the day's alerts, commit, then deliver."""
+    fired = evaluate_alerts(conn, day)
+    conn.commit()
+    logging.info(
+        "Alerts fired for %s: %s",
+        day,
+        ", ".join(f"{alert_type}={count}" for alert_type, count in fired.items()),
+    )
+    if not deliver:
+        return
+    notifier = get_notifier()
+    if notifier is None:
+        logging.info("ALERT_NOTIFIER not set; leaving alert events undelivered")
+        return
+    try:
+        delivered = deliver_pending(conn, notifier)
+    finally:
+        notifier.close()
+    logging.info("Delivered %s alert events", delivered)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--no-deliver", action="store_true")
+    args = parser.parse_args()
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL is required")
+
+    with connect(database_url) as conn:
+        run_alerts(conn, args.date, deliver=not args.no_deliver)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,13 @@
-"""Backfill historical data by running ingestion for past dates."""
+"""Rebuild derived metrics for the past N days from the stored ranks.
+
+ListenNotes only serves today's charts, so past days cannot be re-fetched:
+fetching "historical" charts spent API quota and stored today's chart under old
+dates. This now recomputes metrics_daily from ranks_daily instead, through
+``scripts/recompute.py range``, which takes an explicit date range.
+
+Usage:
+    python scripts/backfill.py [days]   # default 7
+"""
 from __future__ import annotations
 
 import logging
@@ -6,24 +15,14 @@ import os
 import sys
 from datetime import date, timedelta
 
-import httpx
 from dotenv import load_dotenv
-from psycopg import connect
 
-# Import the ingestion functions
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from scripts.ingest import (
-    LISTENNOTES_BASE_URL,
-    DEFAULT_CATEGORIES,
-    fetch_category,
-    upsert_podcasts,
-    upsert_ranks,
-    compute_metrics,
-)
+from scripts.recompute import run_range
 
 
 def backfill_days(days: int = 7) -> None:
-    """Backfill data for the past N days."""
+    """Recompute metrics for the past N days, today included."""
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
     load_dotenv()
 
@@ -31,69 +30,11 @@ def backfill_days(days: int = 7) -> None:
     if not database_url:
         raise RuntimeError("DATABASE_URL is required")
 
-    api_key = os.environ.get("LISTENNOTES_API_KEY")
-    if not api_key:
-        raise RuntimeError("LISTENNOTES_API_KEY is required")
-
-    limit = int(os.environ.get("LISTENNOTES_LIMIT", "50"))
-    regions = os.environ.get("LISTENNOTES_REGIONS", "us").split(",")
-    regions = [r.strip().lower() for r in regions if r.strip()]
-    if not regions:
-        regions = ["us"]
-
+    logging.info("Starting backfill for the past %s days", days)
     today = date.today()
-
-    with httpx.Client(
-        base_url=LISTENNOTES_BASE_URL,
-        headers={
-            "X-ListenAPI-Key": api_key,
-            "User-Agent": "PodCharts/0.1 (+https://podcharts.xyz)",
-        },
-    ) as client, connect(database_url) as conn:
-        conn.autocommit = False
-
-        # Backfill for each day
-        for day_offset in range(days, 0, -1):
-            captured_on = today - timedelta(days=day_offset)
-            logging.info("Backfilling data for %s", captured_on)
-
-            total_inserted = 0
-            with conn.cursor() as cursor:
-                for region in regions:
-                    for genre_id, slug in DEFAULT_CATEGORIES:
-                        try:
-                            records = fetch_category(
-                                client,
-                                genre_id=genre_id,
-                                category_slug=slug,
-                                region=region,
-                                limit=limit,
-                                captured_on=captured_on,
-                            )
-                        except httpx.HTTPStatusError as exc:
-                            logging.error("Failed to fetch %s (%s) for %s: %s", slug, region, captured_on, exc)
-                            continue
-
-                        if not records:
-                            logging.warning("No podcasts returned for %s (%s) on %s", slug, region, captured_on)
-                            continue
-
-                        upsert_podcasts(cursor, records)
-                        upsert_ranks(cursor, records)
-                        total_inserted += len(records)
-                        logging.info("Fetched %s records for %s (%s) on %s", len(records), slug, region, captured_on)
-
-                # Compute metrics for this day
-                compute_metrics(conn, captured_on)
-                conn.commit()
-
-            logging.info("Backfilled %s records for %s", total_inserted, captured_on)
-
-        logging.info("Backfill complete!")
+    totals = run_range(database_url, today - timedelta(days=days), today)
+    logging.info("Backfill complete: %s metrics rows changed", totals["written"])
 
 
 if __name__ == "__main__":
-    days = int(sys.argv[1]) if len(sys.argv) > 1 else 7
-    logging.info("Starting backfill for the past %s days", days)
-    backfill_days(days)
-
+    backfill_days(int(sys.argv[1]) if len(sys.argv) > 1 else 7)
@@ -0,0 +1,128 @@
+"""Benchmark alert evaluation and delivery with a large user_alerts table.
+
+Builds a scratch schema (see scripts/benchlib.py) with synthetic users,
+podcasts, two days of metrics, a day of episodes and --alerts alerts skewed
+towards popular podcasts, then times evaluation of every rule, an idempotent re-run and
+batched delivery.
+
+Usage:
+    python scripts/bench_alerts.py [--alerts 1000000] [--podcasts 20000] [--explain]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from datetime import date
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.alerts import ALERT_RULES, Notifier, deliver_pending, evaluate_alerts
+from scripts.benchlib import scratch_schema, timed
+
+
+class CountingNotifier(Notifier):
+    def __init__(self) -> None:
+        self.sent = 0
+        self.batches = 0
+
+    def send(self, events: list[dict[str, Any]]) -> None:
+        self.sent += len(events)
+        self.batches += 1
+
+
+def populate(conn, day: date, alerts: int, podcasts: int, users: int, episodes: int) -> None:
+    params = {
+        "day": day,
+        "alerts": alerts,
+        "podcasts": podcasts,
+        "users": users,
+        "episodes": episodes,
+    }
+    with conn.cursor() as cursor:
+        cursor.execute("INSERT INTO users (id) SELECT gen_random_uuid() FROM generate_series(1, %(users)s)", params)
+        cursor.execute(
+            "INSERT INTO podcasts (id, title) SELECT 'p' || g, 'Podcast ' || g FROM generate_series(1, %(podcasts)s) g",
+            params,
+        )
+        cursor.execute(
+            """
+            INSERT INTO metrics_daily (podcast_id, captured_on, rank, momentum_score)
+            SELECT 'p' || g, %(day)s - 1, g, random() * 40 - 20 FROM generate_series(1, %(podcasts)s) g
+            UNION ALL
+            SELECT 'p' || g, %(day)s, greatest(1, g + (random() * 40 - 20)::int), random() * 40 - 20
+            FROM generate_series(1, %(podcasts)s) g
+            """,
+            params,
+        )
+        cursor.execute(
+            """
+            INSERT INTO episodes (id, podcast_id, title, published_at)
+            SELECT 'e' || g, 'p' || (1 + (g * 7919) %% %(podcasts)s), 'Episode ' || g,
+                   (%(day)s - 1)::timestamp AT TIME ZONE 'UTC' + random() * interval '1 day'
+            FROM generate_series(1, %(episodes)s) g
+            """,
+            params,
+        )
+        cursor.execute("CREATE TEMP TABLE bench_users AS SELECT row_number() OVER () AS n, id FROM users")
+        # Followed podcasts skew towards the top of the chart
+        cursor.execute(
+            """
+            INSERT INTO user_alerts (user_id, podcast_id, alert_type, threshold)
+            SELECT u.id,
+                   'p' || (1 + floor((%(podcasts)s - 1) * random() ^ 3))::int,
+                   CASE WHEN g %% 20 < 12 THEN 'rank_change' WHEN g %% 20 < 17 THEN 'momentum_spike' ELSE 'new_episode' END,
+                   CASE WHEN g %% 20 < 12 THEN CASE WHEN g %% 5 = 0 THEN NULL ELSE (1 + random() * 200)::int END
+                        WHEN g %% 20 < 17 THEN (5 + random() * 20)::int END
+            FROM generate_series(1, %(alerts)s) g
+            JOIN bench_users u ON u.n = 1 + g %% %(users)s
+            """,
+            params,
+        )
+    conn.commit()
+    conn.execute("ANALYZE")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alerts", type=int, default=1_000_000)
+    parser.add_argument("--podcasts", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--episodes", type=int, default=3_000)
+    parser.add_argument("--explain", action="store_true", help="Print the plan of each rule")
+    args = parser.parse_args()
+
+    day = date.today()
+    print(f"\n🔔 {args.alerts:,} alerts over {args.podcasts:,} podcasts and {args.users:,} users")
+    with scratch_schema("bench_alerts") as conn:
+        with timed("populate"):
+            populate(conn, day, args.alerts, args.podcasts, args.users, args.episodes)
+
+        if args.explain:
+            params = {"day": day, "min_rank_move": 10, "default_momentum": 10.0}
+            with conn.cursor() as cursor:
+                for alert_type, statement in ALERT_RULES.items():
+                    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, params)
+                    print(f"\n   -- {alert_type}")
+                    print("\n".join(f"   {row[0]}" for row in cursor.fetchall()))
+            conn.rollback()
+
+        with timed("evaluate (all rules)"):
+            fired = evaluate_alerts(conn, day)
+            conn.commit()
+        for alert_type, count in fired.items():
+            print(f"     {alert_type:<20} {count:>10,} fired")
+
+        with timed("re-evaluate same day (idempotent)"):
+            again = evaluate_alerts(conn, day)
+            conn.commit()
+        print(f"     {'new events':<20} {sum(again.values()):>10,}")
+
+        notifier = CountingNotifier()
+        with timed("deliver"):
+            deliver_pending(conn, notifier)
+        print(f"     {'delivered':<20} {notifier.sent:>10,} in {notifier.batches:,} batches")
+
+
+if __name__ == "__main__":
+    main()
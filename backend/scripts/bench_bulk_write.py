@@ -0,0 +1,100 @@
+"""Benchmark rows/sec of bulk_upsert against the old executemany upserts.
+
+Writes ranks_daily rows in a scratch schema (see scripts/benchlib.py) for three
+passes per strategy: a fresh insert, re-sending identical rows, and re-sending
+with 10% of ranks changed. Also reports how many row versions each pass wrote,
+which is what turns into bloat and vacuum work.
+
+Usage:
+    python scripts/bench_bulk_write.py [--rows 100000]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.benchlib import scratch_schema
+from scripts.bulk_write import bulk_upsert
+
+COLUMNS = ["podcast_id", "source", "rank", "country", "captured_on"]
+KEYS = ["podcast_id", "source", "captured_on", "country"]
+
+LEGACY_SQL = """
+    INSERT INTO ranks_daily (podcast_id, source, rank, country, captured_on)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (podcast_id, source, captured_on, country) DO UPDATE
+    SET rank = EXCLUDED.rank
+"""
+
+
+def legacy(cursor, rows: list[tuple[Any, ...]]) -> None:
+    cursor.executemany(LEGACY_SQL, rows)
+
+
+def bulk(cursor, rows: list[tuple[Any, ...]]) -> None:
+    bulk_upsert(cursor, "ranks_daily", COLUMNS, rows, key_columns=KEYS)
+
+
+def row_versions(conn) -> int:
+    conn.execute("SELECT pg_stat_force_next_flush()")
+    # ranks_daily is partitioned: the counters live on its partitions, not the parent
+    return conn.execute(
+        """
+        SELECT COALESCE(SUM(s.n_tup_ins + s.n_tup_upd), 0)
+        FROM pg_partition_tree('ranks_daily') t
+        JOIN pg_stat_user_tables s ON s.relid = t.relid
+        """
+    ).fetchone()[0]
+
+
+def run(conn, label: str, write: Callable[[Any, list[tuple[Any, ...]]], None], rows_by_pass: list[list[tuple[Any, ...]]]) -> None:
+    conn.execute("TRUNCATE ranks_daily")
+    conn.commit()
+    for pass_name, rows in zip(("insert", "unchanged", "10% changed"), rows_by_pass):
+        before = row_versions(conn)
+        start = time.perf_counter()
+        with conn.cursor() as cursor:
+            write(cursor, rows)
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        written = row_versions(conn) - before
+        print(f"   {label:<12} {pass_name:<12} {len(rows) / elapsed:>12,.0f} rows/s {written:>12,} row versions")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    day = date.today()
+    podcasts = max(1, args.rows // 10)
+    countries = ["us", "gb", "ca", "au", "de", "fr", "in", "br", "jp", "mx"]
+    base = [
+        (f"p{i % podcasts}", "listennotes", rng.randint(1, 500), countries[i // podcasts % len(countries)], day)
+        for i in range(args.rows)
+    ]
+    changed = [
+        (podcast_id, source, rank + 1 if rng.random() < 0.1 else rank, country, captured_on)
+        for podcast_id, source, rank, country, captured_on in base
+    ]
+
+    print(f"\n📝 ranks_daily upserts, {args.rows:,} rows per pass")
+    with scratch_schema("bench_bulk_write") as conn:
+        conn.execute(
+            "INSERT INTO podcasts (id, title) SELECT 'p' || g, 'Podcast ' || g FROM generate_series(0, %s) g",
+            (podcasts,),
+        )
+        conn.commit()
+        run(conn, "executemany", legacy, [base, base, changed])
+        run(conn, "bulk_upsert", bulk, [base, base, changed])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark bytes on the wire and CPU per request for response compression.
+
+Compares sending raw JSON, compressing on every request, and serving the
+precompressed variants stored with the cache entry, and reports what one cache
+fill costs at the configured COMPRESSION_GZIP_LEVEL / COMPRESSION_BROTLI_QUALITY.
+
+Usage:
+    python scripts/bench_compression.py [iterations]
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.compression import BROTLI_AVAILABLE, BROTLI_QUALITY, GZIP_LEVEL, choose_encoding, compress_variants
+
+if BROTLI_AVAILABLE:
+    import brotli
+
+CATEGORIES = ["top", "technology", "news", "comedy", "business", "health", "education"]
+
+
+def leaderboard_payload(limit: int = 500) -> bytes:
+    """Shape of GET /leaderboard?limit=500."""
+    rng = random.Random(42)
+    items = [
+        {
+            "id": f"{rng.getrandbits(128):032x}",
+            "title": f"Podcast {rng.choice(['Daily', 'Weekly', 'The', 'Inside'])} Show {i}",
+            "publisher": f"Publisher {rng.randint(1, 200)}",
+            "category": rng.choice(CATEGORIES),
+            "country": "us",
+            "rank": i,
+            "delta_7d": rng.randint(-20, 20),
+            "delta_30d": rng.randint(-50, 50),
+            "momentum_score": round(rng.uniform(-30, 30), 4),
+        }
+        for i in range(1, limit + 1)
+    ]
+    body = {
+        "category": None,
+        "country": "all",
+        "interval": "daily",
+        "sort_by": "rank",
+        "search": None,
+        "captured_on": date.today().isoformat(),
+        "items": items,
+    }
+    return json.dumps(body).encode()
+
+
+def history_payload(days: int = 90) -> bytes:
+    """Shape of GET /podcast/{id} with a 90-day history."""
+    rng = random.Random(7)
+    start = date.today() - timedelta(days=days)
+    rank = 50
+    history = []
+    for i in range(days):
+        rank = max(1, rank + rng.randint(-3, 3))
+        history.append(
+            {
+                "date": (start + timedelta(days=i)).isoformat(),
+                "rank": rank,
+                "delta_7d": rng.randint(-10, 10),
+                "delta_30d": rng.randint(-25, 25),
+                "momentum_score": round(rng.uniform(-15, 15), 4),
+            }
+        )
+    body = {
+        "id": "4d3fe717742d4963a85562e9f7d74f8e",
+        "title": "Example Podcast",
+        "publisher": "Example Publisher",
+        "category": "technology",
+        "rss_url": "https://example.com/feed.xml",
+        "country": "us",
+        "created_at": "2024-01-01T00:00:00+00:00",
+        "history": history,
+    }
+    return json.dumps(body).encode()
+
+
+def per_request_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def bench(name: str, body: bytes, iterations: int) -> None:
+    print(f"\n📦 {name}: {len(body):,} bytes raw")
+    print(f"   {'strategy':<28} {'wire bytes':>12} {'ratio':>7} {'CPU/request':>14}")
+
+    def row(label: str, size: int, us: float) -> None:
+        print(f"   {label:<28} {size:>12,} {len(body) / size:>6.1f}x {us:>11.1f} µs")
+
+    row("identity", len(body), 0.0)
+    for level in sorted({1, GZIP_LEVEL, 9}):
+        size = len(gzip.compress(body, compresslevel=level))
+        row(f"gzip-{level} per request", size, per_request_us(lambda: gzip.compress(body, compresslevel=level), iterations))
+    if BROTLI_AVAILABLE:
+        for quality in sorted({4, BROTLI_QUALITY, 11}):
+            n = iterations if quality < 10 else max(1, iterations // 10)
+            size = len(brotli.compress(body, quality=quality))
+            row(f"br-{quality} per request", size, per_request_us(lambda: brotli.compress(body, quality=quality), n))
+
+    fill_us = per_request_us(lambda: compress_variants(body), max(1, iterations // 10))
+    variants = compress_variants(body)
+    for encoding in ("br", "gzip"):
+        if encoding not in variants:
+            continue
+        header = f"{encoding}, identity"
+        us = per_request_us(lambda: variants[choose_encoding(header, variants)], iterations * 10)
+        row(f"precompressed {encoding}", len(variants[encoding]), us)
+    # A key requested only once (e.g. a unique search=) pays the whole fill on its miss
+    gzip_us = per_request_us(lambda: gzip.compress(body, compresslevel=GZIP_LEVEL), iterations)
+    print(
+        f"   cache fill (gzip-{GZIP_LEVEL}"
+        + (f" + br-{BROTLI_QUALITY}" if BROTLI_AVAILABLE else "")
+        + f"): {fill_us / 1000:.2f} ms, {fill_us / gzip_us:.1f}x one gzip-{GZIP_LEVEL} per request"
+    )
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    if not BROTLI_AVAILABLE:
+        print("⚠️  brotli is not installed; only gzip variants are measured")
+    bench("leaderboard limit=500", leaderboard_payload(), iterations)
+    bench("podcast 90-day history", history_payload(), iterations)
+
+
+if __name__ == "__main__":
+    main()
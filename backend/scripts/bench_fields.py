@@ -0,0 +1,90 @@
+"""Benchmark payload size and latency of `fields=` projections on list endpoints.
+
+Without arguments, measures payload sizes offline from synthetic rows.
+With --base-url, also measures latency against a running API (each request
+carries a unique throwaway param so it bypasses the response cache).
+
+Usage:
+    python scripts/bench_fields.py
+    python scripts/bench_fields.py --base-url http://localhost:8000 --requests 50
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.main import LIST_FIELDS, parse_fields, project_row
+from scripts.bench_compression import leaderboard_payload
+
+# Projections the frontend list pages actually need
+PROJECTIONS: list[str | None] = [
+    None,
+    "title,rank",
+    "title,rank,publisher,category",
+    "title,rank,momentum_score,delta_7d",
+]
+
+
+def offline(limit: int) -> None:
+    rows = json.loads(leaderboard_payload(limit))["items"]
+    print(f"\n📦 leaderboard limit={limit} (synthetic rows)")
+    print(f"   {'fields':<36} {'raw bytes':>10} {'gzip bytes':>11} {'vs all':>7}")
+    full = None
+    for projection in PROJECTIONS:
+        selected = parse_fields(projection, LIST_FIELDS)
+        body = json.dumps({"items": [project_row(row, selected) for row in rows]}).encode()
+        full = full or len(body)
+        print(
+            f"   {projection or '(all)':<36} {len(body):>10,} {len(gzip.compress(body)):>11,} "
+            f"{len(body) / full:>6.0%}"
+        )
+
+
+def live(base_url: str, requests: int, limit: int) -> None:
+    print(f"\n⏱️  Live latency against {base_url} ({requests} uncached requests each)")
+    print(f"   {'endpoint':<12} {'fields':<36} {'bytes':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    with httpx.Client(base_url=base_url, timeout=30.0) as client:
+        for path in ("/leaderboard", "/trending"):
+            for projection in PROJECTIONS:
+                timings: list[float] = []
+                size = 0
+                for i in range(requests):
+                    params: dict[str, str | int] = {"limit": limit, "_bench": f"{time.time_ns()}-{i}"}
+                    if projection:
+                        params["fields"] = projection
+                    start = time.perf_counter()
+                    response = client.get(path, params=params, headers={"Accept-Encoding": "identity"})
+                    timings.append((time.perf_counter() - start) * 1000)
+                    response.raise_for_status()
+                    size = len(response.content)
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                print(
+                    f"   {path:<12} {projection or '(all)':<36} {size:>9,} "
+                    f"{statistics.median(timings):>8.1f} {p95:>8.1f}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Running API to measure latency against")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--limit", type=int, default=500)
+    args = parser.parse_args()
+
+    offline(100)
+    offline(args.limit)
+    if args.base_url:
+        live(args.base_url, args.requests, args.limit)
+
+
+if __name__ == "__main__":
+    main()
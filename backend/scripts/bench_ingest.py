@@ -0,0 +1,128 @@
+"""Benchmark the ingest scripts end to end against scripts/mock_listennotes.py.
+
+Starts the mock API in-process, then for each --depths value runs
+``scripts/ingest.py`` in a fresh scratch schema (see scripts/benchlib.py):
+once cold, and once more on the same day to time a re-ingest that changes
+nothing. With --episodes, ``scripts/ingest_episodes.py`` runs after each:
+cold, again with every podcast due (an incremental sync that finds nothing
+new), then once with --backfill. Each script runs as a subprocess with its normal settings, so the timings include
+startup, the HTTP client, the database writes and metrics. Rows and HTTP
+counters come from the run's telemetry line (scripts/telemetry.py).
+
+Usage:
+    python scripts/bench_ingest.py [--depths 50,200,500] [--regions us,gb] [--latency-ms 50] [--episodes]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import uvicorn
+from psycopg.conninfo import make_conninfo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.benchlib import database_url, scratch_schema
+from scripts.mock_listennotes import add_arguments, create_app, settings_from_args
+
+SCRIPTS = Path(__file__).parent
+SCHEMA = "bench_ingest"
+
+
+def start_mock(args: argparse.Namespace) -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(create_app(settings_from_args(args)), host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def run_script(script: str, env: dict[str, str], *extra: str) -> tuple[float, dict[str, Any]]:
+    """Run a script to completion; returns its wall time and telemetry summary."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, str(SCRIPTS / script), *extra], env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    summaries = [line for line in result.stdout.splitlines() if line.startswith("{")]
+    if result.returncode != 0 or not summaries:
+        sys.stderr.write(result.stderr[-2000:])
+        raise SystemExit(f"{script} exited with {result.returncode}")
+    return elapsed, json.loads(summaries[-1])
+
+
+def report(label: str, elapsed: float, summary: dict[str, Any]) -> None:
+    rows = sum(c["inserted"] + c["updated"] + c["unchanged"] for c in summary["rows"].values())
+    written = sum(counts["inserted"] + counts["updated"] for counts in summary["rows"].values())
+    http = summary["http"]
+    stages = " ".join(f"{name}={seconds:.2f}" for name, seconds in summary["stages"].items())
+    print(
+        f"   {label:<22} {elapsed:>7.2f} s {rows:>9,} rows {rows / elapsed:>9,.0f} rows/s "
+        f"{written:>9,} written {http['requests']:>6,} req {http['rate_limited']:>4,} 429  {stages}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depths", default="50,200,500", help="chart depths to run, one scale each")
+    parser.add_argument("--regions", default="us")
+    parser.add_argument("--genres", default=None, help="LISTENNOTES_GENRES rules; unset = DEFAULT_CATEGORIES")
+    parser.add_argument("--episodes", action="store_true", help="also run scripts/ingest_episodes.py")
+    parser.add_argument("--rate", type=float, default=1000.0, help="client LISTENNOTES_RATE_PER_SEC")
+    parser.add_argument("--concurrency", type=int, default=8, help="client LISTENNOTES_CONCURRENCY")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    base_url = start_mock(args)
+    cache = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+    cache.close()
+    env = {
+        **os.environ,
+        "DATABASE_URL": make_conninfo(database_url(), options=f"-c search_path={SCHEMA}"),
+        "LISTENNOTES_API_KEY": "mock",
+        "LISTENNOTES_BASE_URL": base_url,
+        "LISTENNOTES_REGIONS": args.regions,
+        "LISTENNOTES_LIMIT": "50",
+        "LISTENNOTES_RATE_PER_SEC": str(args.rate),
+        "LISTENNOTES_BURST": str(max(1, int(args.rate))),
+        "LISTENNOTES_CONCURRENCY": str(args.concurrency),
+        "LISTENNOTES_GENRES_CACHE": cache.name,
+    }
+    if args.genres:
+        env["LISTENNOTES_GENRES"] = args.genres
+
+    print(
+        f"\n📻 mock ListenNotes at {base_url}: {args.podcasts:,} podcasts, charts of {args.chart_size}, "
+        f"latency {args.latency_ms:g} ms, 429 ratio {args.rate_limit_ratio:g}"
+    )
+    try:
+        for depth in (int(d) for d in args.depths.split(",") if d.strip()):
+            print(f"\n   depth {depth}, regions {args.regions}")
+            with scratch_schema(SCHEMA):
+                env["LISTENNOTES_DEPTH"] = str(depth)
+                report("ingest (cold)", *run_script("ingest.py", env, "--new"))
+                report("ingest (re-run)", *run_script("ingest.py", env, "--new"))
+                if args.episodes:
+                    report("episodes (cold)", *run_script("ingest_episodes.py", env))
+                    due = {**env, "EPISODES_REFRESH_HOURS": "0", "EPISODES_UNCHARTED_REFRESH_HOURS": "0"}
+                    report("episodes (re-run)", *run_script("ingest_episodes.py", due))
+                    report("episodes (backfill)", *run_script("ingest_episodes.py", env, "--backfill"))
+    finally:
+        os.unlink(cache.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Shared helpers for benchmarks that need a database.
+
+Benchmarks run in a throwaway schema built from infra/schema.sql and dropped
+afterwards, so they can point at a real database without touching its data.
+Set BENCH_DATABASE_URL to use a different database than DATABASE_URL.
+"""
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from dotenv import load_dotenv
+from psycopg import Connection, connect, sql
+
+SCHEMA_FILE = Path(__file__).parent.parent.parent / "infra" / "schema.sql"
+
+# Plain Postgres has no Supabase auth schema; the RLS policies only need auth.uid() to exist
+AUTH_STUB = """
+CREATE SCHEMA IF NOT EXISTS auth;
+DO $$ BEGIN
+  IF to_regprocedure('auth.uid()') IS NULL THEN
+    CREATE FUNCTION auth.uid() RETURNS uuid LANGUAGE sql STABLE AS 'SELECT NULL::uuid';
+  END IF;
+END $$;
+"""
+
+
+def database_url() -> str:
+    load_dotenv()
+    url = os.environ.get("BENCH_DATABASE_URL") or os.environ.get("DATABASE_URL")
+    if not url:
+        raise RuntimeError("BENCH_DATABASE_URL or DATABASE_URL is required")
+    return url
+
+
+@contextmanager
+def scratch_schema(name: str = "bench", url: str | None = None) -> Iterator[Connection]:
+    """Yield a connection whose search_path is a fresh copy of the app schema.
+
+    ``url`` defaults to database_url().
+    """
+    schema = sql.Identifier(name)
+    conn = connect(url or database_url())
+    try:
+        conn.execute(AUTH_STUB)
+        conn.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(schema))
+        conn.execute(sql.SQL("CREATE SCHEMA {}").format(schema))
+        conn.execute(sql.SQL("SET search_path TO {}").format(schema))
+        conn.execute(SCHEMA_FILE.read_text())
+        conn.commit()
+        yield conn
+    finally:
+        conn.rollback()
+        conn.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(schema))
+        conn.commit()
+        conn.close()
+
+
+@contextmanager
+def timed(label: str) -> Iterator[None]:
+    start = time.perf_counter()
+    yield
+    print(f"   {label:<40} {time.perf_counter() - start:>8.2f} s")
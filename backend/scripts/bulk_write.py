@@ -0,0 +1,150 @@
+"""Bulk upserts for the ingest scripts: COPY into a temp stage, then one statement.
+
+``bulk_upsert`` replaces ``executemany`` + ``ON CONFLICT DO UPDATE`` (one round
+trip and one statement per row) with:
+
+1. de-duplicating rows by key in Python, last one wins, as executemany did;
+2. ``COPY`` into a session temp table shaped like the target columns;
+3. a single ``INSERT ... SELECT ... ON CONFLICT DO UPDATE`` whose ``WHERE``
+   skips rows whose values are unchanged (``IS DISTINCT FROM``), so re-ingesting
+   the same data writes no new row versions.
+
+Inserted and updated rows are told apart by ``xmax = 0``. Partitioned tables
+cannot return system columns, so for them the keys that already exist are
+looked up in the same statement instead.
+"""
+from __future__ import annotations
+
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Sequence
+
+from psycopg import sql
+from psycopg.rows import tuple_row
+
+
+@dataclass
+class BulkWriteResult:
+    staged: int = 0  # rows after de-duplication
+    inserted: int = 0
+    updated: int = 0
+    # rows the caller found unchanged by content hash and never staged (part of ``unchanged``)
+    skipped: int = 0
+    # ``returning`` columns of the inserted and updated rows
+    rows: list[tuple[Any, ...]] = field(default_factory=list)
+
+    @property
+    def unchanged(self) -> int:
+        return self.staged - self.inserted - self.updated
+
+
+def _stage_name(table: str, columns: Sequence[str]) -> str:
+    # One stage per (table, column set), reused for the rest of the session
+    return f"_stage_{table}_{zlib.crc32(','.join(columns).encode()):08x}"
+
+
+def _is_partitioned(conn, table: str) -> bool:
+    with conn.cursor(row_factory=tuple_row) as cursor:
+        cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def bulk_upsert(
+    cursor,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable[Sequence[Any]],
+    *,
+    key_columns: Sequence[str],
+    update_columns: Sequence[str] | None = None,
+    extra_updates: str | None = None,
+    returning: Sequence[str] = (),
+) -> BulkWriteResult:
+    """Insert ``rows`` into ``table`` and update existing rows whose values changed.
+
+    ``update_columns`` defaults to every non-key column; pass ``[]`` to only
+    insert new keys. ``extra_updates`` is a SQL fragment applied alongside the
+    changed columns (e.g. ``"updated_at = now()"``), so it only fires on real
+    changes. Runs in the caller's transaction.
+    """
+    if update_columns is None:
+        update_columns = [c for c in columns if c not in key_columns]
+
+    key_index = [columns.index(c) for c in key_columns]
+    deduped: dict[tuple[Any, ...], Sequence[Any]] = {}
+    for row in rows:
+        deduped[tuple(row[i] for i in key_index)] = row
+    result = BulkWriteResult(staged=len(deduped))
+    if not deduped:
+        return result
+
+    target = sql.Identifier(table)
+    stage = sql.Identifier(_stage_name(table, columns))
+    column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+    key_list = sql.SQL(", ").join(map(sql.Identifier, key_columns))
+
+    if update_columns:
+        assignments = [sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in update_columns]
+        if extra_updates:
+            assignments.append(sql.SQL(extra_updates))
+        conflict = sql.SQL("DO UPDATE SET {} WHERE ({}) IS DISTINCT FROM ({})").format(
+            sql.SQL(", ").join(assignments),
+            sql.SQL(", ").join(sql.SQL("t.{}").format(sql.Identifier(c)) for c in update_columns),
+            sql.SQL(", ").join(sql.SQL("EXCLUDED.{}").format(sql.Identifier(c)) for c in update_columns),
+        )
+    else:
+        conflict = sql.SQL("DO NOTHING")
+    prelude = sql.SQL("")
+    if _is_partitioned(cursor.connection, table):
+        # The CTE reads the snapshot taken before the insert, so it holds the pre-existing keys
+        prelude = sql.SQL(
+            "WITH existing AS MATERIALIZED (SELECT {keys} FROM {target} JOIN {stage} USING ({keys})) "
+        ).format(keys=key_list, target=target, stage=stage)
+        inserted = sql.SQL("NOT EXISTS (SELECT 1 FROM existing e WHERE ({}) = ({}))").format(
+            sql.SQL(", ").join(sql.SQL("e.{}").format(sql.Identifier(c)) for c in key_columns),
+            sql.SQL(", ").join(sql.SQL("t.{}").format(sql.Identifier(c)) for c in key_columns),
+        )
+    else:
+        # xmax is 0 only on freshly inserted row versions
+        inserted = sql.SQL("t.xmax = 0")
+    returned = [inserted] + [sql.SQL("t.{}").format(sql.Identifier(c)) for c in returning]
+
+    # Own tuple cursor: callers may pass a dict_row one
+    with cursor.connection.cursor() as stage_cursor:
+        stage_cursor.execute(
+            sql.SQL("CREATE TEMP TABLE IF NOT EXISTS {} AS SELECT {} FROM {} WITH NO DATA").format(
+                stage, column_list, target
+            )
+        )
+        stage_cursor.execute(sql.SQL("TRUNCATE {}").format(stage))
+        with stage_cursor.copy(sql.SQL("COPY {} ({}) FROM STDIN").format(stage, column_list)) as copy:
+            for row in deduped.values():
+                copy.write_row(row)
+
+        stage_cursor.execute(
+            sql.SQL(
+                """
+                {prelude}INSERT INTO {target} AS t ({columns})
+                SELECT {columns} FROM {stage} ORDER BY {keys}
+                ON CONFLICT ({keys}) {conflict}
+                RETURNING {returned}
+                """
+            ).format(
+                prelude=prelude,
+                target=target,
+                columns=column_list,
+                stage=stage,
+                keys=key_list,
+                conflict=conflict,
+                returned=sql.SQL(", ").join(returned),
+            )
+        )
+        for inserted, *values in stage_cursor.fetchall():
+            if inserted:
+                result.inserted += 1
+            else:
+                result.updated += 1
+            if returning:
+                result.rows.append(tuple(values))
+    return result
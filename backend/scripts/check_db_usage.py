@@ -1,98 +1,465 @@
-"""Check database usage and estimate when you'll hit Supabase free tier limits."""
+"""Storage and index advisor: sizes, bloat, index usage and growth against the plan limit.
+
+Reports, for the tables in the current schema (partitions are summed under their
+parent table and index):
+
+  tables     rows, heap and index bytes, estimated bloat, sequential vs index scans
+  indexes    bytes, scans since the statistics were reset, estimated bloat
+  growth     rows per day observed over the last ADVISOR_GROWTH_DAYS in the daily
+             tables, the bytes that adds per day, and when DB_SIZE_LIMIT_MB is reached
+  findings   duplicate or unused indexes, sequential-scan-heavy tables, bloat, and
+             BRIN or covering indexes for the time-series tables, each with its SQL
+
+Bloat is estimated from pg_stats column widths (the expected size of the live rows)
+against the relation's actual size, so it needs the tables to have been analyzed.
+"Unused" only means no scans since ``stats_reset``, which is reported alongside.
+
+Usage:
+    python scripts/check_db_usage.py [--format text|json]
+"""
 from __future__ import annotations
 
+import argparse
+import json
 import os
+import sys
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime
+from typing import Any
+
 from dotenv import load_dotenv
-from psycopg import connect
+from psycopg import connect, sql
 from psycopg.rows import dict_row
 
-load_dotenv()
-
-with connect(os.environ.get("DATABASE_URL")) as conn:
-    with conn.cursor(row_factory=dict_row) as cur:
-        # Check database size
-        cur.execute("""
-            SELECT 
-                pg_size_pretty(pg_database_size(current_database())) as db_size,
-                pg_database_size(current_database()) as db_size_bytes
-        """)
-        size = cur.fetchone()
-        
-        # Check table sizes
-        cur.execute("""
-            SELECT 
-                schemaname,
-                tablename,
-                pg_size_pretty(pg_total_relation_size(schemaname||'.'||tablename)) as size,
-                pg_total_relation_size(schemaname||'.'||tablename) as size_bytes
-            FROM pg_tables
-            WHERE schemaname = 'public'
-            ORDER BY pg_total_relation_size(schemaname||'.'||tablename) DESC
-            LIMIT 10
-        """)
-        tables = cur.fetchall()
-        
-        # Count records
-        cur.execute("SELECT COUNT(*) as count FROM podcasts")
-        podcasts = cur.fetchone()["count"]
-        
-        cur.execute("SELECT COUNT(*) as count FROM metrics_daily")
-        metrics = cur.fetchone()["count"]
-        
-        cur.execute("SELECT COUNT(*) as count FROM ranks_daily")
-        ranks = cur.fetchone()["count"]
-        
-        print(f"📊 Current Database Usage:")
-        print(f"   Total database size: {size['db_size']}")
-        print(f"   Database size (bytes): {size['db_size_bytes']:,}")
-        print(f"")
-        print(f"📈 Current Data:")
-        print(f"   Podcasts: {podcasts:,}")
-        print(f"   Metrics records: {metrics:,}")
-        print(f"   Rank records: {ranks:,}")
-        print(f"")
-        print(f"📋 Table Sizes:")
-        for table in tables:
-            print(f"   {table['tablename']}: {table['size']}")
-        
-        # Estimate growth
-        db_size_mb = size["db_size_bytes"] / (1024 * 1024)
-        free_limit_mb = 500
-        remaining_mb = free_limit_mb - db_size_mb
-        
-        print(f"")
-        print(f"💾 Storage Analysis:")
-        print(f"   Current usage: {db_size_mb:.2f} MB")
-        print(f"   Free tier limit: 500 MB")
-        print(f"   Remaining: {remaining_mb:.2f} MB ({remaining_mb/free_limit_mb*100:.1f}% left)")
-        
-        # Estimate how long until limit
-        if metrics > 0:
-            avg_record_size = size["db_size_bytes"] / metrics if metrics > 0 else 0
-            records_per_day = 116  # Current ingestion rate
-            growth_per_day_mb = (records_per_day * avg_record_size) / (1024 * 1024)
-            
-            if growth_per_day_mb > 0:
-                days_until_limit = remaining_mb / growth_per_day_mb
-                print(f"")
-                print(f"📅 Growth Estimate:")
-                print(f"   Records per day: ~{records_per_day}")
-                print(f"   Growth rate: ~{growth_per_day_mb:.4f} MB/day")
-                print(f"   Days until 500 MB limit: ~{days_until_limit:.0f} days")
-                print(f"   That's ~{days_until_limit/365:.1f} years at current rate")
-        
-        print(f"")
-        print(f"💰 Supabase Free Tier Limits:")
-        print(f"   ✅ 500 MB database storage")
-        print(f"   ✅ 2 GB bandwidth per month")
-        print(f"   ✅ 2 million API requests per month")
-        print(f"   ✅ 50,000 monthly active users")
-        print(f"")
-        print(f"💡 When you'll need to pay:")
-        print(f"   - Database storage > 500 MB")
-        print(f"   - Bandwidth > 2 GB/month")
-        print(f"   - API requests > 2 million/month")
-        print(f"")
-        print(f"📈 Check your usage:")
-        print(f"   https://supabase.com/dashboard/project/YOUR_PROJECT_ID/settings/billing")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.retention import RETENTION_DAILY_DAYS
+
+# Plan's database size limit (Supabase free tier: 500 MB)
+DB_SIZE_LIMIT_MB = float(os.environ.get("DB_SIZE_LIMIT_MB", "500"))
+# Days of ingested rows the growth rate is averaged over
+ADVISOR_GROWTH_DAYS = int(os.environ.get("ADVISOR_GROWTH_DAYS", "14"))
+# Tables and indexes smaller than this are not worth a finding (duplicates always are)
+ADVISOR_MIN_BYTES = int(os.environ.get("ADVISOR_MIN_BYTES", str(1024 * 1024)))
+
+# Tables written once per day, keyed by captured_on
+TIME_SERIES_TABLES = ["ranks_daily", "metrics_daily", "chart_memberships", "episode_metrics_daily", "podcast_listen_metrics_daily"]
+# BRIN fits a date column whose physical order follows its values this closely
+BRIN_MIN_CORRELATION = 0.9
+BLOAT_MIN_RATIO = 0.3
+PAGE_BYTES = 8192
+
+
+@dataclass(frozen=True)
+class ReadPattern:
+    """An API read that should be answered from one index."""
+
+    table: str
+    keys: tuple[str, ...]
+    include: tuple[str, ...]
+    purpose: str
+
+
+READ_PATTERNS = [
+    ReadPattern(
+        "metrics_daily",
+        ("captured_on", "rank"),
+        ("podcast_id", "delta_7d", "delta_30d", "momentum_score"),
+        "leaderboard (one day in rank order), its latest-day lookup and date-range exports",
+    ),
+]
+
+
+@dataclass
+class Table:
+    name: str
+    partitions: int = 0
+    rows: float = 0
+    heap_bytes: int = 0
+    index_bytes: int = 0
+    total_bytes: int = 0
+    bloat_bytes: int | None = None
+    dead_rows: int = 0
+    seq_scan: int = 0
+    seq_rows_read: int = 0
+    idx_scan: int = 0
+
+
+@dataclass
+class Index:
+    name: str
+    table: str
+    method: str
+    definition: str
+    keys: list[str]
+    include: list[str]
+    unique: bool
+    partial: bool
+    bytes: int = 0
+    scans: int = 0
+    bloat_bytes: int | None = None
+
+
+@dataclass
+class Finding:
+    kind: str
+    table: str
+    detail: str
+    sql: str
+    index: str | None = None
+    bytes: int = 0  # space it would free, where that applies
+
+
+@dataclass
+class Report:
+    generated_at: str
+    schema: str
+    database_bytes: int
+    limit_bytes: int
+    stats_reset: str | None
+    tables: list[Table] = field(default_factory=list)
+    indexes: list[Index] = field(default_factory=list)
+    growth: dict[str, Any] = field(default_factory=dict)
+    findings: list[Finding] = field(default_factory=list)
+
+
+def _widths(cursor) -> dict[tuple[str, str], int]:
+    cursor.execute(
+        "SELECT tablename, attname, avg_width FROM pg_stats WHERE schemaname = current_schema() AND NOT inherited"
+    )
+    return {(row["tablename"], row["attname"]): row["avg_width"] for row in cursor.fetchall()}
+
+
+def _expected_bytes(rows: float, widths: list[int | None], per_row: int, fill: float) -> int | None:
+    """Bytes ``rows`` rows of these column widths need, or None without statistics."""
+    if rows <= 0 or not widths or any(w is None for w in widths):
+        return None
+    row_bytes = per_row + sum(widths)
+    row_bytes += -row_bytes % 8  # MAXALIGN
+    per_page = max(1, int((PAGE_BYTES - 24) * fill // row_bytes))
+    return int(-(-rows // per_page)) * PAGE_BYTES
+
+
+def collect_tables(cursor, widths: dict[tuple[str, str], int]) -> dict[str, Table]:
+    cursor.execute(
+        """
+        SELECT c.relname, COALESCE(pg_partition_root(c.oid), c.oid)::regclass::text AS parent,
+               c.oid <> COALESCE(pg_partition_root(c.oid), c.oid) AS is_partition,
+               GREATEST(c.reltuples, COALESCE(s.n_live_tup, 0)) AS rows,
+               pg_relation_size(c.oid) AS heap_bytes, pg_indexes_size(c.oid) AS index_bytes,
+               pg_total_relation_size(c.oid) AS total_bytes,
+               COALESCE(s.n_dead_tup, 0) AS dead_rows, COALESCE(s.seq_scan, 0) AS seq_scan,
+               COALESCE(s.seq_tup_read, 0) AS seq_rows_read, COALESCE(s.idx_scan, 0) AS idx_scan,
+               ARRAY(SELECT attname FROM pg_attribute WHERE attrelid = c.oid AND attnum > 0 AND NOT attisdropped) AS columns
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE n.nspname = current_schema() AND c.relkind = 'r'
+        """
+    )
+    tables: dict[str, Table] = {}
+    for row in cursor.fetchall():
+        table = tables.setdefault(row["parent"], Table(row["parent"]))
+        table.partitions += int(row["is_partition"])
+        for name in ("rows", "heap_bytes", "index_bytes", "total_bytes", "dead_rows", "seq_scan", "seq_rows_read", "idx_scan"):
+            setattr(table, name, getattr(table, name) + row[name])
+        # Tuple header 23 + null bitmap, and a 4-byte line pointer per row
+        expected = _expected_bytes(row["rows"], [widths.get((row["relname"], c)) for c in row["columns"]], 28, 1.0)
+        if expected is not None:
+            table.bloat_bytes = (table.bloat_bytes or 0) + max(0, row["heap_bytes"] - expected)
+    return tables
+
+
+def collect_indexes(cursor, widths: dict[tuple[str, str], int]) -> dict[str, Index]:
+    cursor.execute(
+        """
+        SELECT ic.relname, tc.relname AS table_name, ic.relkind,
+               COALESCE(pg_partition_root(i.indexrelid), i.indexrelid)::regclass::text AS parent,
+               COALESCE(pg_partition_root(i.indrelid), i.indrelid)::regclass::text AS parent_table,
+               am.amname AS method, pg_get_indexdef(i.indexrelid) AS definition,
+               i.indisunique OR i.indisprimary AS is_unique, i.indpred IS NOT NULL AS partial,
+               i.indexprs IS NOT NULL AS expressions,
+               ARRAY(
+                 SELECT a.attname FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+                 JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                 ORDER BY k.ord
+               ) AS columns,
+               i.indnkeyatts AS key_count, ic.reltuples AS rows,
+               pg_relation_size(i.indexrelid) AS bytes, COALESCE(s.idx_scan, 0) AS scans
+        FROM pg_index i
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        JOIN pg_class tc ON tc.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = tc.relnamespace
+        JOIN pg_am am ON am.oid = ic.relam
+        LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = i.indexrelid
+        WHERE n.nspname = current_schema()
+        ORDER BY ic.relkind = 'I' DESC  -- partitioned (parent) indexes first
+        """
+    )
+    indexes: dict[str, Index] = {}
+    for row in cursor.fetchall():
+        index = indexes.get(row["parent"])
+        if index is None:
+            # Expression columns have no name; never treat such an index as a prefix of another
+            keys = row["columns"][: row["key_count"]] if not row["expressions"] else [row["definition"]]
+            index = indexes[row["parent"]] = Index(
+                name=row["parent"],
+                table=row["parent_table"],
+                method=row["method"],
+                definition=row["definition"],
+                keys=keys,
+                include=row["columns"][row["key_count"]:],
+                unique=row["is_unique"],
+                partial=row["partial"],
+            )
+        if row["relkind"] == "I":
+            continue
+        index.bytes += row["bytes"]
+        index.scans += row["scans"]
+        if index.method == "btree":
+            # IndexTuple header 8 and a 4-byte line pointer; leaf pages are filled to 90%
+            expected = _expected_bytes(row["rows"], [widths.get((row["table_name"], c)) for c in row["columns"]], 12, 0.9)
+            if expected is not None:
+                index.bloat_bytes = (index.bloat_bytes or 0) + max(0, row["bytes"] - expected - PAGE_BYTES)
+    return indexes
+
+
+def collect_growth(cursor, tables: dict[str, Table], database_bytes: int, limit_bytes: int) -> dict[str, Any]:
+    """Daily growth of the time-series tables from the rows ingested per captured_on."""
+    per_table = {}
+    for name in TIME_SERIES_TABLES:
+        table = tables.get(name)
+        if table is None:
+            continue
+        cursor.execute(
+            sql.SQL(
+                "SELECT count(*) AS rows, count(DISTINCT captured_on) AS days FROM {} "
+                "WHERE captured_on > current_date - %s"
+            ).format(sql.Identifier(name)),
+            (ADVISOR_GROWTH_DAYS,),
+        )
+        observed = cursor.fetchone()
+        rows_per_day = observed["rows"] / observed["days"] if observed["days"] else 0.0
+        bytes_per_row = table.total_bytes / table.rows if table.rows else 0.0
+        per_table[name] = {
+            "rows_per_day": round(rows_per_day, 1),
+            "bytes_per_row": round(bytes_per_row, 1),
+            "bytes_per_day": int(rows_per_day * bytes_per_row),
+            # With scripts/retention.py running, daily rows level off at this size
+            "retained_bytes": int(rows_per_day * bytes_per_row * RETENTION_DAILY_DAYS),
+        }
+    bytes_per_day = sum(t["bytes_per_day"] for t in per_table.values())
+    remaining = limit_bytes - database_bytes
+    return {
+        "window_days": ADVISOR_GROWTH_DAYS,
+        "bytes_per_day": bytes_per_day,
+        "days_until_limit": int(remaining / bytes_per_day) if bytes_per_day > 0 and remaining > 0 else None,
+        "limit_date": (
+            date.fromordinal(date.today().toordinal() + int(remaining / bytes_per_day)).isoformat()
+            if bytes_per_day > 0 and remaining > 0 else None
+        ),
+        "retention_daily_days": RETENTION_DAILY_DAYS,
+        "tables": per_table,
+    }
+
+
+def _covers(index: Index, keys: tuple[str, ...], include: tuple[str, ...]) -> bool:
+    return (
+        index.method == "btree"
+        and not index.partial
+        and tuple(index.keys[: len(keys)]) == keys
+        and set(include) <= set(index.keys) | set(index.include)
+    )
+
+
+def _correlations(cursor) -> dict[str, float]:
+    """Lowest captured_on correlation across each table's partitions."""
+    cursor.execute(
+        """
+        SELECT COALESCE(pg_partition_root(c.oid), c.oid)::regclass::text AS parent, min(abs(s.correlation)) AS correlation
+        FROM pg_stats s
+        JOIN pg_class c ON c.relname = s.tablename AND c.relnamespace = to_regnamespace(s.schemaname)
+        WHERE s.schemaname = current_schema() AND s.attname = 'captured_on' AND NOT s.inherited
+        GROUP BY 1
+        """
+    )
+    return {row["parent"]: row["correlation"] for row in cursor.fetchall()}
+
+
+def advise(tables: dict[str, Table], indexes: dict[str, Index], correlations: dict[str, float]) -> list[Finding]:
+    findings: list[Finding] = []
+    by_table: dict[str, list[Index]] = {}
+    for index in indexes.values():
+        by_table.setdefault(index.table, []).append(index)
+
+    redundant: set[str] = set()
+    for table_indexes in by_table.values():
+        for index in table_indexes:
+            if index.unique or index.partial or index.method != "btree":
+                continue
+            for other in table_indexes:
+                if other is index or other.partial or other.method != "btree" or other.name in redundant:
+                    continue
+                if not _covers(other, tuple(index.keys), tuple(index.include)):
+                    continue
+                # Identical indexes: keep the unique one, else the one named first
+                if other.keys == index.keys and not other.unique and other.name > index.name:
+                    continue
+                redundant.add(index.name)
+                findings.append(Finding(
+                    "duplicate_index", index.table,
+                    f"{index.name} ({', '.join(index.keys)}) is covered by {other.name} ({', '.join(other.keys)})",
+                    f"DROP INDEX {index.name};", index=index.name, bytes=index.bytes,
+                ))
+                break
+
+    for index in indexes.values():
+        if index.name in redundant:
+            continue
+        if index.scans == 0 and not index.unique and index.bytes >= ADVISOR_MIN_BYTES:
+            findings.append(Finding(
+                "unused_index", index.table, f"{index.name} has not been scanned since the statistics were reset",
+                f"DROP INDEX {index.name};", index=index.name, bytes=index.bytes,
+            ))
+        if index.bloat_bytes and index.bytes >= ADVISOR_MIN_BYTES and index.bloat_bytes >= BLOAT_MIN_RATIO * index.bytes:
+            findings.append(Finding(
+                "index_bloat", index.table, f"{index.name}: about {_mb(index.bloat_bytes)} of {_mb(index.bytes)} is free space",
+                f"REINDEX INDEX CONCURRENTLY {index.name};", index=index.name, bytes=index.bloat_bytes,
+            ))
+
+    for table in tables.values():
+        if table.total_bytes < ADVISOR_MIN_BYTES:
+            continue
+        if table.seq_scan > table.idx_scan and table.seq_rows_read / max(1, table.seq_scan) >= 1000:
+            findings.append(Finding(
+                "seq_scan_heavy", table.name,
+                f"{table.seq_scan:,} sequential scans read {table.seq_rows_read / table.seq_scan:,.0f} rows each "
+                f"(vs {table.idx_scan:,} index scans)",
+                f"-- EXPLAIN the queries on {table.name}; see the index findings for it",
+            ))
+        if table.bloat_bytes and table.bloat_bytes >= BLOAT_MIN_RATIO * table.heap_bytes:
+            dead = table.dead_rows / max(1.0, table.rows + table.dead_rows)
+            findings.append(Finding(
+                "table_bloat", table.name,
+                f"about {_mb(table.bloat_bytes)} of {_mb(table.heap_bytes)} is free space ({dead:.0%} dead rows)",
+                f"VACUUM (ANALYZE) {table.name};" if dead >= 0.1 else f"VACUUM FULL {table.name};  -- locks the table; or pg_repack",
+                bytes=table.bloat_bytes,
+            ))
+
+    for pattern in READ_PATTERNS:
+        table = tables.get(pattern.table)
+        if table is None or any(_covers(i, pattern.keys, pattern.include) for i in by_table.get(pattern.table, [])):
+            continue
+        name = f"idx_{pattern.table}_{'_'.join(pattern.keys)}"
+        findings.append(Finding(
+            "covering_index", pattern.table, f"no index answers {pattern.purpose}",
+            f"CREATE INDEX {name} ON {pattern.table} ({', '.join(pattern.keys)}) INCLUDE ({', '.join(pattern.include)});",
+            index=name,
+        ))
+
+    for name in TIME_SERIES_TABLES:
+        table = tables.get(name)
+        correlation = correlations.get(name)
+        if table is None or correlation is None or correlation < BRIN_MIN_CORRELATION:
+            continue
+        for index in by_table.get(name, []):
+            if index.method == "btree" and index.keys == ["captured_on"] and not index.include and not index.unique \
+                    and index.bytes >= ADVISOR_MIN_BYTES and index.name not in redundant:
+                findings.append(Finding(
+                    "brin_candidate", name,
+                    f"{index.name} is a {_mb(index.bytes)} B-tree on captured_on, which follows insertion order "
+                    f"(correlation {correlation:.2f}); a BRIN index is a few pages",
+                    f"CREATE INDEX {name}_captured_on_brin ON {name} USING brin (captured_on); DROP INDEX {index.name};",
+                    index=index.name, bytes=index.bytes,
+                ))
+    return findings
+
+
+def collect(conn) -> Report:
+    with conn.cursor(row_factory=dict_row) as cursor:
+        cursor.execute(
+            """
+            SELECT current_schema() AS schema, pg_database_size(current_database()) AS database_bytes,
+                   (SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()) AS stats_reset
+            """
+        )
+        meta = cursor.fetchone()
+        widths = _widths(cursor)
+        tables = collect_tables(cursor, widths)
+        indexes = collect_indexes(cursor, widths)
+        limit_bytes = int(DB_SIZE_LIMIT_MB * 1024 * 1024)
+        report = Report(
+            generated_at=datetime.now().isoformat(timespec="seconds"),
+            schema=meta["schema"],
+            database_bytes=meta["database_bytes"],
+            limit_bytes=limit_bytes,
+            stats_reset=meta["stats_reset"].isoformat() if meta["stats_reset"] else None,
+            tables=sorted(tables.values(), key=lambda t: t.total_bytes, reverse=True),
+            indexes=sorted(indexes.values(), key=lambda i: i.bytes, reverse=True),
+            growth=collect_growth(cursor, tables, meta["database_bytes"], limit_bytes),
+        )
+        report.findings = advise(tables, indexes, _correlations(cursor))
+    return report
+
+
+def _mb(n: float) -> str:
+    return f"{n / (1024 * 1024):.2f} MB"
+
+
+def print_text(report: Report, top: int = 15) -> None:
+    used = report.database_bytes / report.limit_bytes
+    print("📊 Database Usage:")
+    print(f"   {_mb(report.database_bytes)} of {_mb(report.limit_bytes)} ({used:.1%}), schema {report.schema}")
+    print(f"   Index statistics since {report.stats_reset or 'the server started'}")
+    print("")
+    print("📋 Tables:")
+    print(f"   {'table':<40} {'rows':>12} {'heap':>11} {'indexes':>11} {'bloat':>11} {'seq scans':>10} {'idx scans':>10}")
+    for t in report.tables[:top]:
+        name = f"{t.name} ({t.partitions} parts)" if t.partitions else t.name
+        bloat = _mb(t.bloat_bytes) if t.bloat_bytes is not None else "n/a"
+        print(
+            f"   {name:<40} {t.rows:>12,.0f} {_mb(t.heap_bytes):>11} {_mb(t.index_bytes):>11} {bloat:>11} "
+            f"{t.seq_scan:>10,} {t.idx_scan:>10,}"
+        )
+    print("")
+    print("🗂  Indexes:")
+    for i in report.indexes[:top]:
+        bloat = f", ~{_mb(i.bloat_bytes)} bloat" if i.bloat_bytes else ""
+        print(f"   {i.name:<44} {_mb(i.bytes):>11} {i.scans:>10,} scans{bloat}")
+    print("")
+    growth = report.growth
+    print(f"📈 Growth (rows per day over the last {growth['window_days']} days):")
+    for name, t in growth["tables"].items():
+        print(
+            f"   {name:<30} {t['rows_per_day']:>10,.0f} rows/day x {t['bytes_per_row']:>6,.0f} B "
+            f"= {_mb(t['bytes_per_day'])}/day; {_mb(t['retained_bytes'])} once retention keeps "
+            f"{growth['retention_daily_days']} days"
+        )
+    if growth["days_until_limit"] is not None:
+        print(f"   Limit reached in ~{growth['days_until_limit']:,} days ({growth['limit_date']}) without retention")
+    print("")
+    print(f"💡 Findings ({len(report.findings)}):")
+    for f in report.findings:
+        saves = f" [frees ~{_mb(f.bytes)}]" if f.bytes else ""
+        print(f"   {f.kind:<16} {f.table}: {f.detail}{saves}")
+        print(f"   {'':<16} {f.sql}")
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=("text", "json"), default="text", help="json is for CI to track over time")
+    args = parser.parse_args()
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL is required")
+
+    with connect(database_url) as conn:
+        report = collect(conn)
+    if args.format == "json":
+        print(json.dumps(asdict(report), default=str))
+    else:
+        print_text(report)
+
 
+if __name__ == "__main__":
+    main()
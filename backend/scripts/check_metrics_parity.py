@@ -0,0 +1,177 @@
+"""Check that scripts/metrics.py matches the original Python metrics exactly.
+
+Builds fixtures in a scratch schema (see scripts/benchlib.py): ranks with
+random gaps, plus metrics-only synthetic history before the first ranked day.
+Metrics are then computed three ways from the same starting point and compared
+row by row, floats included:
+
+  legacy   the original per-row Python implementation, day by day
+  daily    compute_metrics_range one day at a time, as ingest.py runs it
+  range    compute_metrics_range over the whole period in one statement
+
+Usage:
+    python scripts/check_metrics_parity.py [--podcasts 300] [--days 120] [--seed 1]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+from typing import Any
+
+from psycopg.rows import dict_row
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.benchlib import scratch_schema
+from scripts.metrics import compute_metrics_range, parse_horizons
+
+# The original weights; tolerance 0 is the original exact-day lookup
+HORIZONS = parse_horizons("1:0,7:0.7,30:0.3,90:0")
+COMPARED = ("rank", "delta_7d", "delta_30d", "momentum_score")
+
+
+def legacy_compute_metrics(conn, captured_on: date) -> None:
+    """The original ingest.compute_metrics, kept verbatim for comparison."""
+    with conn.cursor(row_factory=dict_row) as cursor:
+        cursor.execute(
+            """
+            SELECT podcast_id, rank
+            FROM ranks_daily
+            WHERE source = 'listennotes' AND captured_on = %s
+            """,
+            (captured_on,),
+        )
+        today_rows = cursor.fetchall()
+        if not today_rows:
+            return
+
+        def fetch_reference(day: date) -> dict[str, int]:
+            cursor.execute(
+                "SELECT podcast_id, rank FROM metrics_daily WHERE captured_on = %s",
+                (day,),
+            )
+            return {row["podcast_id"]: row["rank"] for row in cursor.fetchall()}
+
+        prev7 = fetch_reference(captured_on - timedelta(days=7))
+        prev30 = fetch_reference(captured_on - timedelta(days=30))
+
+        entries: list[tuple[Any, ...]] = []
+        for row in today_rows:
+            podcast_id = row["podcast_id"]
+            rank = row["rank"]
+            delta_7d = prev7.get(podcast_id)
+            delta_30d = prev30.get(podcast_id)
+
+            delta_7d_val = delta_7d - rank if delta_7d is not None else None
+            delta_30d_val = delta_30d - rank if delta_30d is not None else None
+
+            momentum_score: float | None = None
+            weights = []
+            values = []
+            if delta_7d_val is not None:
+                weights.append(0.7)
+                values.append(delta_7d_val)
+            if delta_30d_val is not None:
+                weights.append(0.3)
+                values.append(delta_30d_val)
+            if values:
+                momentum_score = sum(w * v for w, v in zip(weights, values))
+
+            entries.append(
+                (podcast_id, captured_on, rank, delta_7d_val, delta_30d_val, momentum_score)
+            )
+
+        cursor.executemany(
+            """
+            INSERT INTO metrics_daily (podcast_id, captured_on, rank, delta_7d, delta_30d, momentum_score)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (podcast_id, captured_on) DO UPDATE
+            SET rank = EXCLUDED.rank,
+                delta_7d = EXCLUDED.delta_7d,
+                delta_30d = EXCLUDED.delta_30d,
+                momentum_score = EXCLUDED.momentum_score
+            """,
+            entries,
+        )
+
+
+def build_fixtures(conn, podcasts: int, start: date, days: int, seed: int) -> None:
+    """One rank per podcast per day with ~15% gaps, after 40 days of metrics-only history."""
+    rng = random.Random(seed)
+    ids = [f"p{i}" for i in range(podcasts)]
+    with conn.cursor() as cursor:
+        cursor.executemany("INSERT INTO podcasts (id, title) VALUES (%s, %s)", [(i, i) for i in ids])
+        with cursor.copy("COPY metrics_daily (podcast_id, captured_on, rank) FROM STDIN") as copy:
+            for offset in range(-40, 0):
+                for podcast_id in ids:
+                    if rng.random() < 0.8:
+                        copy.write_row((podcast_id, start + timedelta(days=offset), rng.randint(1, 200)))
+        with cursor.copy("COPY ranks_daily (podcast_id, source, rank, country, captured_on) FROM STDIN") as copy:
+            for offset in range(days):
+                for podcast_id in ids:
+                    if rng.random() < 0.85:
+                        copy.write_row((podcast_id, "listennotes", rng.randint(1, 200), "us", start + timedelta(days=offset)))
+        cursor.execute("CREATE TEMP TABLE seed_metrics AS SELECT * FROM metrics_daily")
+    conn.commit()
+
+
+def reset_metrics(conn) -> None:
+    conn.execute("DELETE FROM metrics_daily")
+    conn.execute("INSERT INTO metrics_daily SELECT * FROM seed_metrics")
+    conn.commit()
+
+
+def snapshot(conn) -> dict[tuple[str, date], tuple[Any, ...]]:
+    rows = conn.execute(
+        f"SELECT podcast_id, captured_on, {', '.join(COMPARED)} FROM metrics_daily"
+    ).fetchall()
+    return {(row[0], row[1]): tuple(row[2:]) for row in rows}
+
+
+def compare(label: str, expected: dict, actual: dict) -> bool:
+    mismatched = [key for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key)]
+    print(f"   {label:<8} {len(actual):>9,} rows {len(mismatched):>7,} mismatches")
+    for key in sorted(mismatched)[:5]:
+        print(f"      {key}: expected {expected.get(key)} got {actual.get(key)}")
+    return not mismatched
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--podcasts", type=int, default=300)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    start = date.today() - timedelta(days=args.days)
+    days = [start + timedelta(days=offset) for offset in range(args.days)]
+    print(f"\n🧮 Metrics parity: {args.podcasts} podcasts over {args.days} days")
+    with scratch_schema("metrics_parity") as conn:
+        build_fixtures(conn, args.podcasts, start, args.days, args.seed)
+
+        reset_metrics(conn)
+        for day in days:
+            legacy_compute_metrics(conn, day)
+            conn.commit()
+        expected = snapshot(conn)
+
+        reset_metrics(conn)
+        for day in days:
+            compute_metrics_range(conn, day, day, horizons=HORIZONS, tolerance=0)
+            conn.commit()
+        ok = compare("daily", expected, snapshot(conn))
+
+        reset_metrics(conn)
+        compute_metrics_range(conn, days[0], days[-1], horizons=HORIZONS, tolerance=0)
+        conn.commit()
+        ok = compare("range", expected, snapshot(conn)) and ok
+
+    if not ok:
+        sys.exit(1)
+    print("✅ Identical")
+
+
+if __name__ == "__main__":
+    main()
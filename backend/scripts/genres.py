@@ -0,0 +1,356 @@
+"""ListenNotes genre catalog and the per-run chart schedule.
+
+The genre tree from ListenNotes ``/genres`` is cached on disk and in the
+``genres`` table, and refetched once both copies are older than
+LISTENNOTES_GENRES_TTL_HOURS. Operators choose charts with rules instead of
+editing code:
+
+  LISTENNOTES_GENRES          genre ids or names, comma separated; ``*`` = all
+                              top-level genres. Unset keeps DEFAULT_CATEGORIES.
+  LISTENNOTES_GENRES_EXCLUDE  ids or names; removes the genre and its subtree
+  LISTENNOTES_GENRE_DEPTH     how deep below an included genre to go (1 = top level)
+
+Each run schedules the overall chart first, then top-level genres (daily),
+then long-tail genres due after LISTENNOTES_LONG_TAIL_DAYS, least recently
+ingested first. It stops before LISTENNOTES_DAILY_BUDGET requests.
+
+Usage:
+    python scripts/genres.py [--refresh]   # print the catalog and today's plan
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Iterable
+
+import httpx
+from dotenv import load_dotenv
+from psycopg import connect
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.bulk_write import bulk_upsert
+from scripts.listennotes import ListenNotesClient
+
+# Charts ingested when no LISTENNOTES_GENRES rules are set
+DEFAULT_CATEGORIES: list[tuple[int | None, str]] = [
+    (None, "top"),
+    (93, "technology"),
+    (99, "news"),
+    (67, "comedy"),
+    (68, "business"),
+    (88, "health"),
+    (140, "education"),
+]
+
+LISTENNOTES_GENRE_DEPTH = int(os.environ.get("LISTENNOTES_GENRE_DEPTH", "1"))
+LISTENNOTES_GENRES_TTL_HOURS = float(os.environ.get("LISTENNOTES_GENRES_TTL_HOURS", "168"))
+LISTENNOTES_GENRES_CACHE = os.environ.get(
+    "LISTENNOTES_GENRES_CACHE",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+        "podcharts",
+        "listennotes_genres.json",
+    ),
+)
+# Long-tail (below top level) genres are refreshed every N days
+LISTENNOTES_LONG_TAIL_DAYS = int(os.environ.get("LISTENNOTES_LONG_TAIL_DAYS", "7"))
+# Chart page requests allowed per run; 0 = no limit
+LISTENNOTES_DAILY_BUDGET = int(os.environ.get("LISTENNOTES_DAILY_BUDGET", "0"))
+
+
+@dataclass(frozen=True)
+class Genre:
+    id: int
+    name: str
+    parent_id: int | None
+    depth: int  # 1 = top level, 0 = the catalog root if there is a single one
+    last_ingested_on: date | None = None
+
+    @property
+    def slug(self) -> str:
+        return re.sub(r"[^a-z0-9]+", "-", self.name.lower()).strip("-")
+
+
+def build_catalog(items: Iterable[dict[str, Any]]) -> list[Genre]:
+    """Turn ``/genres`` items into Genres with their depth in the tree."""
+    parents = {int(item["id"]): item.get("parent_id") for item in items}
+    names = {int(item["id"]): item.get("name") or str(item["id"]) for item in items}
+
+    def depth(genre_id: int) -> int:
+        seen = {genre_id}
+        level = 1
+        parent = parents.get(genre_id)
+        while parent is not None and parent in parents and parent not in seen:
+            seen.add(parent)
+            level += 1
+            parent = parents.get(parent)
+        return level
+
+    depths = {genre_id: depth(genre_id) for genre_id in parents}
+    roots = [genre_id for genre_id, level in depths.items() if level == 1]
+    # A single root ("Podcasts") is the overall chart; its children are the top level
+    shift = 1 if len(roots) == 1 and len(parents) > 1 else 0
+    return sorted(
+        (
+            Genre(id=genre_id, name=names[genre_id], parent_id=parents[genre_id], depth=depths[genre_id] - shift)
+            for genre_id in parents
+        ),
+        key=lambda g: (g.depth, g.id),
+    )
+
+
+def _read_disk(path: str, ttl_hours: float) -> list[Genre] | None:
+    try:
+        if time.time() - os.path.getmtime(path) > ttl_hours * 3600:
+            return None
+        with open(path) as fh:
+            return [Genre(**item) for item in json.load(fh)]
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def _write_disk(path: str, catalog: list[Genre]) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump([asdict(replace(g, last_ingested_on=None)) for g in catalog], fh)
+        os.replace(tmp, path)
+    except OSError as exc:
+        logging.warning("Could not write genre cache %s: %s", path, exc)
+
+
+def read_genres(conn) -> tuple[list[Genre], datetime | None]:
+    """The stored catalog (with last_ingested_on) and when it was fetched."""
+    rows = conn.execute(
+        "SELECT id, name, parent_id, depth, last_ingested_on, fetched_at FROM genres ORDER BY depth, id"
+    ).fetchall()
+    catalog = [Genre(*row[:5]) for row in rows]
+    return catalog, min((row[5] for row in rows), default=None)
+
+
+def store_genres(conn, catalog: list[Genre]) -> None:
+    """Replace the stored catalog, keeping last_ingested_on for genres that remain."""
+    fetched_at = datetime.now(timezone.utc)
+    with conn.cursor() as cursor:
+        bulk_upsert(
+            cursor,
+            "genres",
+            ["id", "name", "parent_id", "depth", "fetched_at"],
+            ((g.id, g.name, g.parent_id, g.depth, fetched_at) for g in catalog),
+            key_columns=["id"],
+        )
+        cursor.execute("DELETE FROM genres WHERE NOT (id = ANY(%s))", ([g.id for g in catalog],))
+    conn.commit()
+
+
+def mark_ingested(conn, genre_ids: Iterable[int], day: date) -> None:
+    """Record that these genres' charts were ingested for ``day``."""
+    conn.execute(
+        "UPDATE genres SET last_ingested_on = %s WHERE id = ANY(%s)",
+        (day, list(genre_ids)),
+    )
+
+
+async def fetch_catalog(client: ListenNotesClient) -> list[Genre]:
+    payload = await client.get_json("/genres", {"top_level_only": 0})
+    return build_catalog(payload.get("genres", []))
+
+
+async def load_catalog(
+    client: ListenNotesClient,
+    database_url: str | None = None,
+    *,
+    refresh: bool = False,
+    ttl_hours: float = LISTENNOTES_GENRES_TTL_HOURS,
+    cache_path: str = LISTENNOTES_GENRES_CACHE,
+) -> list[Genre]:
+    """The genre catalog from the first fresh copy: disk, ``genres`` table, API.
+
+    Ingest state (last_ingested_on) always comes from the table. A stale copy is
+    used if the API is unreachable; with no copy at all this raises.
+    """
+    stored: list[Genre] = []
+    stored_at = None
+    if database_url:
+        def read() -> tuple[list[Genre], datetime | None]:
+            with connect(database_url) as conn:
+                return read_genres(conn)
+
+        stored, stored_at = await asyncio.to_thread(read)
+    state = {g.id: g.last_ingested_on for g in stored}
+    stored_fresh = stored_at is not None and datetime.now(timezone.utc) - stored_at < timedelta(hours=ttl_hours)
+
+    catalog = None if refresh else _read_disk(cache_path, ttl_hours)
+    if catalog is None and not refresh and stored_fresh:
+        catalog = stored
+        _write_disk(cache_path, catalog)
+    if catalog is None:
+        try:
+            catalog = await fetch_catalog(client)
+        except httpx.HTTPError as exc:
+            catalog = stored or _read_disk(cache_path, float("inf"))
+            if not catalog:
+                raise
+            logging.warning("Genre catalog refresh failed, using the stale copy: %s", exc)
+            stored_fresh = True  # keep the table as it is
+        else:
+            logging.info("Fetched %s genres from ListenNotes", len(catalog))
+            _write_disk(cache_path, catalog)
+            stored_fresh = False
+    if database_url and not stored_fresh:
+        def write() -> None:
+            with connect(database_url) as conn:
+                store_genres(conn, catalog)
+
+        await asyncio.to_thread(write)
+    return [replace(g, last_ingested_on=state.get(g.id)) for g in catalog]
+
+
+def _parse_rules(spec: str) -> list[str]:
+    return [item.strip().lower() for item in spec.split(",") if item.strip()]
+
+
+def _matches(genre: Genre, rules: list[str]) -> bool:
+    return str(genre.id) in rules or genre.name.lower() in rules or genre.slug in rules
+
+
+def select_genres(
+    catalog: list[Genre],
+    include: str,
+    exclude: str = "",
+    max_depth: int = LISTENNOTES_GENRE_DEPTH,
+) -> list[Genre]:
+    """Genres picked by the include/exclude rules.
+
+    Included genres are always selected, and so are their descendants down to
+    ``max_depth``. ``*`` includes every top-level genre. Excluding a genre also
+    drops its subtree.
+    """
+    include_rules = _parse_rules(include)
+    exclude_rules = _parse_rules(exclude)
+    by_id = {g.id: g for g in catalog}
+
+    def ancestors(genre: Genre) -> Iterable[Genre]:
+        seen = set()
+        while genre.parent_id in by_id and genre.parent_id not in seen:
+            seen.add(genre.parent_id)
+            genre = by_id[genre.parent_id]
+            yield genre
+
+    selected = []
+    for genre in catalog:
+        if _matches(genre, exclude_rules) or any(_matches(a, exclude_rules) for a in ancestors(genre)):
+            continue
+        explicit = _matches(genre, include_rules) or ("*" in include_rules and genre.depth == 1)
+        inherited = genre.depth <= max_depth and any(
+            _matches(a, include_rules) or ("*" in include_rules and a.depth == 1) for a in ancestors(genre)
+        )
+        if explicit or inherited:
+            selected.append(genre)
+    return selected
+
+
+def schedule_genres(
+    genres: list[Genre],
+    today: date,
+    *,
+    cost_per_chart: int,
+    budget: int = LISTENNOTES_DAILY_BUDGET,
+    long_tail_days: int = LISTENNOTES_LONG_TAIL_DAYS,
+) -> list[Genre]:
+    """Genres to ingest today, in priority order and within ``budget`` requests.
+
+    ``cost_per_chart`` (pages x regions) is the request count for one genre; the
+    overall chart is assumed to be paid for first. Top-level genres are due
+    daily, deeper ones every ``long_tail_days``, least recently ingested first.
+    """
+    def due(genre: Genre) -> bool:
+        if genre.depth <= 1 or genre.last_ingested_on is None:
+            return True
+        return (today - genre.last_ingested_on).days >= long_tail_days
+
+    queue = sorted(
+        (g for g in genres if due(g)),
+        key=lambda g: (min(g.depth, 2), g.last_ingested_on or date.min, g.id),
+    )
+    if budget <= 0:
+        return queue
+    affordable = max(0, budget // cost_per_chart - 1)
+    if len(queue) > affordable:
+        logging.info("Request budget %s covers %s of %s due genres", budget, affordable, len(queue))
+    return queue[:affordable]
+
+
+def chart_categories(genres: list[Genre]) -> list[tuple[int | None, str]]:
+    """(genre_id, slug) pairs for an ingest run, overall chart first, slugs unique."""
+    categories: list[tuple[int | None, str]] = [(None, "top")]
+    used = {"top"}
+    for genre in genres:
+        slug = genre.slug if genre.slug not in used else f"{genre.slug}-{genre.id}"
+        used.add(slug)
+        categories.append((genre.id, slug))
+    return categories
+
+
+async def plan_categories(
+    client: ListenNotesClient,
+    database_url: str | None,
+    today: date,
+    *,
+    cost_per_chart: int,
+    include: str | None,
+    exclude: str = "",
+    refresh: bool = False,
+) -> list[tuple[int | None, str]]:
+    """Today's charts: DEFAULT_CATEGORIES without include rules, else the scheduled catalog."""
+    if not include:
+        return DEFAULT_CATEGORIES
+    try:
+        catalog = await load_catalog(client, database_url, refresh=refresh)
+    except httpx.HTTPError as exc:
+        logging.error("No genre catalog available, using DEFAULT_CATEGORIES: %s", exc)
+        return DEFAULT_CATEGORIES
+    selected = select_genres(catalog, include, exclude)
+    scheduled = schedule_genres(selected, today, cost_per_chart=cost_per_chart)
+    logging.info("Scheduled %s of %s selected genres", len(scheduled), len(selected))
+    return chart_categories(scheduled)
+
+
+async def _print_plan(api_key: str, database_url: str | None, refresh: bool) -> None:
+    include = os.environ.get("LISTENNOTES_GENRES")
+    async with ListenNotesClient(api_key) as client:
+        catalog = await load_catalog(client, database_url, refresh=refresh)
+        print(f"{len(catalog)} genres")
+        for genre in catalog:
+            print(f"{'  ' * max(genre.depth - 1, 0)}{genre.id:>5} {genre.name} [{genre.slug}]")
+        if include:
+            selected = select_genres(catalog, include, os.environ.get("LISTENNOTES_GENRES_EXCLUDE", ""))
+            print(f"\nToday's plan ({len(selected)} selected):")
+            for genre_id, slug in chart_categories(schedule_genres(selected, date.today(), cost_per_chart=1)):
+                print(f"  {genre_id or '-':>5} {slug}")
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--refresh", action="store_true", help="refetch the catalog even if cached")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("LISTENNOTES_API_KEY")
+    if not api_key:
+        raise RuntimeError("LISTENNOTES_API_KEY is required")
+    asyncio.run(_print_plan(api_key, os.environ.get("DATABASE_URL"), args.refresh))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,44 @@
 from __future__ import annotations
 
+import argparse
+import asyncio
+import hashlib
+import json
 import logging
 import os
-import time
+import sys
 from dataclasses import dataclass
-from datetime import date, timedelta
-from typing import Any, Iterable
+from datetime import date
+from typing import Any, Awaitable, Callable, Iterable
 
 import httpx
 from dotenv import load_dotenv
 from psycopg import connect
-from psycopg.rows import dict_row
 
-
-LISTENNOTES_BASE_URL = "https://listen-api.listennotes.com/api/v2"
-DEFAULT_CATEGORIES: list[tuple[int | None, str]] = [
-    (None, "top"),
-    (93, "technology"),
-    (99, "news"),
-    (67, "comedy"),
-    (68, "business"),
-    (88, "health"),
-    (140, "education"),
-]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.alerts import run_alerts
+from scripts.bulk_write import BulkWriteResult, bulk_upsert
+from scripts.genres import mark_ingested, plan_categories
+from scripts.ingest_runs import (
+    IngestRun,
+    clear_payloads,
+    create_run,
+    fetched_pages,
+    get_run,
+    latest_unfinished_run,
+    pending_charts,
+    record_page,
+    set_status,
+    skip_pending,
+    task_counts,
+)
+from scripts.listennotes import LISTENNOTES_BASE_URL, ListenNotesClient
+from scripts.metrics import compute_metrics_range, mark_dirty
+from scripts.telemetry import RunStats
+
+
+# Chart pages requested at once per category when LISTENNOTES_DEPTH spans several pages
+LISTENNOTES_PAGE_WAVE = int(os.environ.get("LISTENNOTES_PAGE_WAVE", "3"))
 
 
 @dataclass
@@ -49,73 +65,75 @@ def load_settings() -> dict[str, Any]:
         raise RuntimeError("LISTENNOTES_API_KEY is required")
 
     limit = int(os.environ.get("LISTENNOTES_LIMIT", "50"))
+    # How far down each chart to track; fetched LISTENNOTES_LIMIT per page
+    depth = int(os.environ.get("LISTENNOTES_DEPTH", str(limit)))
     regions = os.environ.get("LISTENNOTES_REGIONS", "us").split(",")
     regions = [r.strip().lower() for r in regions if r.strip()]
     if not regions:
         regions = ["us"]
 
-    categories = DEFAULT_CATEGORIES
     return {
         "database_url": database_url,
         "api_key": api_key,
+        "base_url": os.environ.get("LISTENNOTES_BASE_URL", LISTENNOTES_BASE_URL),
         "limit": max(1, min(limit, 50)),
+        "depth": max(1, depth),
         "regions": regions,
-        "categories": categories,
+        # Genre rules for scripts/genres.py; unset = DEFAULT_CATEGORIES
+        "genres": os.environ.get("LISTENNOTES_GENRES"),
+        "genres_exclude": os.environ.get("LISTENNOTES_GENRES_EXCLUDE", ""),
     }
 
 
-def fetch_category(
-    client: httpx.Client,
+async def fetch_page(
+    client: ListenNotesClient,
     *,
     genre_id: int | None,
-    category_slug: str,
     region: str,
-    limit: int,
-    captured_on: date,
-    max_retries: int = 3,
-) -> list[RankedPodcast]:
+    page: int,
+    page_size: int,
+) -> dict[str, Any]:
     params: dict[str, Any] = {
-        "page": 1,
+        "page": page,
         "region": region.upper(),
-        "page_size": limit,
+        "page_size": page_size,
         "safe_mode": 0,
     }
     if genre_id is not None:
         params["genre_id"] = genre_id
 
-    for attempt in range(max_retries):
-        try:
-            response = client.get("/best_podcasts", params=params, timeout=30.0)
-            response.raise_for_status()
-            payload = response.json()
-            podcasts = payload.get("podcasts", [])
-            break
-        except httpx.HTTPStatusError as exc:
-            if exc.response.status_code == 429:
-                # Rate limited - wait and retry
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) * 5  # Exponential backoff: 5s, 10s, 20s
-                    logging.warning(
-                        "Rate limited for %s (%s), waiting %s seconds before retry %s/%s",
-                        category_slug, region, wait_time, attempt + 1, max_retries
-                    )
-                    time.sleep(wait_time)
-                    continue
-                else:
-                    logging.error(
-                        "Rate limited for %s (%s) after %s retries, skipping",
-                        category_slug, region, max_retries
-                    )
-                    raise
-            else:
-                # Other HTTP errors - raise immediately
-                raise
+    # Rate limiting, 429s and retries are handled by the client
+    return await client.get_json("/best_podcasts", params)
+
+
+def is_last_page(payload: dict[str, Any], limit: int) -> bool:
+    return len(payload.get("podcasts", [])) < limit or payload.get("has_next") is False
+
 
+def rank_chart(
+    payloads: list[dict[str, Any]],
+    *,
+    category_slug: str,
+    region: str,
+    depth: int,
+    captured_on: date,
+) -> list[RankedPodcast]:
+    """Rank the podcasts of a chart's pages, in page order, down to ``depth``.
+
+    Ranks are positions on the chart; a podcast repeated on a later page (the
+    chart moved between requests) keeps its first, higher position.
+    """
+    podcasts = [item for payload in payloads for item in payload.get("podcasts", [])]
     ranked: list[RankedPodcast] = []
-    for idx, item in enumerate(podcasts, start=1):
+    seen: set[str] = set()
+    for idx, item in enumerate(podcasts[:depth], start=1):
+        podcast_id = item.get("id")
+        if podcast_id in seen:
+            continue
+        seen.add(podcast_id)
         ranked.append(
             RankedPodcast(
-                podcast_id=item.get("id"),
+                podcast_id=podcast_id,
                 title=item.get("title", "Untitled"),
                 publisher=item.get("publisher"),
                 category=category_slug,
@@ -128,179 +146,394 @@ def fetch_category(
     return ranked
 
 
-def upsert_podcasts(cursor, records: Iterable[RankedPodcast]) -> None:
-    tuples = [
-        (
-            r.podcast_id,
-            r.title,
-            r.publisher,
-            r.category,
-            r.rss_url,
-            r.country,
+PageRecorder = Callable[[int, dict[str, Any] | None, BaseException | None], Awaitable[None]]
+
+
+async def fetch_category(
+    client: ListenNotesClient,
+    *,
+    genre_id: int | None,
+    category_slug: str,
+    region: str,
+    limit: int,
+    captured_on: date,
+    depth: int | None = None,
+    wave: int = LISTENNOTES_PAGE_WAVE,
+    fetched: dict[int, dict[str, Any]] | None = None,
+    record: PageRecorder | None = None,
+) -> list[RankedPodcast]:
+    """Fetch the top ``depth`` of one chart, ``limit`` podcasts per page.
+
+    Pages are requested ``wave`` at a time and paging stops at the first short
+    page (or ``has_next: false``), so a chart shallower than ``depth`` costs at
+    most one wave of extra requests. If a later page fails, the pages before it
+    are kept. ``fetched`` holds pages stored by an earlier attempt, which are
+    not requested again, and ``record`` is awaited with every page's payload
+    or error as soon as it arrives.
+    """
+    depth = depth or limit
+    pages = -(-depth // limit)
+    payloads = dict(fetched or {})
+    ordered: list[dict[str, Any]] = []
+    page = 1
+    while page <= pages:
+        batch = range(page, min(page + wave, pages + 1))
+        missing = [number for number in batch if number not in payloads]
+        results = await asyncio.gather(
+            *(
+                fetch_page(client, genre_id=genre_id, region=region, page=number, page_size=limit)
+                for number in missing
+            ),
+            return_exceptions=True,
         )
-        for r in records
-    ]
-    if not tuples:
-        return
-
-    cursor.executemany(
-        """
-        INSERT INTO podcasts (id, title, publisher, category, rss_url, country)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ON CONFLICT (id) DO UPDATE
-        SET title = EXCLUDED.title,
-            publisher = EXCLUDED.publisher,
-            category = EXCLUDED.category,
-            rss_url = EXCLUDED.rss_url,
-            country = EXCLUDED.country
-        """,
-        tuples,
-    )
+        errors: dict[int, BaseException] = {}
+        for number, result in zip(missing, results):
+            if isinstance(result, BaseException):
+                errors[number] = result
+                if record and isinstance(result, httpx.HTTPError):
+                    await record(number, None, result)
+            else:
+                payloads[number] = result
+                if record:
+                    await record(number, result, None)
+
+        finished = False
+        for number in batch:
+            if number in errors:
+                error = errors[number]
+                if isinstance(error, httpx.HTTPError) and number > 1:
+                    logging.warning(
+                        "Stopping %s (%s) at page %s of %s: %s", category_slug, region, number, pages, error
+                    )
+                    finished = True
+                    break
+                raise error
+            ordered.append(payloads[number])
+            if is_last_page(payloads[number], limit):
+                finished = True
+                break
+        if finished:
+            break
+        page += wave
 
+    return rank_chart(ordered, category_slug=category_slug, region=region, depth=depth, captured_on=captured_on)
 
-def upsert_ranks(cursor, records: Iterable[RankedPodcast]) -> None:
-    tuples = [
-        (
-            r.podcast_id,
-            r.source,
-            r.rank,
-            r.country,
-            r.captured_on,
+
+@dataclass
+class MergedPodcast:
+    """One podcast's row, merged from every chart it appeared on in a run."""
+
+    podcast_id: str
+    title: str
+    publisher: str | None
+    category: str | None
+    rss_url: str | None
+    country: str
+
+    @property
+    def row(self) -> tuple[Any, ...]:
+        return (self.podcast_id, self.title, self.publisher, self.category, self.rss_url, self.country)
+
+    @property
+    def content_hash(self) -> str:
+        return hashlib.md5(json.dumps(self.row[1:]).encode()).hexdigest()
+
+
+def merge_podcasts(records: Iterable[RankedPodcast]) -> list[MergedPodcast]:
+    """Collapse chart records to one row per podcast.
+
+    ``category`` and ``country`` come from the podcast's best chart position,
+    preferring a genre chart over "top", so they no longer depend on which
+    chart happened to be written last.
+    """
+    best: dict[str, RankedPodcast] = {}
+    for record in records:
+        current = best.get(record.podcast_id)
+        key = (record.category == "top", record.rank, record.category or "", record.country)
+        if current is None or key < (current.category == "top", current.rank, current.category or "", current.country):
+            best[record.podcast_id] = record
+    return [
+        MergedPodcast(
+            podcast_id=r.podcast_id,
+            title=r.title,
+            publisher=r.publisher,
+            category=r.category,
+            rss_url=r.rss_url,
+            country=r.country,
         )
-        for r in records
+        for r in best.values()
     ]
-    if not tuples:
-        return
-
-    cursor.executemany(
-        """
-        INSERT INTO ranks_daily (podcast_id, source, rank, country, captured_on)
-        VALUES (%s, %s, %s, %s, %s)
-        ON CONFLICT (podcast_id, source, captured_on, country) DO UPDATE
-        SET rank = EXCLUDED.rank
-        """,
-        tuples,
+
+
+def upsert_podcasts(cursor, records: Iterable[RankedPodcast]) -> BulkWriteResult:
+    """Write the podcasts whose merged row is new or differs from the stored one.
+
+    Stored rows are matched on ``content_hash``, so unchanged podcasts are not
+    staged or written at all; they count as unchanged (and skipped) in the result.
+    """
+    merged = merge_podcasts(records)
+    cursor.execute(
+        "SELECT id, content_hash FROM podcasts WHERE id = ANY(%s)", ([p.podcast_id for p in merged],)
+    )
+    stored = dict(cursor.fetchall())
+    changed = [p for p in merged if stored.get(p.podcast_id) != p.content_hash]
+    result = bulk_upsert(
+        cursor,
+        "podcasts",
+        ["id", "title", "publisher", "category", "rss_url", "country", "content_hash"],
+        ((*p.row, p.content_hash) for p in changed),
+        key_columns=["id"],
+    )
+    result.staged = len(merged)
+    result.skipped = len(merged) - len(changed)
+    return result
+
+
+def upsert_ranks(cursor, records: Iterable[RankedPodcast]) -> BulkWriteResult:
+    """Write ranks and queue downstream metrics for any past day that changed."""
+    result = bulk_upsert(
+        cursor,
+        "ranks_daily",
+        ["podcast_id", "source", "rank", "country", "captured_on"],
+        ((r.podcast_id, r.source, r.rank, r.country, r.captured_on) for r in records),
+        key_columns=["podcast_id", "source", "captured_on", "country"],
+        returning=["podcast_id", "captured_on"],
+    )
+    mark_dirty(cursor, result.rows)
+    return result
+
+
+def upsert_memberships(cursor, records: Iterable[RankedPodcast]) -> BulkWriteResult:
+    """Record which charts each podcast ranked on; read by the category/country filters."""
+    return bulk_upsert(
+        cursor,
+        "chart_memberships",
+        ["podcast_id", "chart", "country", "captured_on", "rank"],
+        ((r.podcast_id, r.category, r.country, r.captured_on, r.rank) for r in records if r.category),
+        key_columns=["podcast_id", "captured_on", "chart", "country"],
     )
 
 
 def compute_metrics(conn, captured_on: date) -> None:
-    with conn.cursor(row_factory=dict_row) as cursor:
-        cursor.execute(
-            """
-            SELECT podcast_id, rank
-            FROM ranks_daily
-            WHERE source = 'listennotes' AND captured_on = %s
-            """,
-            (captured_on,),
-        )
-        today_rows = cursor.fetchall()
-        if not today_rows:
-            logging.info("No ranks to compute metrics for %s", captured_on)
-            return
-
-        def fetch_reference(day: date) -> dict[str, int]:
-            cursor.execute(
-                "SELECT podcast_id, rank FROM metrics_daily WHERE captured_on = %s",
-                (day,),
-            )
-            return {row["podcast_id"]: row["rank"] for row in cursor.fetchall()}
-
-        prev7 = fetch_reference(captured_on - timedelta(days=7))
-        prev30 = fetch_reference(captured_on - timedelta(days=30))
-
-        entries: list[tuple[Any, ...]] = []
-        for row in today_rows:
-            podcast_id = row["podcast_id"]
-            rank = row["rank"]
-            delta_7d = prev7.get(podcast_id)
-            delta_30d = prev30.get(podcast_id)
-
-            delta_7d_val = delta_7d - rank if delta_7d is not None else None
-            delta_30d_val = delta_30d - rank if delta_30d is not None else None
-
-            momentum_score: float | None = None
-            weights = []
-            values = []
-            if delta_7d_val is not None:
-                weights.append(0.7)
-                values.append(delta_7d_val)
-            if delta_30d_val is not None:
-                weights.append(0.3)
-                values.append(delta_30d_val)
-            if values:
-                momentum_score = sum(w * v for w, v in zip(weights, values))
-
-            entries.append(
-                (podcast_id, captured_on, rank, delta_7d_val, delta_30d_val, momentum_score)
-            )
+    """Compute deltas and momentum for everything ranked on ``captured_on``."""
+    written = compute_metrics_range(conn, captured_on, captured_on)
+    if written:
+        logging.info("Computed metrics for %s podcasts on %s", written, captured_on)
+    else:
+        logging.info("No changed metrics for %s", captured_on)
+
+
+async def fetch_stage(
+    settings: dict[str, Any], run: IngestRun | None, captured_on: date, stats: RunStats
+) -> IngestRun:
+    """Plan a new run if needed, then fetch its pending pages.
+
+    Each page is committed to the ledger as soon as it arrives, so a crash or
+    timeout only loses the requests in flight.
+    """
+    with connect(settings["database_url"], autocommit=True) as ledger:
+        async with ListenNotesClient(settings["api_key"], base_url=settings["base_url"]) as client:
+            if run is None:
+                pages = -(-settings["depth"] // settings["limit"])
+                categories = await plan_categories(
+                    client,
+                    settings["database_url"],
+                    captured_on,
+                    cost_per_chart=pages * len(settings["regions"]),
+                    include=settings["genres"],
+                    exclude=settings["genres_exclude"],
+                )
+                run = create_run(
+                    ledger,
+                    captured_on,
+                    {
+                        "regions": settings["regions"],
+                        "categories": categories,
+                        "limit": settings["limit"],
+                        "depth": settings["depth"],
+                        "genres": settings["genres"],
+                    },
+                )
+                logging.info("Started ingest run %s with %s charts", run.id, len(categories) * len(settings["regions"]))
+
+            limit = run.settings["limit"]
+            fetched = fetched_pages(ledger, run)
+            charts = pending_charts(ledger, run)
+
+            async def fetch_chart(region: str, genre_id: int | None, slug: str) -> None:
+                async def record(page: int, payload: dict[str, Any] | None, error: BaseException | None) -> None:
+                    with stats.db():
+                        await asyncio.to_thread(
+                            record_page,
+                            ledger,
+                            run.id,
+                            region,
+                            slug,
+                            page,
+                            payload=payload,
+                            error=error,
+                            last_page=payload is not None and is_last_page(payload, limit),
+                        )
 
-        cursor.executemany(
-            """
-            INSERT INTO metrics_daily (podcast_id, captured_on, rank, delta_7d, delta_30d, momentum_score)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (podcast_id, captured_on) DO UPDATE
-            SET rank = EXCLUDED.rank,
-                delta_7d = EXCLUDED.delta_7d,
-                delta_30d = EXCLUDED.delta_30d,
-                momentum_score = EXCLUDED.momentum_score
-            """,
-            entries,
+                ranked = await fetch_category(
+                    client,
+                    genre_id=genre_id,
+                    category_slug=slug,
+                    region=region,
+                    limit=limit,
+                    captured_on=run.captured_on,
+                    depth=run.settings["depth"],
+                    fetched=fetched.get((region, slug)),
+                    record=record,
+                )
+                logging.info("Fetched %s records for %s (%s)", len(ranked), slug, region)
+
+            results = await asyncio.gather(*(fetch_chart(*chart) for chart in charts), return_exceptions=True)
+            stats.add_http(client.stats)
+            for (region, _, slug), result in zip(charts, results):
+                if isinstance(result, httpx.HTTPError):
+                    logging.error("Failed to fetch %s (%s): %s", slug, region, result)
+                elif isinstance(result, BaseException):
+                    raise result
+    return run
+
+
+def load_stage(conn, run: IngestRun, stats: RunStats) -> None:
+    """Write podcasts and ranks from the run's stored pages in one transaction."""
+    limit = run.settings["limit"]
+    pages = fetched_pages(conn, run)
+    charts: list[list[RankedPodcast]] = []
+    for region in run.settings["regions"]:
+        for _, slug in run.categories:
+            stored = pages.get((region, slug), {})
+            payloads: list[dict[str, Any]] = []
+            # Pages in order from page 1, up to the first gap or the last page
+            while len(payloads) + 1 in stored:
+                payloads.append(stored[len(payloads) + 1])
+                if is_last_page(payloads[-1], limit):
+                    break
+            ranked = rank_chart(
+                payloads, category_slug=slug, region=region, depth=run.settings["depth"], captured_on=run.captured_on
+            )
+            if not ranked:
+                logging.warning("No podcasts returned for %s (%s)", slug, region)
+                continue
+            charts.append(ranked)
+
+    with conn.cursor() as cursor:
+        records = [record for chart in charts for record in chart]
+        podcasts = upsert_podcasts(cursor, records)
+        ranks = upsert_ranks(cursor, records)
+        memberships = upsert_memberships(cursor, records)
+        logging.info(
+            "Podcasts: %s new, %s changed, %s unchanged; ranks: %s new, %s changed, %s unchanged",
+            podcasts.inserted, podcasts.updated, podcasts.unchanged,
+            ranks.inserted, ranks.updated, ranks.unchanged,
+        )
+        stats.add_rows("podcasts", podcasts)
+        stats.add_rows("ranks_daily", ranks)
+        stats.add_rows("chart_memberships", memberships)
+
+    if run.settings.get("genres"):
+        loaded = {chart[0].category for chart in charts}
+        mark_ingested(
+            conn,
+            (genre_id for genre_id, slug in run.categories if genre_id is not None and slug in loaded),
+            run.captured_on,
         )
+    clear_payloads(conn, run)
+    set_status(conn, run, "loaded")
+    conn.commit()
+    logging.info("Loaded %s rank rows for run %s", len(records), run.id)
+
+
+def metrics_stage(conn, run: IngestRun) -> None:
+    compute_metrics(conn, run.captured_on)
+    set_status(conn, run, "complete")
+    conn.commit()
 
 
 def main() -> None:
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Ingest today's ListenNotes charts.")
+    parser.add_argument("--resume", type=int, metavar="RUN_ID", help="continue an earlier run where it stopped")
+    parser.add_argument("--new", action="store_true", help="start a new run even if today's is unfinished")
+    parser.add_argument(
+        "--allow-partial", action="store_true", help="load what was fetched even if some pages are still pending"
+    )
+    parser.add_argument("--base-url", help="ListenNotes API root, e.g. a local scripts/mock_listennotes.py")
+    args = parser.parse_args()
     settings = load_settings()
-    captured_on = date.today()
-
-    logging.info("Starting ListenNotes ingestion for %s", captured_on)
-
-    with httpx.Client(
-        base_url=LISTENNOTES_BASE_URL,
-        headers={
-            "X-ListenAPI-Key": settings["api_key"],
-            "User-Agent": "PodCharts/0.1 (+https://podcharts.xyz)",
-        },
-    ) as client, connect(settings["database_url"]) as conn:
+    if args.base_url:
+        settings["base_url"] = args.base_url
+    stats = RunStats(script="ingest", captured_on=date.today())
+    try:
+        run_ingest(settings, args, stats)
+    except BaseException:
+        if stats.status == "ok":
+            stats.status = "failed"
+        raise
+    finally:
+        stats.finish(settings["database_url"])
+
+
+def run_ingest(settings: dict[str, Any], args: argparse.Namespace, stats: RunStats) -> None:
+    with connect(settings["database_url"]) as conn:
         conn.autocommit = False
-        total_inserted = 0
-
-        with conn.cursor() as cursor:
-            for region in settings["regions"]:
-                for genre_id, slug in settings["categories"]:
-                    try:
-                        records = fetch_category(
-                            client,
-                            genre_id=genre_id,
-                            category_slug=slug,
-                            region=region,
-                            limit=settings["limit"],
-                            captured_on=captured_on,
-                        )
-                        # Add delay between requests to avoid rate limiting
-                        time.sleep(1)  # 1 second delay between category fetches
-                    except httpx.HTTPStatusError as exc:
-                        logging.error("Failed to fetch %s (%s): %s", slug, region, exc)
-                        # Wait longer on errors to avoid further rate limiting
-                        time.sleep(5)
-                        continue
-
-                    if not records:
-                        logging.warning("No podcasts returned for %s (%s)", slug, region)
-                        continue
-
-                    upsert_podcasts(cursor, records)
-                    upsert_ranks(cursor, records)
-                    total_inserted += len(records)
-                    logging.info("Fetched %s records for %s (%s)", len(records), slug, region)
-
-            compute_metrics(conn, captured_on)
+
+        if args.resume:
+            run = get_run(conn, args.resume)
+            if run is None:
+                raise SystemExit(f"No ingest run {args.resume}")
+        else:
+            run = None if args.new else latest_unfinished_run(conn, date.today())
+        conn.commit()
+
+        if run is None:
+            captured_on = date.today()
+            logging.info("Starting ListenNotes ingestion for %s", captured_on)
+        else:
+            captured_on = run.captured_on
+            stats.run_id = run.id
+            logging.info("Resuming ingest run %s for %s from stage %s", run.id, captured_on, run.status)
+        stats.captured_on = captured_on
+
+        if run is None or run.status == "fetching":
+            with stats.stage("fetch"):
+                run = asyncio.run(fetch_stage(settings, run, captured_on, stats))
+            stats.run_id = run.id
+            counts = task_counts(conn, run)
+            if counts.get("pending"):
+                if not args.allow_partial:
+                    set_status(conn, run, "fetching", f"{counts['pending']} pages pending")
+                    conn.commit()
+                    logging.error(
+                        "Ingest run %s has %s pending pages; rerun with --resume %s",
+                        run.id, counts["pending"], run.id,
+                    )
+                    stats.status = "incomplete"
+                    sys.exit(1)
+                logging.warning("Skipping %s pending pages of run %s", skip_pending(conn, run), run.id)
+            set_status(conn, run, "fetched")
             conn.commit()
 
-        logging.info("Ingestion complete: %s rank rows processed", total_inserted)
+        # Metrics only run once every task is settled and the ranks are loaded
+        if run.status == "fetched":
+            with stats.stage("upsert"), stats.db():
+                load_stage(conn, run, stats)
+        if run.status == "loaded":
+            with stats.stage("metrics"), stats.db():
+                metrics_stage(conn, run)
+        logging.info("Ingest run %s complete", run.id)
+
+        # Post-ingest stage; chart data is already committed if this fails
+        with stats.stage("alerts"):
+            try:
+                run_alerts(conn, captured_on)
+            except Exception:
+                conn.rollback()
+                logging.exception("Alert evaluation failed for %s", captured_on)
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -1,18 +1,75 @@
-"""Ingest episode data from ListenNotes API and compute listen metrics."""
+"""Ingest episode data from ListenNotes API and compute listen metrics.
+
+Every podcast in the catalog is synced, most important first: charted shows by
+their best current rank, then the rest by how long ago they were last synced.
+Requests share one rate-limited async client, and episodes are upserted in
+batches of ``EPISODES_BATCH_SIZE`` while fetching goes on.
+
+Syncs are incremental. ``episode_sync_state`` keeps each podcast's newest
+stored episode date and the ETag of its newest page. Podcasts are first checked
+in batches (``POST /podcasts``, up to ten per request), and only those with a
+newer episode are paged, newest first, down to the episodes already stored.
+A new podcast gets its newest page only; ``--backfill`` walks deep back
+catalogs later, a few pages per podcast per run, at lower concurrency.
+"""
 from __future__ import annotations
 
+import argparse
+import asyncio
+import hashlib
+import json
 import logging
 import os
-from datetime import date, timedelta
-from typing import Any
+import sys
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Iterable
 
 import httpx
 from dotenv import load_dotenv
 from psycopg import connect
 from psycopg.rows import dict_row
 
-
-LISTENNOTES_BASE_URL = "https://listen-api.listennotes.com/api/v2"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.bulk_write import BulkWriteResult, bulk_upsert
+from scripts.listennotes import LISTENNOTES_BASE_URL, LISTENNOTES_CONCURRENCY, ListenNotesClient
+from scripts.telemetry import RunStats
+
+
+EPISODE_COLUMNS = [
+    "id", "podcast_id", "title", "description", "audio_url", "audio_length_seconds", "published_at",
+]
+SYNC_COLUMNS = [
+    "podcast_id", "status", "episodes_seen", "last_error", "last_synced_at",
+    "latest_published_at", "etag", "backfill_cursor", "backfilled_at",
+]
+
+# Podcasts synced per run, highest priority first (0 = every podcast that is due)
+EPISODES_MAX_PODCASTS = int(os.environ.get("EPISODES_MAX_PODCASTS", "0"))
+# Episode rows per bulk upsert
+EPISODES_BATCH_SIZE = int(os.environ.get("EPISODES_BATCH_SIZE", "2000"))
+# Hours before a charted podcast is synced again
+EPISODES_REFRESH_HOURS = int(os.environ.get("EPISODES_REFRESH_HOURS", "20"))
+# Hours before a podcast that is off the charts is synced again
+EPISODES_UNCHARTED_REFRESH_HOURS = int(os.environ.get("EPISODES_UNCHARTED_REFRESH_HOURS", "168"))
+# Podcasts per batch lookup of their latest episode date (the API takes at most 10)
+EPISODES_LOOKUP_BATCH = int(os.environ.get("EPISODES_LOOKUP_BATCH", "10"))
+# Pages an incremental sync walks before leaving the rest of the gap to the backfill
+EPISODES_MAX_PAGES = int(os.environ.get("EPISODES_MAX_PAGES", "10"))
+# Backfill: podcasts per run, pages per podcast per run, and requests in flight
+EPISODES_BACKFILL_PODCASTS = int(os.environ.get("EPISODES_BACKFILL_PODCASTS", "100"))
+EPISODES_BACKFILL_PAGES = int(os.environ.get("EPISODES_BACKFILL_PAGES", "10"))
+EPISODES_BACKFILL_CONCURRENCY = int(os.environ.get("EPISODES_BACKFILL_CONCURRENCY", "1"))
+
+# Best rank of each podcast on the latest chart day
+RANKED_CTE = """
+    ranked AS (
+        SELECT podcast_id, MIN(rank) AS best_rank
+        FROM chart_memberships
+        WHERE captured_on = (SELECT MAX(captured_on) FROM chart_memberships)
+        GROUP BY podcast_id
+    )
+"""
 
 
 def load_settings() -> dict[str, Any]:
@@ -28,62 +85,181 @@ def load_settings() -> dict[str, Any]:
     return {
         "database_url": database_url,
         "api_key": api_key,
+        "base_url": os.environ.get("LISTENNOTES_BASE_URL", LISTENNOTES_BASE_URL),
     }
 
 
-def fetch_podcast_episodes(
-    client: httpx.Client,
+def due_podcasts(cursor, limit: int = EPISODES_MAX_PODCASTS) -> list[str]:
+    """Podcasts whose episodes are due for a sync, in priority order.
+
+    Charted podcasts come first, by their best rank on the latest chart day;
+    the rest follow, never-synced ones first and then the stalest.
+    """
+    cursor.execute(
+        f"""
+        WITH {RANKED_CTE}
+        SELECT p.id
+        FROM podcasts p
+        LEFT JOIN ranked r ON r.podcast_id = p.id
+        LEFT JOIN episode_sync_state s ON s.podcast_id = p.id
+        WHERE s.last_synced_at IS NULL
+           OR s.last_synced_at < now() - make_interval(
+                hours => CASE WHEN r.best_rank IS NULL THEN %(uncharted)s ELSE %(charted)s END)
+        ORDER BY r.best_rank NULLS LAST, s.last_synced_at NULLS FIRST, p.id
+        LIMIT %(limit)s
+        """,
+        {
+            "charted": EPISODES_REFRESH_HOURS,
+            "uncharted": EPISODES_UNCHARTED_REFRESH_HOURS,
+            "limit": limit or None,
+        },
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def backfill_podcasts(cursor, limit: int = EPISODES_BACKFILL_PODCASTS) -> list[str]:
+    """Synced podcasts whose back catalog is not fully walked yet, charted ones first.
+
+    Podcasts whose last sync came back 404 are left out until a sync finds them
+    again, so they can't take up every batch.
+    """
+    cursor.execute(
+        f"""
+        WITH {RANKED_CTE}
+        SELECT s.podcast_id
+        FROM episode_sync_state s
+        LEFT JOIN ranked r ON r.podcast_id = s.podcast_id
+        WHERE s.backfilled_at IS NULL AND s.last_synced_at IS NOT NULL AND s.status <> 'not_found'
+        ORDER BY r.best_rank NULLS LAST, s.podcast_id
+        LIMIT %(limit)s
+        """,
+        {"limit": limit or None},
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _from_ms(pub_date_ms: int) -> datetime:
+    return datetime.fromtimestamp(pub_date_ms / 1000, tz=timezone.utc)
+
+
+@dataclass
+class SyncState:
+    """One podcast's ``episode_sync_state`` row, in SYNC_COLUMNS order."""
+
+    podcast_id: str
+    status: str = "new"  # until synced: then ok, unchanged, not_found or failed
+    episodes_seen: int = 0
+    last_error: str | None = None
+    last_synced_at: datetime | None = None
+    latest_published_at: datetime | None = None
+    etag: str | None = None
+    backfill_cursor: int | None = None
+    backfilled_at: datetime | None = None
+
+    @property
+    def latest_ms(self) -> int | None:
+        if self.latest_published_at is None:
+            return None
+        return int(self.latest_published_at.timestamp() * 1000)
+
+    def saw(self, episodes: list[dict[str, Any]]) -> None:
+        """Raise the high-water mark to the newest of ``episodes``."""
+        dates = [ep["pub_date_ms"] for ep in episodes if ep.get("pub_date_ms")]
+        if dates and (self.latest_ms is None or max(dates) > self.latest_ms):
+            self.latest_published_at = _from_ms(max(dates))
+
+    def row(self) -> tuple[Any, ...]:
+        return tuple(getattr(self, column) for column in SYNC_COLUMNS)
+
+
+def load_states(cursor, podcast_ids: list[str]) -> dict[str, SyncState]:
+    """Sync state of ``podcast_ids``; podcasts never synced get a fresh one."""
+    states = {podcast_id: SyncState(podcast_id) for podcast_id in podcast_ids}
+    cursor.execute(
+        f"SELECT {', '.join(SYNC_COLUMNS)} FROM episode_sync_state WHERE podcast_id = ANY(%s)",
+        (podcast_ids,),
+    )
+    for row in cursor.fetchall():
+        states[row[0]] = SyncState(*row)
+    return states
+
+
+async def fetch_episode_page(
+    client: ListenNotesClient,
     podcast_id: str,
     *,
     next_episode_pub_date: int | None = None,
-) -> list[dict[str, Any]]:
-    """Fetch episodes for a podcast from ListenNotes API."""
-    # Use the /podcasts/{id} endpoint which returns podcast info with episodes
-    params: dict[str, Any] = {
-        "sort": "recent_first",
-    }
+    etag: str | None = None,
+) -> tuple[dict[str, Any] | None, str | None]:
+    """One page of a podcast's episodes, newest first, and its ETag.
+
+    Returns ``(None, etag)`` when the page still matches ``etag``.
+    """
+    params: dict[str, Any] = {"sort": "recent_first"}
     if next_episode_pub_date:
         params["next_episode_pub_date"] = next_episode_pub_date
-
-    try:
-        response = client.get(
-            f"/podcasts/{podcast_id}",
-            params=params,
-            timeout=30.0,
-        )
-        response.raise_for_status()
-        payload = response.json()
-        
-        # Get episodes from the response
-        # ListenNotes API returns episodes in the response
-        episodes = payload.get("episodes", [])
-        
-        # If no episodes in direct response, try fetching from episodes endpoint
-        if not episodes:
-            # Try the episodes endpoint directly
-            episodes_response = client.get(
-                f"/podcasts/{podcast_id}/episodes",
-                params={"sort": "recent_first", "page_size": 10},
-                timeout=30.0,
-            )
-            if episodes_response.status_code == 200:
-                episodes_payload = episodes_response.json()
-                episodes = episodes_payload.get("episodes", [])
-        
-        return episodes
-    except httpx.HTTPStatusError as e:
-        if e.response.status_code == 404:
-            logging.warning("Podcast %s not found", podcast_id)
-            return []
-        raise
-
-
-def upsert_episodes(cursor, episodes: list[dict[str, Any]], podcast_id: str) -> None:
-    """Upsert episodes into the database."""
-    if not episodes:
-        return
-
-    tuples = []
+    return await client.get_json_if_changed(f"/podcasts/{podcast_id}", params, etag=etag)
+
+
+async def latest_episode_dates(client: ListenNotesClient, podcast_ids: list[str]) -> dict[str, int | None]:
+    """``latest_pub_date_ms`` of up to EPISODES_LOOKUP_BATCH podcasts in one request."""
+    payload = await client.post_json("/podcasts", {"ids": ",".join(podcast_ids), "show_latest_episodes": 0})
+    return {podcast["id"]: podcast.get("latest_pub_date_ms") for podcast in payload.get("podcasts") or []}
+
+
+async def sync_recent(client: ListenNotesClient, state: SyncState) -> list[dict[str, Any]] | None:
+    """Page from the newest episode down to the stored ones; ``None`` if nothing changed.
+
+    A podcast without a high-water mark gets its newest page only and is left
+    to the backfill from there.
+    """
+    mark = state.latest_ms
+    payload, state.etag = await fetch_episode_page(client, state.podcast_id, etag=state.etag)
+    if payload is None:
+        return None
+    episodes = list(payload.get("episodes") or [])
+    next_date = payload.get("next_episode_pub_date")
+    if mark is None:
+        state.backfill_cursor = next_date
+        state.backfilled_at = None if next_date else datetime.now(timezone.utc)
+    else:
+        pages = 1
+        # Pages are newest first: stop once one reaches an episode already stored
+        while next_date and episodes and episodes[-1].get("pub_date_ms", 0) > mark:
+            if pages >= EPISODES_MAX_PAGES:
+                logging.warning(
+                    "Podcast %s has more than %s pages of new episodes; leaving the rest to the backfill",
+                    state.podcast_id, EPISODES_MAX_PAGES,
+                )
+                state.backfill_cursor, state.backfilled_at = next_date, None
+                break
+            payload, _ = await fetch_episode_page(client, state.podcast_id, next_episode_pub_date=next_date)
+            episodes.extend(payload.get("episodes") or [])
+            next_date = payload.get("next_episode_pub_date")
+            pages += 1
+    state.saw(episodes)
+    return episodes
+
+
+async def backfill_older(client: ListenNotesClient, state: SyncState) -> list[dict[str, Any]]:
+    """Walk up to EPISODES_BACKFILL_PAGES further back from the podcast's backfill cursor."""
+    episodes: list[dict[str, Any]] = []
+    next_date = state.backfill_cursor
+    for _ in range(EPISODES_BACKFILL_PAGES):
+        payload, _ = await fetch_episode_page(client, state.podcast_id, next_episode_pub_date=next_date)
+        episodes.extend(payload.get("episodes") or [])
+        next_date = payload.get("next_episode_pub_date")
+        if not next_date:
+            break
+    state.backfill_cursor = next_date
+    state.backfilled_at = None if next_date else datetime.now(timezone.utc)
+    state.saw(episodes)
+    return episodes
+
+
+def episode_rows(episodes: list[dict[str, Any]], podcast_id: str) -> list[tuple[Any, ...]]:
+    """Convert API episodes to rows in EPISODE_COLUMNS order."""
+    rows = []
     for ep in episodes:
         ep_id = ep.get("id")
         if not ep_id:
@@ -92,12 +268,11 @@ def upsert_episodes(cursor, episodes: list[dict[str, Any]], podcast_id: str) ->
         published_at = None
         if ep.get("pub_date_ms"):
             try:
-                from datetime import datetime
-                published_at = datetime.fromtimestamp(ep["pub_date_ms"] / 1000)
+                published_at = _from_ms(ep["pub_date_ms"])
             except (ValueError, TypeError):
                 pass
 
-        tuples.append((
+        rows.append((
             ep_id,
             podcast_id,
             ep.get("title", "Untitled Episode"),
@@ -106,24 +281,183 @@ def upsert_episodes(cursor, episodes: list[dict[str, Any]], podcast_id: str) ->
             ep.get("audio_length_sec"),
             published_at,
         ))
-
-    if not tuples:
-        return
-
-    cursor.executemany(
-        """
-        INSERT INTO episodes (id, podcast_id, title, description, audio_url, audio_length_seconds, published_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (id) DO UPDATE
-        SET title = EXCLUDED.title,
-            description = EXCLUDED.description,
-            audio_url = EXCLUDED.audio_url,
-            audio_length_seconds = EXCLUDED.audio_length_seconds,
-            published_at = EXCLUDED.published_at,
-            updated_at = now()
-        """,
-        tuples,
+    return rows
+
+
+def episode_hash(row: tuple[Any, ...]) -> str:
+    """md5 of an episode row's columns after the id (``episodes.content_hash``)."""
+    return hashlib.md5(json.dumps(row[1:], default=str).encode()).hexdigest()
+
+
+def upsert_episodes(cursor, rows: Iterable[tuple[Any, ...]]) -> BulkWriteResult:
+    """Write the episodes that are new or differ from the stored row.
+
+    Stored rows are matched on ``content_hash``, so unchanged episodes (and
+    their large descriptions) are not staged or written at all; they count as
+    unchanged and skipped in the result. updated_at only moves on real changes.
+    """
+    hashes = {row[0]: (row, episode_hash(row)) for row in rows}
+    cursor.execute("SELECT id, content_hash FROM episodes WHERE id = ANY(%s)", (list(hashes),))
+    stored = dict(cursor.fetchall())
+    changed = [(*row, digest) for episode_id, (row, digest) in hashes.items() if stored.get(episode_id) != digest]
+    result = bulk_upsert(
+        cursor,
+        "episodes",
+        [*EPISODE_COLUMNS, "content_hash"],
+        changed,
+        key_columns=["id"],
+        # Rows stored before hashing only gain their hash; that is not a change
+        extra_updates="updated_at = CASE WHEN t.content_hash IS NULL THEN t.updated_at ELSE now() END",
+    )
+    result.staged = len(hashes)
+    result.skipped = len(hashes) - len(changed)
+    return result
+
+
+def record_sync(cursor, states: Iterable[SyncState]) -> None:
+    """Upsert ``episode_sync_state`` rows.
+
+    A failed attempt keeps everything from the last good sync, so the podcast
+    stays due and is retried on the next run.
+    """
+    states = list(states)
+    bulk_upsert(
+        cursor,
+        "episode_sync_state",
+        SYNC_COLUMNS,
+        [s.row() for s in states if s.status != "failed"],
+        key_columns=["podcast_id"],
     )
+    bulk_upsert(
+        cursor,
+        "episode_sync_state",
+        SYNC_COLUMNS,
+        [s.row() for s in states if s.status == "failed"],
+        key_columns=["podcast_id"],
+        update_columns=["status", "last_error"],
+    )
+
+
+@dataclass
+class EpisodeBatches:
+    """Buffers fetched episodes and writes them in bulk off the event loop.
+
+    Each batch commits its episodes together with the sync state of the
+    podcasts they came from, so an interrupted run loses only the last batch.
+    """
+
+    conn: Any
+    stats: RunStats
+    batch_size: int = EPISODES_BATCH_SIZE
+    rows: list[tuple[Any, ...]] = field(default_factory=list)
+    synced: list[SyncState] = field(default_factory=list)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    async def add(self, state: SyncState, rows: list[tuple[Any, ...]]) -> None:
+        self.rows.extend(rows)
+        self.synced.append(state)
+        if len(self.rows) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        rows, synced = self.rows, self.synced
+        self.rows, self.synced = [], []
+        if not synced:
+            return
+        async with self._lock:
+            with self.stats.db():
+                written = await asyncio.to_thread(self._write, rows, synced)
+        self.stats.add_rows("episodes", written)
+
+    def _write(self, rows: list[tuple[Any, ...]], synced: list[SyncState]) -> BulkWriteResult:
+        with self.conn.cursor() as cursor:
+            written = upsert_episodes(cursor, rows)
+            record_sync(cursor, synced)
+        self.conn.commit()
+        return written
+
+
+async def sync_episodes(
+    settings: dict[str, Any], conn, podcast_ids: list[str], stats: RunStats, *, backfill: bool = False
+) -> dict[str, int]:
+    """Sync (or backfill) every podcast in ``podcast_ids`` concurrently; returns counts by outcome."""
+    with stats.db():
+        states = await asyncio.to_thread(_load_states, conn, podcast_ids)
+    batches = EpisodeBatches(conn, stats)
+    outcomes: dict[str, int] = {}
+    concurrency = EPISODES_BACKFILL_CONCURRENCY if backfill else LISTENNOTES_CONCURRENCY
+    chunk = 1 if backfill else max(1, EPISODES_LOOKUP_BATCH)
+    pending = iter([podcast_ids[i:i + chunk] for i in range(0, len(podcast_ids), chunk)])
+
+    async with ListenNotesClient(settings["api_key"], base_url=settings["base_url"], concurrency=concurrency) as client:
+
+        async def finish(
+            state: SyncState, status: str, episodes: list[dict[str, Any]], error: str | None = None
+        ) -> None:
+            outcomes[status] = outcomes.get(status, 0) + 1
+            state.status, state.last_error, state.episodes_seen = status, error, len(episodes)
+            if status in ("ok", "unchanged", "not_found") and not backfill:
+                state.last_synced_at = datetime.now(timezone.utc)
+            await batches.add(state, episode_rows(episodes, state.podcast_id))
+
+        async def sync_podcast(state: SyncState, walk: Callable[..., Awaitable[Any]]) -> None:
+            try:
+                episodes = await walk(client, state)
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code == 404:
+                    logging.warning("Podcast %s not found", state.podcast_id)
+                    await finish(state, "not_found", [])
+                    return
+                error = str(exc)
+            except httpx.TransportError as exc:
+                error = f"{type(exc).__name__}: {exc}"
+            else:
+                await finish(state, "unchanged" if episodes is None else "ok", episodes or [])
+                return
+            logging.error("Failed to fetch episodes for podcast %s: %s", state.podcast_id, error)
+            await finish(state, "failed", [], error)
+
+        async def sync_chunk(ids: list[str]) -> None:
+            walk_ids = ids
+            known = [i for i in ids if states[i].latest_ms is not None]
+            if known and not backfill:
+                # One request tells which of up to ten podcasts have anything new
+                try:
+                    latest = await latest_episode_dates(client, known)
+                except httpx.HTTPError as exc:
+                    logging.warning("Batch lookup of %s podcasts failed (%s); paging each", len(known), exc)
+                    latest = {}
+                walk_ids = []
+                for podcast_id in ids:
+                    newest = latest.get(podcast_id)
+                    if newest is not None and newest <= states[podcast_id].latest_ms:
+                        await finish(states[podcast_id], "unchanged", [])
+                    else:
+                        walk_ids.append(podcast_id)
+            for podcast_id in walk_ids:
+                await sync_podcast(states[podcast_id], backfill_older if backfill else sync_recent)
+
+        async def worker() -> None:
+            # Workers share one iterator, so each chunk is taken exactly once
+            for ids in pending:
+                await sync_chunk(ids)
+
+        try:
+            async with asyncio.TaskGroup() as group:
+                # Twice the client's concurrency keeps requests in flight while others wait on a flush
+                for _ in range(min(len(podcast_ids), 2 * concurrency)):
+                    group.create_task(worker())
+            await batches.flush()
+        finally:
+            stats.add_http(client.stats)
+    return outcomes
+
+
+def _load_states(conn, podcast_ids: list[str]) -> dict[str, SyncState]:
+    with conn.cursor() as cursor:
+        states = load_states(cursor, podcast_ids)
+    conn.commit()
+    return states
 
 
 def compute_episode_metrics(conn, captured_on: date) -> None:
@@ -169,18 +503,16 @@ def compute_episode_metrics(conn, captured_on: date) -> None:
                 ep["is_new_episode"],
             ))
 
-        cursor.executemany(
-            """
-            INSERT INTO episode_metrics_daily (
-                episode_id, captured_on, total_listen_time_seconds, unique_listeners,
-                completion_rate, episode_age_days, is_new_episode
-            )
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (episode_id, captured_on) DO UPDATE
-            SET episode_age_days = EXCLUDED.episode_age_days,
-                is_new_episode = EXCLUDED.is_new_episode
-            """,
+        bulk_upsert(
+            cursor,
+            "episode_metrics_daily",
+            [
+                "episode_id", "captured_on", "total_listen_time_seconds", "unique_listeners",
+                "completion_rate", "episode_age_days", "is_new_episode",
+            ],
             entries,
+            key_columns=["episode_id", "captured_on"],
+            update_columns=["episode_age_days", "is_new_episode"],
         )
 
 
@@ -242,46 +574,68 @@ def compute_podcast_listen_metrics(conn, captured_on: date) -> None:
 
 def main() -> None:
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="ListenNotes API root, e.g. a local scripts/mock_listennotes.py")
+    parser.add_argument(
+        "--backfill",
+        action="store_true",
+        help="walk back catalogs of podcasts not fully backfilled yet instead of syncing new episodes",
+    )
+    parser.add_argument(
+        "--max-podcasts",
+        type=int,
+        help="podcasts per run, highest priority first; 0 = all "
+        "(default EPISODES_MAX_PODCASTS, or EPISODES_BACKFILL_PODCASTS with --backfill)",
+    )
+    args = parser.parse_args()
     settings = load_settings()
+    if args.base_url:
+        settings["base_url"] = args.base_url
+    if args.max_podcasts is None:
+        args.max_podcasts = EPISODES_BACKFILL_PODCASTS if args.backfill else EPISODES_MAX_PODCASTS
     captured_on = date.today()
+    stats = RunStats(script="ingest_episodes", captured_on=captured_on)
+    stage = "backfill" if args.backfill else "episodes"
 
-    logging.info("Starting episode ingestion for %s", captured_on)
-
-    with httpx.Client(
-        base_url=LISTENNOTES_BASE_URL,
-        headers={
-            "X-ListenAPI-Key": settings["api_key"],
-            "User-Agent": "PodCharts/0.1 (+https://podcharts.xyz)",
-        },
-    ) as client, connect(settings["database_url"]) as conn:
-        conn.autocommit = False
+    logging.info("Starting episode %s for %s", "backfill" if args.backfill else "ingestion", captured_on)
 
-        with conn.cursor(row_factory=dict_row) as cursor:
-            # Get all podcasts
-            cursor.execute("SELECT id FROM podcasts LIMIT 100")  # Limit for testing
-            podcasts = cursor.fetchall()
-
-            total_episodes = 0
-            for pod in podcasts:
-                podcast_id = pod["id"]
-                try:
-                    episodes = fetch_podcast_episodes(client, podcast_id)
-                    if episodes:
-                        upsert_episodes(cursor, episodes, podcast_id)
-                        total_episodes += len(episodes)
-                        logging.info("Fetched %s episodes for podcast %s", len(episodes), podcast_id)
-                except Exception as e:
-                    logging.error("Failed to fetch episodes for podcast %s: %s", podcast_id, e)
-                    continue
-
-            # Compute metrics
-            compute_episode_metrics(conn, captured_on)
-            compute_podcast_listen_metrics(conn, captured_on)
+    try:
+        with connect(settings["database_url"]) as conn:
+            conn.autocommit = False
+
+            with stats.db(), conn.cursor() as cursor:
+                if args.backfill:
+                    podcast_ids = backfill_podcasts(cursor, args.max_podcasts)
+                else:
+                    podcast_ids = due_podcasts(cursor, args.max_podcasts)
             conn.commit()
-
-        logging.info("Episode ingestion complete: %s episodes processed", total_episodes)
+            logging.info("%s podcasts due for an episode %s", len(podcast_ids), "backfill" if args.backfill else "sync")
+
+            with stats.stage(stage):
+                outcomes = asyncio.run(sync_episodes(settings, conn, podcast_ids, stats, backfill=args.backfill))
+            written = stats.rows.get("episodes", {})
+            logging.info(
+                "Synced %s podcasts (%s); episodes: %s new, %s changed, %s unchanged (%s skipped by hash)",
+                len(podcast_ids),
+                ", ".join(f"{count} {status}" for status, count in sorted(outcomes.items())) or "none",
+                written.get("inserted", 0), written.get("updated", 0), written.get("unchanged", 0),
+                written.get("skipped", 0),
+            )
+            if outcomes.get("failed"):
+                stats.status = "incomplete"
+
+            # Compute metrics (only recent episodes count, which the backfill doesn't add)
+            if not args.backfill:
+                with stats.stage("metrics"), stats.db():
+                    compute_episode_metrics(conn, captured_on)
+                    compute_podcast_listen_metrics(conn, captured_on)
+                    conn.commit()
+    except BaseException:
+        stats.status = "failed"
+        raise
+    finally:
+        stats.finish(settings["database_url"])
 
 
 if __name__ == "__main__":
     main()
-
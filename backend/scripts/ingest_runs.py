@@ -0,0 +1,192 @@
+"""Ledger of ingestion runs (ingest_runs) and their chart page tasks (ingest_tasks).
+
+A run plans one task per region x category x page up front and moves through
+stages, each recorded in ``ingest_runs.status``:
+
+  fetching   tasks are fetched; each page's payload is committed as it arrives
+  fetched    no task is pending (every page is done, skipped or failed)
+  loaded     podcasts and ranks were written from the stored payloads
+  complete   metrics were computed
+
+Resuming a run only does what is left: pending pages, then the later stages.
+A short page marks the chart's later pages skipped. A page that fails with a
+non-retryable 4xx is marked failed, and so is the rest of its chart. Other
+errors leave the page pending for the next attempt.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any
+
+import httpx
+from psycopg.types.json import Jsonb
+
+STAGES = ("fetching", "fetched", "loaded", "complete")
+
+
+@dataclass
+class IngestRun:
+    id: int
+    captured_on: date
+    status: str
+    settings: dict[str, Any]  # regions, categories, limit and depth the tasks were planned with
+
+    @property
+    def categories(self) -> list[tuple[int | None, str]]:
+        return [(genre_id, slug) for genre_id, slug in self.settings["categories"]]
+
+
+def create_run(conn, captured_on: date, settings: dict[str, Any]) -> IngestRun:
+    """Create a run and its pending tasks from ``settings``."""
+    pages = -(-settings["depth"] // settings["limit"])
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO ingest_runs (captured_on, settings) VALUES (%s, %s) RETURNING id",
+            (captured_on, Jsonb(settings)),
+        )
+        run_id = cursor.fetchone()[0]
+        with cursor.copy("COPY ingest_tasks (run_id, region, genre_id, category, page) FROM STDIN") as copy:
+            for region in settings["regions"]:
+                for genre_id, slug in settings["categories"]:
+                    for page in range(1, pages + 1):
+                        copy.write_row((run_id, region, genre_id, slug, page))
+    return IngestRun(id=run_id, captured_on=captured_on, status="fetching", settings=settings)
+
+
+def get_run(conn, run_id: int) -> IngestRun | None:
+    row = conn.execute(
+        "SELECT id, captured_on, status, settings FROM ingest_runs WHERE id = %s", (run_id,)
+    ).fetchone()
+    return IngestRun(*row) if row else None
+
+
+def latest_unfinished_run(conn, captured_on: date) -> IngestRun | None:
+    row = conn.execute(
+        """
+        SELECT id, captured_on, status, settings FROM ingest_runs
+        WHERE captured_on = %s AND status <> 'complete'
+        ORDER BY id DESC
+        LIMIT 1
+        """,
+        (captured_on,),
+    ).fetchone()
+    return IngestRun(*row) if row else None
+
+
+def set_status(conn, run: IngestRun, status: str, error: str | None = None) -> None:
+    conn.execute(
+        """
+        UPDATE ingest_runs
+        SET status = %s, last_error = %s,
+            finished_at = CASE WHEN %s = 'complete' THEN now() END
+        WHERE id = %s
+        """,
+        (status, error, status, run.id),
+    )
+    run.status = status
+
+
+def _permanent(error: BaseException) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        code = error.response.status_code
+        return 400 <= code < 500 and code != 429
+    return False
+
+
+def record_page(
+    conn,
+    run_id: int,
+    region: str,
+    category: str,
+    page: int,
+    *,
+    payload: dict[str, Any] | None = None,
+    error: BaseException | None = None,
+    last_page: bool = False,
+) -> None:
+    """Record one page attempt; meant for an autocommit connection, so it commits at once."""
+    if error is None:
+        status = "done"
+    else:
+        status = "failed" if _permanent(error) else "pending"
+    key = {"run": run_id, "region": region, "category": category, "page": page}
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE ingest_tasks
+            SET status = %(status)s, payload = %(payload)s, item_count = %(items)s,
+                last_page = %(last_page)s, attempts = attempts + 1, last_error = %(error)s,
+                updated_at = now()
+            WHERE run_id = %(run)s AND region = %(region)s AND category = %(category)s AND page = %(page)s
+            """,
+            {
+                **key,
+                "status": status,
+                "payload": Jsonb(payload) if payload is not None else None,
+                "items": len(payload.get("podcasts", [])) if payload is not None else None,
+                "last_page": last_page,
+                "error": f"{type(error).__name__}: {error}" if error is not None else None,
+            },
+        )
+        if last_page or status == "failed":
+            # The chart ends here: later pages are not needed
+            cursor.execute(
+                """
+                UPDATE ingest_tasks
+                SET status = %(status)s, updated_at = now()
+                WHERE run_id = %(run)s AND region = %(region)s AND category = %(category)s
+                  AND page > %(page)s AND status = 'pending'
+                """,
+                {**key, "status": "skipped" if status == "done" else "failed"},
+            )
+
+
+def fetched_pages(conn, run: IngestRun, *, with_payload: bool = True) -> dict[tuple[str, str], dict[int, dict[str, Any]]]:
+    """Payloads of done pages by (region, category), then page."""
+    pages: dict[tuple[str, str], dict[int, dict[str, Any]]] = {}
+    rows = conn.execute(
+        """
+        SELECT region, category, page, payload FROM ingest_tasks
+        WHERE run_id = %s AND status = 'done'
+        ORDER BY region, category, page
+        """,
+        (run.id,),
+    ).fetchall()
+    for region, category, page, payload in rows:
+        pages.setdefault((region, category), {})[page] = payload if with_payload else {}
+    return pages
+
+
+def pending_charts(conn, run: IngestRun) -> list[tuple[str, int | None, str]]:
+    """(region, genre_id, category) of charts with pending pages."""
+    return conn.execute(
+        """
+        SELECT DISTINCT region, genre_id, category FROM ingest_tasks
+        WHERE run_id = %s AND status = 'pending'
+        ORDER BY region, category
+        """,
+        (run.id,),
+    ).fetchall()
+
+
+def task_counts(conn, run: IngestRun) -> dict[str, int]:
+    rows = conn.execute(
+        "SELECT status, count(*) FROM ingest_tasks WHERE run_id = %s GROUP BY status", (run.id,)
+    ).fetchall()
+    return dict(rows)
+
+
+def skip_pending(conn, run: IngestRun) -> int:
+    """Give up on the run's pending pages so the later stages can go ahead."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "UPDATE ingest_tasks SET status = 'skipped', updated_at = now() WHERE run_id = %s AND status = 'pending'",
+            (run.id,),
+        )
+        return cursor.rowcount
+
+
+def clear_payloads(conn, run: IngestRun) -> None:
+    """Drop the stored payloads once they are loaded."""
+    conn.execute("UPDATE ingest_tasks SET payload = NULL WHERE run_id = %s AND payload IS NOT NULL", (run.id,))
@@ -0,0 +1,216 @@
+"""Async ListenNotes API client shared by the ingestion scripts.
+
+All requests from one client share a token bucket sized to the ListenNotes
+plan and a cap on requests in flight. Connections are kept alive (and use
+HTTP/2 when ``h2`` is installed), so a run reuses a handful of connections.
+Each request retries on its own: 429s honour ``Retry-After`` and 5xx responses
+or transport errors back off with full jitter, without holding a concurrency
+slot while waiting.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Override to point the ingest scripts at scripts/mock_listennotes.py
+LISTENNOTES_BASE_URL = os.environ.get("LISTENNOTES_BASE_URL", "https://listen-api.listennotes.com/api/v2")
+USER_AGENT = "PodCharts/0.1 (+https://podcharts.xyz)"
+
+# Sized to the ListenNotes plan: sustained requests per second and burst size
+LISTENNOTES_RATE_PER_SEC = float(os.environ.get("LISTENNOTES_RATE_PER_SEC", "2"))
+LISTENNOTES_BURST = int(os.environ.get("LISTENNOTES_BURST", "5"))
+LISTENNOTES_CONCURRENCY = int(os.environ.get("LISTENNOTES_CONCURRENCY", "4"))
+LISTENNOTES_TIMEOUT = float(os.environ.get("LISTENNOTES_TIMEOUT", "30"))
+LISTENNOTES_MAX_RETRIES = int(os.environ.get("LISTENNOTES_MAX_RETRIES", "4"))
+# Backoff cap in seconds for retries without a Retry-After header
+LISTENNOTES_BACKOFF_CAP = float(os.environ.get("LISTENNOTES_BACKOFF_CAP", "30"))
+
+
+@dataclass
+class HttpStats:
+    """Counters for one client, reported in the run telemetry (scripts/telemetry.py)."""
+
+    requests: int = 0  # sent, retries included
+    rate_limited: int = 0  # 429 responses
+    server_errors: int = 0  # 5xx responses
+    transport_errors: int = 0
+    retries: int = 0
+    retry_wait_seconds: float = 0.0
+    bytes_downloaded: int = 0  # response bodies as received (before decompression)
+    not_modified: int = 0  # 304 answers to conditional requests
+
+    def count_response(self, response: httpx.Response) -> None:
+        self.requests += 1
+        # num_bytes_downloaded stays 0 for bodies httpx didn't stream (e.g. mocked)
+        self.bytes_downloaded += response.num_bytes_downloaded or len(response.content)
+        if response.status_code == 304:
+            self.not_modified += 1
+        elif response.status_code == 429:
+            self.rate_limited += 1
+        elif response.status_code >= 500:
+            self.server_errors += 1
+
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average, up to ``burst`` at once."""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt: int, cap: float = LISTENNOTES_BACKOFF_CAP) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, 2**attempt)]."""
+    return random.uniform(0, min(cap, 2.0 ** attempt))
+
+
+class ListenNotesClient:
+    """Rate-limited, retrying async client for the ListenNotes API."""
+
+    def __init__(
+        self,
+        api_key: str,
+        *,
+        base_url: str = LISTENNOTES_BASE_URL,
+        rate: float = LISTENNOTES_RATE_PER_SEC,
+        burst: int = LISTENNOTES_BURST,
+        concurrency: int = LISTENNOTES_CONCURRENCY,
+        timeout: float = LISTENNOTES_TIMEOUT,
+        max_retries: int = LISTENNOTES_MAX_RETRIES,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.max_retries = max_retries
+        self.stats = HttpStats()
+        self._bucket = TokenBucket(rate, burst)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"X-ListenAPI-Key": api_key, "User-Agent": USER_AGENT},
+            http2=HTTP2_AVAILABLE and transport is None,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+            transport=transport,
+        )
+
+    async def __aenter__(self) -> ListenNotesClient:
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def get_json(self, path: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
+        """GET ``path`` and return the JSON body, retrying 429, 5xx and transport errors.
+
+        Raises ``httpx.HTTPStatusError`` or ``httpx.TransportError`` once
+        retries are exhausted, and immediately for other 4xx responses.
+        """
+        return (await self.request("GET", path, params=params)).json()
+
+    async def get_json_if_changed(
+        self, path: str, params: dict[str, Any] | None = None, *, etag: str | None = None
+    ) -> tuple[dict[str, Any] | None, str | None]:
+        """Conditional ``get_json``: ``(None, etag)`` if the resource still matches ``etag``.
+
+        Otherwise returns the body and the response's ETag, if it sent one.
+        """
+        headers = {"If-None-Match": etag} if etag else None
+        response = await self.request("GET", path, params=params, headers=headers)
+        if response.status_code == 304:
+            return None, etag
+        return response.json(), response.headers.get("ETag")
+
+    async def post_json(self, path: str, data: dict[str, Any]) -> dict[str, Any]:
+        """POST a form to a read-only endpoint (e.g. batch lookups); retried like ``get_json``."""
+        return (await self.request("POST", path, data=data)).json()
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        params: dict[str, Any] | None = None,
+        data: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> httpx.Response:
+        """Send one request with rate limiting and retries; returns a 2xx or 304 response."""
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                await self._bucket.acquire()
+                try:
+                    response = await self._client.request(method, path, params=params, data=data, headers=headers)
+                except httpx.TransportError as exc:
+                    self.stats.requests += 1
+                    self.stats.transport_errors += 1
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = backoff_seconds(attempt)
+                    reason = type(exc).__name__
+                else:
+                    self.stats.count_response(response)
+                    retryable = response.status_code == 429 or response.status_code >= 500
+                    if not retryable or attempt >= self.max_retries:
+                        if response.status_code != 304:
+                            response.raise_for_status()
+                        return response
+                    delay = retry_after_seconds(response)
+                    if delay is None:
+                        delay = backoff_seconds(attempt)
+                    reason = f"HTTP {response.status_code}"
+
+            attempt += 1
+            self.stats.retries += 1
+            self.stats.retry_wait_seconds += delay
+            logging.warning(
+                "%s for %s %s, retry %s/%s in %.1fs", reason, path, params or {}, attempt, self.max_retries, delay
+            )
+            # Sleep outside the semaphore so other requests keep going
+            await asyncio.sleep(delay)
@@ -0,0 +1,322 @@
+"""Chart metrics (rank deltas and momentum) computed in one SQL statement.
+
+For every podcast charted on a day in [start, end], the rank h days earlier is
+looked up with RANGE window frames over that podcast's rank series. Each
+horizon h has a weight, and momentum is the weighted sum of the available
+deltas. With a tolerance of t days, the nearest day within h±t with a rank is
+used instead (ties go to the earlier day). With t = 0 only the exact day
+counts, which matches the original Python implementation.
+
+The series is the day's best (lowest) rank from ranks_daily for days in
+[start, end], and metrics_daily ranks for earlier days or days with no raw
+ranks (e.g. synthetic history). Bulk recomputes read earlier days from
+ranks_daily too, so date chunks can run in parallel. Each horizon writes ``delta_<h>d``, so a new
+horizon needs that column in metrics_daily.
+
+When ranks for a past day are corrected or arrive late, the days that use that
+day as a reference go stale. ``mark_dirty`` queues such rank rows in
+metrics_dirty and ``recompute_dirty`` recomputes only the affected
+(podcast, day) rows.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterable
+
+from psycopg import sql
+
+
+@dataclass(frozen=True)
+class Horizon:
+    days: int
+    weight: float  # contribution to momentum_score; 0 = delta only
+
+    @property
+    def column(self) -> str:
+        return f"delta_{self.days}d"
+
+
+def parse_horizons(spec: str) -> list[Horizon]:
+    """Parse ``"1:0,7:0.7,30:0.3,90:0"`` (days:weight, comma separated)."""
+    horizons = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        days, _, weight = item.partition(":")
+        horizon = Horizon(days=int(days), weight=float(weight or 0))
+        if horizon.days < 1:
+            raise ValueError(f"Horizon must be at least 1 day: {item}")
+        horizons.append(horizon)
+    return sorted(horizons, key=lambda h: h.days)
+
+
+METRICS_HORIZONS = parse_horizons(os.environ.get("METRICS_HORIZONS", "1:0,7:0.7,30:0.3,90:0"))
+METRICS_HORIZON_TOLERANCE_DAYS = int(os.environ.get("METRICS_HORIZON_TOLERANCE_DAYS", "0"))
+# metrics_dirty rows claimed per recompute transaction
+METRICS_RECOMPUTE_BATCH_SIZE = int(os.environ.get("METRICS_RECOMPUTE_BATCH_SIZE", "5000"))
+
+
+def _days(n: int) -> sql.SQL:
+    return sql.SQL(f"INTERVAL '{int(n)} days'")
+
+
+def _reference_rank(horizon: Horizon, tolerance: int) -> tuple[list[sql.Composable], sql.Composable]:
+    """Window columns for one horizon and the expression picking the nearest rank."""
+    h = horizon.days
+    before = sql.Identifier(f"r{h}_before")
+    before_day = sql.Identifier(f"d{h}_before")
+    # Latest ranked day in [D - h - t, D - h]
+    frame = sql.SQL("(PARTITION BY podcast_id ORDER BY captured_on RANGE BETWEEN {} PRECEDING AND {} PRECEDING)").format(
+        _days(h + tolerance), _days(h)
+    )
+    columns = [
+        sql.SQL("last_value(rank) OVER {} AS {}").format(frame, before),
+        sql.SQL("last_value(captured_on) OVER {} AS {}").format(frame, before_day),
+    ]
+    forward = min(tolerance, h - 1)
+    if forward <= 0:
+        return columns, before
+
+    after = sql.Identifier(f"r{h}_after")
+    after_day = sql.Identifier(f"d{h}_after")
+    # Earliest ranked day in [D - h, D - h + t], never reaching D itself
+    frame = sql.SQL("(PARTITION BY podcast_id ORDER BY captured_on RANGE BETWEEN {} PRECEDING AND {} PRECEDING)").format(
+        _days(h), _days(h - forward)
+    )
+    columns += [
+        sql.SQL("first_value(rank) OVER {} AS {}").format(frame, after),
+        sql.SQL("first_value(captured_on) OVER {} AS {}").format(frame, after_day),
+    ]
+    nearest = sql.SQL(
+        "CASE WHEN {after_day} IS NOT NULL AND ({before_day} IS NULL"
+        " OR {after_day} - (captured_on - {h}) < (captured_on - {h}) - {before_day})"
+        " THEN {after} ELSE {before} END"
+    ).format(after_day=after_day, before_day=before_day, after=after, before=before, h=sql.Literal(h))
+    return columns, nearest
+
+
+def metrics_statement(horizons: list[Horizon], tolerance: int, targeted: bool = False) -> sql.Composed:
+    window_columns: list[sql.Composable] = []
+    deltas: list[sql.Composable] = []
+    for horizon in horizons:
+        columns, nearest = _reference_rank(horizon, tolerance)
+        window_columns += columns
+        deltas.append(sql.SQL("{} - rank AS {}").format(nearest, sql.Identifier(horizon.column)))
+
+    weighted = [h for h in horizons if h.weight > 0]
+    if weighted:
+        # Same float operations as summing w * delta over the available deltas in Python
+        momentum = sql.SQL("CASE WHEN {all_null} THEN NULL ELSE {total} END").format(
+            all_null=sql.SQL(" AND ").join(sql.SQL("{} IS NULL").format(sql.Identifier(h.column)) for h in weighted),
+            total=sql.SQL(" + ").join(
+                sql.SQL("COALESCE({}::double precision * {}, 0)").format(sql.Literal(h.weight), sql.Identifier(h.column))
+                for h in weighted
+            ),
+        )
+    else:
+        momentum = sql.SQL("NULL::double precision")
+
+    written = ["rank"] + [h.column for h in horizons] + ["momentum_score"]
+    return sql.SQL(
+        """
+        WITH fresh AS (
+          SELECT podcast_id, captured_on, MIN(rank) AS rank
+          FROM ranks_daily
+          WHERE source = 'listennotes' AND captured_on BETWEEN %(fresh_start)s AND %(end)s{target_filter}
+          GROUP BY podcast_id, captured_on
+        ),
+        history AS (
+          SELECT m.podcast_id, m.captured_on, m.rank
+          FROM metrics_daily m
+          WHERE m.captured_on BETWEEN %(lookback)s AND %(end)s
+            AND m.podcast_id IN (SELECT podcast_id FROM fresh)
+        ),
+        -- FULL JOIN rather than NOT EXISTS: CTEs have no statistics, and the
+        -- anti-join was planned as a nested loop over every history row
+        series AS (
+          SELECT COALESCE(f.podcast_id, h.podcast_id) AS podcast_id,
+                 COALESCE(f.captured_on, h.captured_on) AS captured_on,
+                 COALESCE(f.rank, h.rank) AS rank,
+                 f.captured_on >= %(start)s AS target
+          FROM fresh f
+          FULL JOIN history h ON h.podcast_id = f.podcast_id AND h.captured_on = f.captured_on
+        ),
+        windowed AS (
+          SELECT podcast_id, captured_on, rank, target, {window_columns}
+          FROM series
+        ),
+        deltas AS (
+          SELECT podcast_id, captured_on, rank, {deltas}
+          FROM windowed
+          WHERE target
+        )
+        INSERT INTO metrics_daily AS t (podcast_id, captured_on, {written})
+        SELECT podcast_id, captured_on, rank, {delta_columns}, {momentum}
+        FROM deltas
+        ORDER BY podcast_id, captured_on
+        ON CONFLICT (podcast_id, captured_on) DO UPDATE
+        SET {assignments}
+        WHERE ({current}) IS DISTINCT FROM ({excluded})
+        """
+    ).format(
+        target_filter=sql.SQL(
+            "\n            AND (podcast_id, captured_on) IN"
+            " (SELECT * FROM unnest(%(target_ids)s::text[], %(target_days)s::date[]))"
+            if targeted else ""
+        ),
+        window_columns=sql.SQL(",\n                 ").join(window_columns),
+        deltas=sql.SQL(", ").join(deltas),
+        written=sql.SQL(", ").join(map(sql.Identifier, written)),
+        delta_columns=sql.SQL(", ").join(sql.Identifier(h.column) for h in horizons),
+        momentum=momentum,
+        assignments=sql.SQL(", ").join(sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in written),
+        current=sql.SQL(", ").join(sql.SQL("t.{}").format(sql.Identifier(c)) for c in written),
+        excluded=sql.SQL(", ").join(sql.SQL("EXCLUDED.{}").format(sql.Identifier(c)) for c in written),
+    )
+
+
+def lock_metrics_months(conn, days: Iterable[date]) -> None:
+    """Serialize metrics writers per calendar month until the transaction ends.
+
+    Ingest and recompute may both write a day's metrics. Without the lock, a
+    writer that read ranks before another one committed could overwrite newer
+    values. Months are locked in order so writers cannot deadlock each other.
+    """
+    months = sorted({day.year * 12 + day.month - 1 for day in days})
+    with conn.cursor() as cursor:
+        for month in months:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('metrics_daily'), %s)", (month,))
+
+
+def compute_metrics_range(
+    conn,
+    start: date,
+    end: date,
+    *,
+    targets: Iterable[tuple[str, date]] | None = None,
+    horizons: list[Horizon] | None = None,
+    tolerance: int = METRICS_HORIZON_TOLERANCE_DAYS,
+    raw_history: bool = False,
+) -> int:
+    """Compute metrics for every podcast ranked on a day in [start, end].
+
+    ``targets`` limits this to the given (podcast_id, day) pairs. With
+    ``raw_history`` the reference days before ``start`` are also read from
+    ranks_daily rather than metrics_daily, so the result doesn't depend on
+    earlier days having been recomputed first. Returns the number of
+    metrics_daily rows inserted or changed. Runs in the caller's transaction
+    and holds the month locks for [start, end] until it ends.
+    """
+    horizons = horizons or METRICS_HORIZONS
+    lookback = start - timedelta(days=max(h.days for h in horizons) + tolerance)
+    params = {"start": start, "end": end, "lookback": lookback, "fresh_start": lookback if raw_history else start}
+    if targets is not None:
+        targets = sorted(targets)
+        params["target_ids"] = [podcast_id for podcast_id, _ in targets]
+        params["target_days"] = [day for _, day in targets]
+        lock_metrics_months(conn, params["target_days"])
+    else:
+        lock_metrics_months(conn, (start + timedelta(days=n) for n in range((end - start).days + 1)))
+    with conn.cursor() as cursor:
+        cursor.execute(metrics_statement(horizons, tolerance, targeted=targets is not None), params)
+        return cursor.rowcount
+
+
+def mark_dirty(cursor, keys: Iterable[tuple[str, date]]) -> int:
+    """Queue the downstream metrics of rank rows written for past days.
+
+    ``keys`` are (podcast_id, captured_on) pairs whose rank was inserted or
+    changed. Today's rows are skipped: no later day references them yet.
+    """
+    today = date.today()
+    past = sorted({(podcast_id, day) for podcast_id, day in keys if day < today})
+    if not past:
+        return 0
+    cursor.execute(
+        """
+        INSERT INTO metrics_dirty (podcast_id, captured_on)
+        SELECT * FROM unnest(%s::text[], %s::date[])
+        ON CONFLICT (podcast_id, captured_on) DO NOTHING
+        """,
+        ([podcast_id for podcast_id, _ in past], [day for _, day in past]),
+    )
+    return len(past)
+
+
+def downstream_days(day: date, horizons: list[Horizon], tolerance: int) -> list[date]:
+    """``day`` plus every day whose metrics may use ``day``'s rank as a reference."""
+    days = {day}
+    for horizon in horizons:
+        for offset in range(max(1, horizon.days - tolerance), horizon.days + tolerance + 1):
+            days.add(day + timedelta(days=offset))
+    return sorted(days)
+
+
+_CLAIM_DIRTY = """
+    DELETE FROM metrics_dirty
+    WHERE (podcast_id, captured_on) IN (
+      SELECT podcast_id, captured_on
+      FROM metrics_dirty
+      ORDER BY captured_on, podcast_id
+      LIMIT %s
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING podcast_id, captured_on
+"""
+
+
+def recompute_dirty(
+    conn,
+    *,
+    batch_size: int = METRICS_RECOMPUTE_BATCH_SIZE,
+    max_batches: int | None = None,
+    horizons: list[Horizon] | None = None,
+    tolerance: int = METRICS_HORIZON_TOLERANCE_DAYS,
+) -> dict[str, int]:
+    """Recompute the metrics downstream of queued rank changes, oldest days first.
+
+    Each batch claims up to ``batch_size`` metrics_dirty rows (skipping rows
+    another worker holds), recomputes only the affected (podcast, day) rows and
+    commits, so it can run next to ingest or another recompute. A failed batch
+    rolls back and leaves its rows queued.
+    """
+    horizons = horizons or METRICS_HORIZONS
+    totals = {"batches": 0, "claimed": 0, "targets": 0, "written": 0}
+    while max_batches is None or totals["batches"] < max_batches:
+        with conn.cursor() as cursor:
+            cursor.execute(_CLAIM_DIRTY, (batch_size,))
+            claimed = cursor.fetchall()
+        if not claimed:
+            conn.commit()
+            break
+
+        targets = {
+            (podcast_id, target)
+            for podcast_id, day in claimed
+            for target in downstream_days(day, horizons, tolerance)
+        }
+        claimed_days = [day for _, day in claimed]
+        target_days = [day for _, day in targets]
+        written = compute_metrics_range(
+            conn,
+            min(target_days),
+            max(target_days),
+            targets=targets,
+            horizons=horizons,
+            tolerance=tolerance,
+        )
+        conn.commit()
+        logging.info(
+            "Recomputed metrics for %s changed ranks (%s to %s): %s of %s rows changed",
+            len(claimed), min(claimed_days), max(claimed_days), written, len(targets),
+        )
+        totals["batches"] += 1
+        totals["claimed"] += len(claimed)
+        totals["targets"] += len(targets)
+        totals["written"] += written
+        if len(claimed) < batch_size:
+            break
+    return totals
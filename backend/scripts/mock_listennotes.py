@@ -0,0 +1,226 @@
+"""Local stand-in for the ListenNotes API, for offline ingest runs and benchmarks.
+
+Serves the endpoints the ingest scripts call:
+
+  GET /genres                      the DEFAULT_CATEGORIES genres plus a few children
+  GET /best_podcasts               charts of ``--chart-size`` podcasts, paged by page_size
+  GET /podcasts/{id}               podcast with its latest 10 episodes, paged by next_episode_pub_date;
+                                   sends an ETag and answers a matching If-None-Match with 304
+  POST /podcasts                   batch lookup of up to 10 comma-separated ``ids`` (form field)
+
+Responses are synthetic and deterministic (``--seed``): every chart draws from
+one pool of ``--podcasts`` shows, so a show appears on several charts as it
+does on the real API. A response recorded from the real API can be served
+instead by saving it under ``--fixtures`` as ``<path>__<query>.json``, e.g.
+``best_podcasts__genre_id=93&page=1&region=US.json`` (path slashes become
+``_``, query parameters sorted; page_size and safe_mode are ignored).
+
+``--latency-ms`` delays every response, ``--rate-limit-ratio`` answers that
+share of requests with 429 and ``Retry-After: --retry-after``.
+
+Usage:
+    python scripts/mock_listennotes.py [--port 8100] [--latency-ms 50] [--rate-limit-ratio 0.05]
+    LISTENNOTES_BASE_URL=http://127.0.0.1:8100 python scripts/ingest.py
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import uvicorn
+from fastapi import FastAPI, Form, Request
+from fastapi.responses import JSONResponse, Response
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.genres import DEFAULT_CATEGORIES
+
+# Query parameters that don't change a recorded response
+IGNORED_PARAMS = {"page_size", "safe_mode"}
+EPISODES_PER_PAGE = 10
+BATCH_IDS = 10  # ids per POST /podcasts
+DAY_MS = 86_400_000
+
+
+@dataclass
+class MockSettings:
+    seed: int = 0
+    podcasts: int = 5000  # pool the charts draw from
+    chart_size: int = 300  # podcasts per chart before has_next is false
+    episodes: int = 30  # per podcast
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    rate_limit_ratio: float = 0.0
+    retry_after: float = 1.0
+    fixtures: str | None = None
+
+
+def _genres() -> list[dict[str, Any]]:
+    top = [{"id": genre_id, "name": slug.title(), "parent_id": None} for genre_id, slug in DEFAULT_CATEGORIES if genre_id]
+    # One long-tail child each, so genre depth and scheduling can be exercised
+    children = [{"id": 1000 + g["id"], "name": f"{g['name']} Interviews", "parent_id": g["id"]} for g in top]
+    return top + children
+
+
+def _podcast(settings: MockSettings, number: int) -> dict[str, Any]:
+    return {
+        "id": f"mock{number:06d}",
+        "title": f"Mock Podcast {number}",
+        "publisher": f"Publisher {number % 97}",
+        "rss": f"https://feeds.example.com/mock{number:06d}.xml",
+        "total_episodes": settings.episodes,
+    }
+
+
+def _podcast_number(podcast_id: str) -> int | None:
+    digits = podcast_id.removeprefix("mock")
+    return int(digits) if podcast_id.startswith("mock") and digits.isdigit() else None
+
+
+def _episodes(settings: MockSettings, podcast_id: str) -> list[dict[str, Any]]:
+    """All of a podcast's episodes, newest first; one every few days up to today.
+
+    Dates are anchored to today (UTC), so repeated runs on one day see the same episodes.
+    """
+    rng = random.Random(f"{settings.seed}:{podcast_id}")
+    today_ms = int(datetime.now(timezone.utc).timestamp() * 1000) // DAY_MS * DAY_MS
+    latest = today_ms - rng.randint(0, 3) * DAY_MS
+    interval = rng.choice((1, 3, 7)) * DAY_MS
+    return [
+        {
+            "id": f"{podcast_id}-e{settings.episodes - i:04d}",
+            "title": f"Episode {settings.episodes - i}",
+            "description": f"Episode {settings.episodes - i} of {podcast_id}",
+            "audio": f"https://cdn.example.com/{podcast_id}/{settings.episodes - i}.mp3",
+            "audio_length_sec": rng.randint(600, 5400),
+            "pub_date_ms": latest - i * interval,
+        }
+        for i in range(settings.episodes)
+    ]
+
+
+def _fixture_name(path: str, params: dict[str, str]) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(params.items()) if k not in IGNORED_PARAMS)
+    return path.strip("/").replace("/", "_") + (f"__{query}" if query else "") + ".json"
+
+
+def create_app(settings: MockSettings) -> FastAPI:
+    app = FastAPI(title="Mock ListenNotes")
+    rng = random.Random(settings.seed)
+    fixtures = Path(settings.fixtures) if settings.fixtures else None
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        if settings.latency_ms or settings.latency_jitter_ms:
+            await asyncio.sleep(max(0.0, settings.latency_ms + rng.uniform(-1, 1) * settings.latency_jitter_ms) / 1000)
+        if settings.rate_limit_ratio and rng.random() < settings.rate_limit_ratio:
+            return JSONResponse(
+                {"error": "Too many requests"}, status_code=429, headers={"Retry-After": str(settings.retry_after)}
+            )
+        if fixtures is not None:
+            recorded = fixtures / _fixture_name(request.url.path, dict(request.query_params))
+            if recorded.is_file():
+                return JSONResponse(json.loads(recorded.read_text()))
+        return await call_next(request)
+
+    @app.get("/genres")
+    async def genres() -> dict[str, Any]:
+        return {"genres": _genres()}
+
+    @app.get("/best_podcasts")
+    async def best_podcasts(
+        genre_id: int | None = None, region: str = "us", page: int = 1, page_size: int = 20
+    ) -> dict[str, Any]:
+        chart_rng = random.Random(f"{settings.seed}:{region.lower()}:{genre_id}")
+        chart = chart_rng.sample(range(settings.podcasts), min(settings.chart_size, settings.podcasts))
+        start = (page - 1) * page_size
+        items = chart[start:start + page_size]
+        return {
+            "id": genre_id,
+            "page_number": page,
+            "has_next": start + page_size < len(chart),
+            "total": len(chart),
+            "podcasts": [_podcast(settings, number) for number in items],
+        }
+
+    @app.get("/podcasts/{podcast_id}")
+    async def podcast(request: Request, podcast_id: str, next_episode_pub_date: int | None = None):
+        number = _podcast_number(podcast_id)
+        if number is None or number >= settings.podcasts:
+            return JSONResponse({"error": "Not found"}, status_code=404)
+        episodes = _episodes(settings, podcast_id)
+        latest = episodes[0]["pub_date_ms"] if episodes else None
+        if next_episode_pub_date:
+            episodes = [e for e in episodes if e["pub_date_ms"] < next_episode_pub_date]
+        page = episodes[:EPISODES_PER_PAGE]
+        body = {
+            **_podcast(settings, number),
+            "latest_pub_date_ms": latest,
+            "episodes": page,
+            "next_episode_pub_date": page[-1]["pub_date_ms"] if len(episodes) > EPISODES_PER_PAGE else None,
+        }
+        etag = '"%s"' % hashlib.md5(json.dumps(body, sort_keys=True).encode()).hexdigest()
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(body, headers={"ETag": etag})
+
+    @app.post("/podcasts")
+    async def podcasts_batch(ids: str = Form("")):
+        wanted = [i for i in ids.split(",") if i][:BATCH_IDS]
+        found = []
+        for podcast_id in wanted:
+            number = _podcast_number(podcast_id)
+            if number is not None and number < settings.podcasts:
+                episodes = _episodes(settings, podcast_id)
+                found.append({**_podcast(settings, number), "latest_pub_date_ms": episodes[0]["pub_date_ms"]})
+        return {"podcasts": found}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = MockSettings()
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--podcasts", type=int, default=defaults.podcasts, help="podcast pool the charts draw from")
+    parser.add_argument("--chart-size", type=int, default=defaults.chart_size)
+    parser.add_argument("--episodes-per-podcast", type=int, default=defaults.episodes)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--latency-jitter-ms", type=float, default=defaults.latency_jitter_ms)
+    parser.add_argument("--rate-limit-ratio", type=float, default=defaults.rate_limit_ratio, help="share of 429s")
+    parser.add_argument("--retry-after", type=float, default=defaults.retry_after, help="Retry-After of a 429, seconds")
+    parser.add_argument("--fixtures", default=defaults.fixtures, help="directory of recorded responses")
+
+
+def settings_from_args(args: argparse.Namespace) -> MockSettings:
+    return MockSettings(
+        seed=args.seed,
+        podcasts=args.podcasts,
+        chart_size=args.chart_size,
+        episodes=args.episodes_per_podcast,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        rate_limit_ratio=args.rate_limit_ratio,
+        retry_after=args.retry_after,
+        fixtures=args.fixtures,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(settings_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
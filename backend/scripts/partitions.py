@@ -0,0 +1,317 @@
+"""Monthly partitions of the daily tables.
+
+ranks_daily, metrics_daily, episode_metrics_daily and podcast_listen_metrics_daily
+are range partitioned by month on captured_on (see ensure_month_partitions in
+infra/schema.sql), so date-filtered queries only touch the months they ask for.
+
+  maintain   create the next PARTITION_PREMAKE_MONTHS months (and any month whose
+             rows sit in the default partition); with PARTITION_RETENTION_MONTHS
+             set, detach older months into PARTITION_ARCHIVE_SCHEMA, or drop them
+             when that is empty. Run daily from cron, e.g. before ingest.
+  migrate    convert tables created before partitioning: rename, rebuild from
+             infra/schema.sql, copy the rows month by month and drop the old
+             table, in one transaction. Needs free space about the table's size.
+  check      EXPLAIN the API's date-filtered queries and fail unless each one
+             only scans the partitions of the months it asks for.
+
+Usage:
+    python scripts/partitions.py maintain [--dry-run]
+    python scripts/partitions.py migrate [--keep-old]
+    python scripts/partitions.py check
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import re
+import sys
+from datetime import date, timedelta
+from typing import Any, Iterator
+
+from dotenv import load_dotenv
+from psycopg import connect, sql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.setup_db import SCHEMA_FILE
+
+PARTITIONED_TABLES = ["ranks_daily", "metrics_daily", "episode_metrics_daily", "podcast_listen_metrics_daily"]
+
+# Months created ahead of today
+PARTITION_PREMAKE_MONTHS = int(os.environ.get("PARTITION_PREMAKE_MONTHS", "3"))
+# Months kept attached before the current one; 0 = keep everything
+PARTITION_RETENTION_MONTHS = int(os.environ.get("PARTITION_RETENTION_MONTHS", "0"))
+# Where detached months go; empty = drop them
+PARTITION_ARCHIVE_SCHEMA = os.environ.get("PARTITION_ARCHIVE_SCHEMA", "archive")
+
+_MONTH_SUFFIX = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def is_partitioned(conn, table: str) -> bool:
+    row = conn.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,)).fetchone()
+    return row is not None and row[0] == "p"
+
+
+def month_partitions(conn, table: str) -> dict[date, str]:
+    """Attached monthly partitions of ``table`` by first day of month."""
+    rows = conn.execute(
+        """
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        """,
+        (table,),
+    ).fetchall()
+    partitions = {}
+    for (name,) in rows:
+        match = _MONTH_SUFFIX.search(name)
+        if match:
+            partitions[date(int(match[1]), int(match[2]), 1)] = name
+    return partitions
+
+
+def ensure_partitions(conn, table: str, first_day: date, last_day: date) -> int:
+    return conn.execute(
+        "SELECT ensure_month_partitions(%s::regclass, %s, %s)", (table, first_day, last_day)
+    ).fetchone()[0]
+
+
+def default_months(conn, table: str) -> list[date]:
+    """Months with rows in the default partition (no partition existed when they were written)."""
+    rows = conn.execute(
+        sql.SQL("SELECT DISTINCT date_trunc('month', captured_on)::date FROM {} ORDER BY 1").format(
+            sql.Identifier(f"{table}_default")
+        )
+    ).fetchall()
+    return [month for (month,) in rows]
+
+
+def maintain(conn, today: date, *, dry_run: bool = False) -> dict[str, int]:
+    totals = {"created": 0, "detached": 0}
+    cutoff = add_months(today.replace(day=1), -PARTITION_RETENTION_MONTHS) if PARTITION_RETENTION_MONTHS else None
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(conn, table):
+            logging.warning("%s is not partitioned yet; run `partitions.py migrate`", table)
+            continue
+        # Months stranded in the default partition first (expired ones are then
+        # detached with the rest), then the months ahead
+        for month in default_months(conn, table):
+            logging.info("%s: moving %s out of the default partition", table, month.strftime("%Y-%m"))
+            if not dry_run:
+                totals["created"] += ensure_partitions(conn, table, month, month)
+        if dry_run:
+            existing = month_partitions(conn, table)
+            ahead = [add_months(today.replace(day=1), n) for n in range(PARTITION_PREMAKE_MONTHS + 1)]
+            totals["created"] += sum(month not in existing for month in ahead)
+        else:
+            totals["created"] += ensure_partitions(
+                conn, table, today, add_months(today.replace(day=1), PARTITION_PREMAKE_MONTHS)
+            )
+
+        if cutoff is None:
+            continue
+        for month, name in sorted(month_partitions(conn, table).items()):
+            if month >= cutoff:
+                break
+            target = f"{PARTITION_ARCHIVE_SCHEMA}.{name}" if PARTITION_ARCHIVE_SCHEMA else "dropped"
+            logging.info("%s: detaching %s (%s)", table, name, target)
+            totals["detached"] += 1
+            if dry_run:
+                continue
+            conn.execute(
+                sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(sql.Identifier(table), sql.Identifier(name))
+            )
+            if PARTITION_ARCHIVE_SCHEMA:
+                conn.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(PARTITION_ARCHIVE_SCHEMA)))
+                conn.execute(
+                    sql.SQL("ALTER TABLE {} SET SCHEMA {}").format(
+                        sql.Identifier(name), sql.Identifier(PARTITION_ARCHIVE_SCHEMA)
+                    )
+                )
+            else:
+                conn.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+        conn.commit()
+    if dry_run:
+        conn.rollback()
+    return totals
+
+
+def migrate(conn, *, keep_old: bool = False) -> dict[str, int]:
+    """Convert the plain daily tables to partitioned ones, rows included, in one transaction."""
+    tables = [t for t in PARTITIONED_TABLES if conn.execute("SELECT to_regclass(%s)", (t,)).fetchone()[0]]
+    plain = [t for t in tables if not is_partitioned(conn, t)]
+    if not plain:
+        logging.info("All daily tables are already partitioned")
+        return {}
+
+    for table in plain:
+        old = f"{table}_unpartitioned"
+        conn.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(sql.Identifier(table)))
+        conn.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(table), sql.Identifier(old)))
+        # Index names are per schema: free them for the new table's indexes
+        indexes = conn.execute(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE i.indrelid = %s::regclass",
+            (old,),
+        ).fetchall()
+        for (index,) in indexes:
+            conn.execute(
+                sql.SQL("ALTER INDEX {} RENAME TO {}").format(sql.Identifier(index), sql.Identifier(f"{index[:50]}_unpart"))
+            )
+
+    logging.info("Creating partitioned tables from %s", SCHEMA_FILE)
+    conn.execute(SCHEMA_FILE.read_text())
+
+    copied: dict[str, int] = {}
+    for table in plain:
+        old = f"{table}_unpartitioned"
+        first, last = conn.execute(
+            sql.SQL("SELECT min(captured_on), max(captured_on) FROM {}").format(sql.Identifier(old))
+        ).fetchone()
+        copied[table] = 0
+        if first is not None:
+            ensure_partitions(conn, table, first, last)
+            columns = sql.SQL(", ").join(
+                sql.Identifier(name)
+                for (name,) in conn.execute(
+                    "SELECT attname FROM pg_attribute WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped"
+                    " ORDER BY attnum",
+                    (table,),
+                ).fetchall()
+            )
+            for month in _months(first, last):
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        sql.SQL(
+                            "INSERT INTO {table} ({columns}) SELECT {columns} FROM {old}"
+                            " WHERE captured_on >= %s AND captured_on < %s"
+                        ).format(table=sql.Identifier(table), columns=columns, old=sql.Identifier(old)),
+                        (month, add_months(month, 1)),
+                    )
+                    copied[table] += cursor.rowcount
+            logging.info("%s: copied %s rows (%s to %s)", table, copied[table], first, last)
+        if not keep_old:
+            conn.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(old)))
+    conn.commit()
+    for table in plain:
+        conn.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table)))
+    conn.commit()
+    return copied
+
+
+def _months(first: date, last: date) -> Iterator[date]:
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def _scanned(plan: dict[str, Any]) -> Iterator[str]:
+    if "Relation Name" in plan:
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from _scanned(child)
+
+
+def pruning_queries(day: date) -> list[tuple[str, str, str, dict[str, Any], date, date]]:
+    """(label, table, statement, params, start, end) for the API's date-filtered reads."""
+    from app.export import EXPORT_QUERY
+
+    week, quarter = day - timedelta(days=7), day - timedelta(days=90)
+    month_start = day.replace(day=1)
+    return [
+        (
+            "leaderboard (daily)", "metrics_daily",
+            "SELECT m.podcast_id FROM metrics_daily m JOIN podcasts p ON p.id = m.podcast_id"
+            " WHERE m.captured_on = %(day)s ORDER BY m.rank LIMIT 100",
+            {"day": day}, day, day,
+        ),
+        (
+            "leaderboard (weekly)", "metrics_daily",
+            "SELECT m.podcast_id, AVG(m.rank) FROM metrics_daily m"
+            " WHERE m.captured_on >= %(start)s AND m.captured_on <= %(end)s GROUP BY m.podcast_id",
+            {"start": week, "end": day}, week, day,
+        ),
+        (
+            "podcast history (90 days)", "metrics_daily",
+            "SELECT captured_on, rank FROM metrics_daily"
+            " WHERE podcast_id = %(id)s AND captured_on BETWEEN %(start)s AND %(end)s ORDER BY captured_on",
+            {"id": "x", "start": quarter, "end": day}, quarter, day,
+        ),
+        (
+            "export (month)", "metrics_daily", EXPORT_QUERY,
+            {"start": month_start, "end": day, "category": None}, month_start, day,
+        ),
+        (
+            "metrics input (day)", "ranks_daily",
+            "SELECT podcast_id, MIN(rank) FROM ranks_daily"
+            " WHERE source = 'listennotes' AND captured_on BETWEEN %(start)s AND %(end)s GROUP BY podcast_id",
+            {"start": day, "end": day}, day, day,
+        ),
+        (
+            "most watched (week)", "podcast_listen_metrics_daily",
+            "SELECT podcast_id, SUM(total_listen_time_seconds) FROM podcast_listen_metrics_daily"
+            " WHERE captured_on >= %(start)s AND captured_on <= %(end)s GROUP BY podcast_id",
+            {"start": week, "end": day}, week, day,
+        ),
+        (
+            "episode metrics (day)", "episode_metrics_daily",
+            "SELECT episode_id FROM episode_metrics_daily WHERE captured_on = %(day)s",
+            {"day": day}, day, day,
+        ),
+    ]
+
+
+def check(conn, day: date) -> bool:
+    """Print the partitions each API query scans; False if any scans more than its months."""
+    ok = True
+    for label, table, statement, params, start, end in pruning_queries(day):
+        if not is_partitioned(conn, table):
+            print(f"   {label:<28} skipped: {table} is not partitioned")
+            continue
+        plan = conn.execute("EXPLAIN (FORMAT JSON) " + statement, params).fetchone()[0][0]["Plan"]
+        partitions = set(month_partitions(conn, table).values()) | {f"{table}_default"}
+        scanned = sorted(set(_scanned(plan)) & partitions)
+        expected = len(list(_months(start, end)))
+        passed = len(scanned) <= expected
+        ok = ok and passed
+        print(
+            f"   {'ok  ' if passed else 'FAIL'} {label:<28} {len(scanned)} of {len(partitions)} {table} partitions"
+            f" ({', '.join(scanned) or 'none'})"
+        )
+    return ok
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    maintain_parser = commands.add_parser("maintain", help="create upcoming months, detach expired ones")
+    maintain_parser.add_argument("--dry-run", action="store_true")
+    migrate_parser = commands.add_parser("migrate", help="convert plain daily tables to partitioned ones")
+    migrate_parser.add_argument("--keep-old", action="store_true", help="keep the old tables as <table>_unpartitioned")
+    commands.add_parser("check", help="verify the API queries get partition pruning")
+    args = parser.parse_args()
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL is required")
+
+    with connect(database_url) as conn:
+        if args.command == "maintain":
+            totals = maintain(conn, date.today(), dry_run=args.dry_run)
+            logging.info("Partitions: %s created, %s detached", totals["created"], totals["detached"])
+        elif args.command == "migrate":
+            copied = migrate(conn, keep_old=args.keep_old)
+            for table, rows in copied.items():
+                logging.info("Migrated %s (%s rows)", table, rows)
+        elif not check(conn, date.today()):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
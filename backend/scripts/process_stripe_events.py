@@ -0,0 +1,43 @@
+"""Apply queued Stripe webhook events (stripe_events table).
+
+The API drains the queue itself unless STRIPE_EVENTS_WORKER=0; run this from
+cron on deployments without a long-lived process.
+
+Usage:
+    python scripts/process_stripe_events.py [--max-batches N]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db import close_pool, open_pool
+from app.subscriptions import STRIPE_EVENTS_BATCH_SIZE, process_stripe_events
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-batches", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=STRIPE_EVENTS_BATCH_SIZE)
+    args = parser.parse_args()
+
+    open_pool()
+    try:
+        totals: dict[str, int] = {}
+        for _ in range(args.max_batches):
+            counts = process_stripe_events(batch_size=args.batch_size)
+            for outcome, n in counts.items():
+                totals[outcome] = totals.get(outcome, 0) + n
+            if counts["claimed"] < args.batch_size or counts["claimed"] == counts["deferred"]:
+                break
+        logging.info("Stripe events: %s", ", ".join(f"{k}={v}" for k, v in totals.items()))
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Recompute derived metrics without re-ingesting.
+
+``dirty`` drains metrics_dirty: rank rows for past days that were corrected or
+ingested late. Only the metrics rows that reference those days are recomputed,
+oldest days first, one committed batch at a time. It is safe to run from cron
+alongside the daily ingest.
+
+``range`` rebuilds metrics_daily for a date range purely from ranks_daily, e.g.
+after changing METRICS_HORIZONS or repairing ranks. The range is split into
+chunks of whole calendar months (the unit metrics writers lock), which are
+recomputed in parallel worker processes, each with its own connection and
+transaction. Each chunk reads its reference days from ranks_daily, so chunks
+don't wait on each other.
+
+Usage:
+    python scripts/recompute.py dirty [--batch-size 5000] [--max-batches N]
+    python scripts/recompute.py range --from 2024-01-01 [--to 2024-06-30] [--workers 4]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import Iterator
+
+from dotenv import load_dotenv
+from psycopg import connect
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.metrics import METRICS_RECOMPUTE_BATCH_SIZE, compute_metrics_range, recompute_dirty
+
+# Worker processes for `range`; each holds one connection
+METRICS_RECOMPUTE_WORKERS = int(os.environ.get("METRICS_RECOMPUTE_WORKERS", "4"))
+
+
+def run_dirty(database_url: str, batch_size: int, max_batches: int | None) -> dict[str, int]:
+    with connect(database_url) as conn:
+        conn.autocommit = False
+        return recompute_dirty(conn, batch_size=batch_size, max_batches=max_batches)
+
+
+def month_chunks(start: date, end: date, months: int = 1) -> Iterator[tuple[date, date]]:
+    """Split [start, end] into inclusive ranges of ``months`` calendar months."""
+    chunk_start = start
+    while chunk_start <= end:
+        boundary = chunk_start.replace(day=1)
+        for _ in range(months):
+            boundary = (boundary + timedelta(days=32)).replace(day=1)
+        chunk_end = min(end, boundary - timedelta(days=1))
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+def recompute_chunk(database_url: str, start: date, end: date) -> tuple[int, float]:
+    """Recompute one chunk in its own transaction; returns rows changed and seconds."""
+    began = time.perf_counter()
+    with connect(database_url) as conn:
+        written = compute_metrics_range(conn, start, end, raw_history=True)
+        conn.commit()
+    return written, time.perf_counter() - began
+
+
+def run_range(database_url: str, start: date, end: date, workers: int = METRICS_RECOMPUTE_WORKERS) -> dict[str, int]:
+    """Recompute metrics_daily for [start, end] in month-aligned chunks across ``workers``.
+
+    A failed chunk is logged and the others carry on; the run then raises so
+    the failed months can be retried with a narrower range.
+    """
+    months = (end.year - start.year) * 12 + end.month - start.month + 1
+    # Every chunk rereads the longest horizon before it, so chunks are as large as
+    # possible while still giving each worker about two (for balance and progress)
+    chunks = list(month_chunks(start, end, -(-months // (2 * max(1, workers)))))
+    totals = {"chunks": len(chunks), "written": 0, "failed": 0}
+    began = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(chunks)))) as pool:
+        futures = {pool.submit(recompute_chunk, database_url, *chunk): chunk for chunk in chunks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            chunk_start, chunk_end = futures[future]
+            try:
+                written, seconds = future.result()
+            except Exception:
+                totals["failed"] += 1
+                logging.exception("Recompute of %s to %s failed", chunk_start, chunk_end)
+                continue
+            totals["written"] += written
+            elapsed = time.perf_counter() - began
+            logging.info(
+                "[%s/%s] %s to %s: %s rows changed in %.1fs (%.0fs elapsed, ~%.0fs left)",
+                done, len(chunks), chunk_start, chunk_end, written, seconds,
+                elapsed, elapsed / done * (len(chunks) - done),
+            )
+    if totals["failed"]:
+        raise RuntimeError(f"{totals['failed']} of {len(chunks)} chunks failed to recompute")
+    return totals
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    dirty = commands.add_parser("dirty", help="recompute metrics downstream of queued rank changes")
+    dirty.add_argument("--batch-size", type=int, default=METRICS_RECOMPUTE_BATCH_SIZE)
+    dirty.add_argument("--max-batches", type=int, default=None)
+    ranged = commands.add_parser("range", help="rebuild metrics for a date range from ranks_daily")
+    ranged.add_argument("--from", dest="start", type=date.fromisoformat, required=True)
+    ranged.add_argument("--to", dest="end", type=date.fromisoformat, default=date.today())
+    ranged.add_argument("--workers", type=int, default=METRICS_RECOMPUTE_WORKERS)
+    args = parser.parse_args()
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL is required")
+
+    if args.command == "dirty":
+        totals = run_dirty(database_url, args.batch_size, args.max_batches)
+    else:
+        if args.start > args.end:
+            parser.error("--from must not be after --to")
+        totals = run_range(database_url, args.start, args.end, args.workers)
+    logging.info("Recompute: %s", ", ".join(f"{k}={v}" for k, v in totals.items()))
+
+
+if __name__ == "__main__":
+    main()
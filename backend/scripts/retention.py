@@ -0,0 +1,278 @@
+"""Tiered retention: fold old daily rows into weekly, then monthly summaries.
+
+Daily rows of metrics_daily, ranks_daily and episode_metrics_daily older than
+RETENTION_DAILY_DAYS are rolled into one 'week' row per week in the matching
+*_rollup table, and week rows older than RETENTION_WEEKLY_DAYS into one 'month'
+row. Weeks are split where a month ends, so every week folds into one month. Each period is moved by a single DELETE ... RETURNING feeding the INSERT,
+one committed transaction per period, so a run can stop anywhere and resume.
+A summary that already exists (late rows for a compacted period) is merged,
+weighting averages by the days each side stands for. chart_memberships rows
+past the daily window are deleted outright: they only filter daily charts.
+
+Month partitions left empty are dropped, which is what returns the space;
+deleted rows alone only leave reusable room inside the table.
+
+Usage:
+    python scripts/retention.py [--dry-run]
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+from psycopg import connect, sql
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scripts.metrics import METRICS_HORIZON_TOLERANCE_DAYS, METRICS_HORIZONS, lock_metrics_months
+from scripts.partitions import add_months, is_partitioned, month_partitions
+
+# Days kept at daily granularity; must cover the longest metrics horizon
+RETENTION_DAILY_DAYS = int(os.environ.get("RETENTION_DAILY_DAYS", "180"))
+# Days kept at weekly granularity before weeks are folded into months
+RETENTION_WEEKLY_DAYS = int(os.environ.get("RETENTION_WEEKLY_DAYS", "730"))
+
+
+@dataclass(frozen=True)
+class Measure:
+    column: str
+    kind: str  # mean | min | max | sum | any
+    daily_column: str | None = None  # source column in the daily table, if named differently
+
+    def aggregate(self) -> sql.Composable:
+        """Aggregate over rows of (value, days), daily rows counting one day each."""
+        col = sql.Identifier(self.column)
+        if self.kind == "mean":
+            return sql.SQL("SUM({c}::float8 * days) / NULLIF(SUM(days) FILTER (WHERE {c} IS NOT NULL), 0)").format(c=col)
+        function = {"min": "MIN", "max": "MAX", "sum": "SUM", "any": "BOOL_OR"}[self.kind]
+        return sql.SQL("{}({})").format(sql.SQL(function), col)
+
+    def merge(self) -> sql.Composable:
+        """Combine a stored summary (r) with a new one for the same period (EXCLUDED)."""
+        col = sql.Identifier(self.column)
+        template = {
+            "mean": "CASE WHEN r.{c} IS NULL THEN EXCLUDED.{c} WHEN EXCLUDED.{c} IS NULL THEN r.{c}"
+            " ELSE (r.{c} * r.days + EXCLUDED.{c} * EXCLUDED.days) / (r.days + EXCLUDED.days) END",
+            "min": "LEAST(r.{c}, EXCLUDED.{c})",
+            "max": "GREATEST(r.{c}, EXCLUDED.{c})",
+            "sum": "COALESCE(r.{c} + EXCLUDED.{c}, r.{c}, EXCLUDED.{c})",
+            "any": "r.{c} OR EXCLUDED.{c}",
+        }[self.kind]
+        return sql.SQL("{c} = ").format(c=col) + sql.SQL(template).format(c=col)
+
+
+@dataclass(frozen=True)
+class Rollup:
+    daily: str
+    rollup: str
+    keys: tuple[str, ...]
+    measures: tuple[Measure, ...]
+
+
+ROLLUPS = [
+    Rollup(
+        "metrics_daily", "metrics_rollup", ("podcast_id",),
+        (
+            Measure("rank", "mean"),
+            Measure("best_rank", "min", "rank"),
+            Measure("delta_7d", "mean"),
+            Measure("delta_30d", "mean"),
+            Measure("momentum_score", "mean"),
+        ),
+    ),
+    Rollup(
+        "ranks_daily", "ranks_rollup", ("podcast_id", "source", "country"),
+        (Measure("rank", "mean"), Measure("best_rank", "min", "rank")),
+    ),
+    Rollup(
+        "episode_metrics_daily", "episode_metrics_rollup", ("episode_id",),
+        (
+            Measure("total_listen_time_seconds", "sum"),
+            Measure("unique_listeners", "max"),
+            Measure("completion_rate", "mean"),
+            Measure("is_new_episode", "any"),
+        ),
+    ),
+]
+
+
+def cutoffs(today: date) -> tuple[date, date]:
+    """First day still kept daily (a Monday) and first still kept weekly (a 1st)."""
+    daily = today - timedelta(days=RETENTION_DAILY_DAYS)
+    weekly = today - timedelta(days=RETENTION_WEEKLY_DAYS)
+    return daily - timedelta(days=daily.weekday()), weekly.replace(day=1)
+
+
+def check_policy() -> None:
+    longest = max((h.days for h in METRICS_HORIZONS), default=0) + METRICS_HORIZON_TOLERANCE_DAYS
+    if RETENTION_DAILY_DAYS <= longest + 7:
+        raise ValueError(
+            f"RETENTION_DAILY_DAYS={RETENTION_DAILY_DAYS} must exceed the longest metrics horizon "
+            f"({longest} days) by more than a week, or metrics lose their reference ranks"
+        )
+    if RETENTION_WEEKLY_DAYS < RETENTION_DAILY_DAYS:
+        raise ValueError("RETENTION_WEEKLY_DAYS must not be shorter than RETENTION_DAILY_DAYS")
+
+
+def roll_statement(spec: Rollup, grain: str) -> sql.Composed:
+    """Move one period [%(start)s, %(end)s) into ``grain`` summaries.
+
+    Week summaries come from the daily table, month summaries from week rows.
+    Returns the rows moved and the summaries written.
+    """
+    keys = sql.SQL(", ").join(map(sql.Identifier, spec.keys))
+    if grain == "week":
+        source, date_column, source_filter = spec.daily, "captured_on", sql.SQL("")
+        returned = sql.SQL(", ").join(
+            sql.SQL("{} AS {}").format(sql.Identifier(m.daily_column or m.column), sql.Identifier(m.column))
+            for m in spec.measures
+        ) + sql.SQL(", 1 AS days")
+    else:
+        source, date_column, source_filter = spec.rollup, "period_start", sql.SQL(" AND grain = 'week'")
+        returned = sql.SQL(", ").join(sql.Identifier(m.column) for m in spec.measures) + sql.SQL(", days")
+    columns = sql.SQL(", ").join(sql.Identifier(m.column) for m in spec.measures)
+    return sql.SQL(
+        """
+        WITH moved AS (
+            DELETE FROM {source}
+            WHERE {date} >= %(start)s AND {date} < %(end)s{source_filter}
+            RETURNING {keys}, {returned}
+        ), written AS (
+            INSERT INTO {rollup} AS r ({keys}, grain, period_start, period_end, days, {columns})
+            SELECT {keys}, %(grain)s, %(start)s, %(end)s, SUM(days), {aggregates}
+            FROM moved
+            GROUP BY {keys}
+            ON CONFLICT ({keys}, grain, period_start) DO UPDATE SET days = r.days + EXCLUDED.days, {merges}
+            RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM moved), (SELECT count(*) FROM written)
+        """
+    ).format(
+        source=sql.Identifier(source),
+        date=sql.Identifier(date_column),
+        source_filter=source_filter,
+        keys=keys,
+        returned=returned,
+        rollup=sql.Identifier(spec.rollup),
+        columns=columns,
+        aggregates=sql.SQL(", ").join(m.aggregate() for m in spec.measures),
+        merges=sql.SQL(", ").join(m.merge() for m in spec.measures),
+    )
+
+
+def _period(day: date, grain: str) -> tuple[date, date]:
+    """[start, end) of the ``grain`` period holding ``day``; weeks stop at month ends."""
+    month = day.replace(day=1)
+    if grain == "week":
+        monday = day - timedelta(days=day.weekday())
+        return max(monday, month), min(monday + timedelta(days=7), add_months(month, 1))
+    return month, add_months(month, 1)
+
+
+def roll(conn, spec: Rollup, grain: str, cutoff: date, *, dry_run: bool = False) -> dict[str, int]:
+    """Roll every period before ``cutoff`` into ``grain`` summaries, oldest first, one commit each."""
+    if grain == "week":
+        table, date_column, source_filter = spec.daily, "captured_on", sql.SQL("")
+    else:
+        table, date_column, source_filter = spec.rollup, "period_start", sql.SQL(" AND grain = 'week'")
+    pending = sql.SQL("FROM {} WHERE {} < %s{}").format(sql.Identifier(table), sql.Identifier(date_column), source_filter)
+    if dry_run:
+        return {"periods": 0, "rows": conn.execute(sql.SQL("SELECT count(*) ") + pending, (cutoff,)).fetchone()[0], "summaries": 0}
+
+    oldest = sql.SQL("SELECT min({}) ").format(sql.Identifier(date_column)) + pending
+    statement = roll_statement(spec, grain)
+    totals = {"periods": 0, "rows": 0, "summaries": 0}
+    while True:
+        first = conn.execute(oldest, (cutoff,)).fetchone()[0]
+        if first is None:
+            break
+        start, end = _period(first, grain)
+        with conn.cursor() as cursor:
+            if spec.daily == "metrics_daily" and grain == "week":
+                # Same lock as metrics writers, so a recompute can't rewrite rows being moved
+                lock_metrics_months(conn, [start, end - timedelta(days=1)])
+            moved, summaries = cursor.execute(statement, {"start": start, "end": end, "grain": grain}).fetchone()
+        conn.commit()
+        totals["periods"] += 1
+        totals["rows"] += moved
+        totals["summaries"] += summaries
+        logging.info("%s: %s rows from %s -> %s %s summaries", spec.rollup, moved, start, summaries, grain)
+    return totals
+
+
+def trim_memberships(conn, cutoff: date, *, dry_run: bool = False) -> int:
+    """Delete chart_memberships before ``cutoff`` a week at a time."""
+    if dry_run:
+        return conn.execute("SELECT count(*) FROM chart_memberships WHERE captured_on < %s", (cutoff,)).fetchone()[0]
+    deleted = 0
+    while True:
+        first = conn.execute("SELECT min(captured_on) FROM chart_memberships WHERE captured_on < %s", (cutoff,)).fetchone()[0]
+        if first is None:
+            return deleted
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM chart_memberships WHERE captured_on >= %s AND captured_on < %s",
+                (first, min(cutoff, first + timedelta(days=7))),
+            )
+            deleted += cursor.rowcount
+        conn.commit()
+
+
+def drop_empty_partitions(conn, table: str, cutoff: date, *, dry_run: bool = False) -> list[str]:
+    """Drop month partitions of ``table`` that end before ``cutoff`` and hold no rows."""
+    if not is_partitioned(conn, table):
+        return []
+    dropped = []
+    for month, name in sorted(month_partitions(conn, table).items()):
+        if add_months(month, 1) > cutoff:
+            break
+        empty = not conn.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {})").format(sql.Identifier(name))).fetchone()[0]
+        if empty:
+            if not dry_run:
+                conn.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+                conn.commit()
+            dropped.append(name)
+    return dropped
+
+
+def compact(conn, today: date, *, dry_run: bool = False) -> dict[str, int]:
+    check_policy()
+    daily_cutoff, weekly_cutoff = cutoffs(today)
+    logging.info(
+        "Keeping daily rows from %s and weekly summaries from %s%s",
+        daily_cutoff, weekly_cutoff, " (dry run)" if dry_run else "",
+    )
+    totals = {"daily_rows": 0, "weekly_rows": 0, "memberships": 0, "partitions_dropped": 0}
+    for spec in ROLLUPS:
+        totals["daily_rows"] += roll(conn, spec, "week", daily_cutoff, dry_run=dry_run)["rows"]
+        totals["weekly_rows"] += roll(conn, spec, "month", weekly_cutoff, dry_run=dry_run)["rows"]
+        dropped = drop_empty_partitions(conn, spec.daily, daily_cutoff, dry_run=dry_run)
+        if dropped:
+            logging.info("%s: dropped empty partitions %s", spec.daily, ", ".join(dropped))
+        totals["partitions_dropped"] += len(dropped)
+    totals["memberships"] = trim_memberships(conn, daily_cutoff, dry_run=dry_run)
+    return totals
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="count what would be compacted")
+    args = parser.parse_args()
+
+    database_url = os.environ.get("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL is required")
+
+    with connect(database_url) as conn:
+        totals = compact(conn, date.today(), dry_run=args.dry_run)
+    logging.info("Retention: %s", ", ".join(f"{k}={v}" for k, v in totals.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -21,10 +21,13 @@ CREATE TABLE IF NOT EXISTS episodes (
   audio_url TEXT,
   audio_length_seconds INTEGER,
   published_at TIMESTAMPTZ,
+  content_hash TEXT,
   created_at TIMESTAMPTZ DEFAULT now(),
   updated_at TIMESTAMPTZ DEFAULT now()
 );
 
+ALTER TABLE episodes ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
 -- Enable RLS on episodes
 DO $$ BEGIN
   ALTER TABLE episodes ENABLE ROW LEVEL SECURITY;
@@ -49,7 +52,13 @@ CREATE TABLE IF NOT EXISTS episode_metrics_daily (
   episode_age_days INTEGER,
   is_new_episode BOOLEAN DEFAULT false,
   PRIMARY KEY (episode_id, captured_on)
-);
+) PARTITION BY RANGE (captured_on);
+
+-- Rows land here until scripts/partitions.py maintain creates their month
+DO $$ BEGIN
+  CREATE TABLE IF NOT EXISTS episode_metrics_daily_default PARTITION OF episode_metrics_daily DEFAULT;
+EXCEPTION WHEN wrong_object_type THEN NULL;  -- created unpartitioned; see partitions.py migrate
+END $$;
 
 -- Enable RLS on episode_metrics_daily
 DO $$ BEGIN
@@ -77,7 +86,13 @@ CREATE TABLE IF NOT EXISTS podcast_listen_metrics_daily (
   active_episodes_count INTEGER DEFAULT 0,
   engagement_score DOUBLE PRECISION,
   PRIMARY KEY (podcast_id, captured_on)
-);
+) PARTITION BY RANGE (captured_on);
+
+-- Rows land here until scripts/partitions.py maintain creates their month
+DO $$ BEGIN
+  CREATE TABLE IF NOT EXISTS podcast_listen_metrics_daily_default PARTITION OF podcast_listen_metrics_daily DEFAULT;
+EXCEPTION WHEN wrong_object_type THEN NULL;  -- created unpartitioned; see partitions.py migrate
+END $$;
 
 -- Enable RLS on podcast_listen_metrics_daily
 DO $$ BEGIN
@@ -0,0 +1,105 @@
+"""Per-run telemetry for the ingestion scripts.
+
+A ``RunStats`` collects wall time per stage, time spent waiting on the
+database, HTTP counters and rows written. At the end of a run it is stored in
+``ingest_run_stats`` (charted by ``/api/admin/ingest-runs``) and printed as one
+JSON line, failed runs included.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any, Iterator
+
+from psycopg import connect
+from psycopg.types.json import Jsonb
+
+from scripts.bulk_write import BulkWriteResult
+from scripts.listennotes import HttpStats
+
+
+@dataclass
+class RunStats:
+    script: str
+    captured_on: date
+    run_id: int | None = None
+    status: str = "ok"  # ok, incomplete, failed
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    stages: dict[str, float] = field(default_factory=dict)  # wall seconds
+    db_seconds: float = 0.0  # summed over threads, so it can exceed wall time
+    http: HttpStats = field(default_factory=HttpStats)
+    rows: dict[str, dict[str, int]] = field(default_factory=dict)
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    @contextmanager
+    def db(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.db_seconds += time.perf_counter() - start
+
+    def add_rows(self, table: str, result: BulkWriteResult) -> None:
+        counts = self.rows.setdefault(table, {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0})
+        counts["inserted"] += result.inserted
+        counts["updated"] += result.updated
+        counts["unchanged"] += result.unchanged
+        counts["skipped"] += result.skipped
+
+    def add_http(self, stats: HttpStats) -> None:
+        for name, value in asdict(stats).items():
+            setattr(self.http, name, getattr(self.http, name) + value)
+
+    @property
+    def wall_seconds(self) -> float:
+        return time.perf_counter() - self._start
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "script": self.script,
+            "run_id": self.run_id,
+            "captured_on": self.captured_on.isoformat(),
+            "status": self.status,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "stages": {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            "db_seconds": round(self.db_seconds, 3),
+            "http": {**asdict(self.http), "retry_wait_seconds": round(self.http.retry_wait_seconds, 3)},
+            "rows": self.rows,
+        }
+
+    def finish(self, database_url: str) -> None:
+        """Store the stats and print them as JSON; never raises."""
+        summary = self.summary()
+        print(json.dumps(summary), flush=True)
+        try:
+            with connect(database_url, autocommit=True) as conn:
+                conn.execute(
+                    """
+                    INSERT INTO ingest_run_stats (script, run_id, captured_on, started_at, wall_seconds, status, stats)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (
+                        self.script,
+                        self.run_id,
+                        self.captured_on,
+                        self.started_at,
+                        summary["wall_seconds"],
+                        self.status,
+                        Jsonb({k: summary[k] for k in ("stages", "db_seconds", "http", "rows")}),
+                    ),
+                )
+        except Exception:
+            logging.exception("Could not store run stats")
+
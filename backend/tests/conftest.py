@@ -0,0 +1,88 @@
+"""Shared fixtures: the app runs against a throwaway schema built from infra/schema.sql.
+
+Tests need a dedicated Postgres database in TEST_DATABASE_URL and are skipped
+without one; DATABASE_URL (or .env) is never used, so they can't touch real data.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Read by app.db, so set before anything imports the app (load_dotenv won't override them).
+# Always a dedicated name: the schema is dropped when the session ends.
+TEST_SCHEMA = "podcharts_test"
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL", "")
+os.environ["DB_SEARCH_PATH"] = TEST_SCHEMA
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+@pytest.fixture(scope="session")
+def db() -> Iterator[Any]:
+    """Connection to the test schema; the app's pool points at the same database."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    from app.db import close_pool, open_pool
+    from scripts.benchlib import scratch_schema
+
+    with scratch_schema(TEST_SCHEMA, TEST_DATABASE_URL) as conn:
+        open_pool()
+        try:
+            yield conn
+        finally:
+            close_pool()
+
+
+@pytest.fixture
+def clean_db(db: Any) -> Any:
+    db.execute("TRUNCATE stripe_events, users CASCADE")
+    db.commit()
+    return db
+
+
+def sign(payload: bytes, secret: str = WEBHOOK_SECRET, timestamp: int | None = None) -> str:
+    """``Stripe-Signature`` header for ``payload``, as Stripe computes it."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    signed = f"{timestamp}.".encode() + payload
+    digest = hmac.new(secret.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def stripe_event(event_id: str, event_type: str, obj: dict[str, Any], created: int) -> dict[str, Any]:
+    return {"id": event_id, "type": event_type, "created": created, "data": {"object": obj}}
+
+
+def encode(event: dict[str, Any]) -> bytes:
+    return json.dumps(event).encode()
+
+
+class StubStripe:
+    """Stands in for the ``stripe`` module: records retrieves, optionally fails them."""
+
+    api_key = "sk_test_stub"
+
+    def __init__(self, error: Exception | None = None, period_end: int = 1_900_000_000):
+        self.retrieved: list[str] = []
+        stub = self
+
+        class Subscription:
+            @staticmethod
+            def retrieve(subscription_id: str) -> dict[str, Any]:
+                stub.retrieved.append(subscription_id)
+                if error is not None:
+                    raise error
+                return {"id": subscription_id, "current_period_end": period_end}
+
+        self.Subscription = Subscription
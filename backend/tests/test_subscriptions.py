@@ -0,0 +1,183 @@
+"""Stripe webhook queue: verification, dedup, per-subscription ordering and retries."""
+from __future__ import annotations
+
+from typing import Any
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+from psycopg import connect, sql
+
+from app import subscriptions
+from app.main import app
+from app.subscriptions import enqueue_stripe_event, process_stripe_events
+from conftest import TEST_SCHEMA, WEBHOOK_SECRET, StubStripe, encode, sign, stripe_event
+
+WEBHOOK = "/api/subscriptions/webhook"
+
+
+@pytest.fixture
+def client(clean_db: Any, monkeypatch: pytest.MonkeyPatch) -> TestClient:
+    monkeypatch.setattr(subscriptions, "STRIPE_WEBHOOK_SECRET", WEBHOOK_SECRET)
+    return TestClient(app)
+
+
+def queued(db: Any, event_id: str) -> dict[str, Any] | None:
+    row = db.execute(
+        """
+        SELECT status, attempts, last_error, EXTRACT(EPOCH FROM next_attempt_at - now()) AS delay
+        FROM stripe_events WHERE id = %s
+        """,
+        (event_id,),
+    ).fetchone()
+    db.commit()
+    if row is None:
+        return None
+    return {"status": row[0], "attempts": row[1], "last_error": row[2], "delay": float(row[3])}
+
+
+def user_subscription(db: Any, user_id: Any) -> tuple[str, str, str] | None:
+    row = db.execute(
+        "SELECT subscription_tier, subscription_status, subscription_id FROM users WHERE id = %s",
+        (user_id,),
+    ).fetchone()
+    db.commit()
+    return row
+
+
+def subscription_events(user_id: Any, subscription_id: str) -> tuple[dict[str, Any], dict[str, Any]]:
+    """A checkout and a later plan change for the same subscription."""
+    checkout = stripe_event(
+        "evt_checkout",
+        "checkout.session.completed",
+        {"client_reference_id": str(user_id), "subscription": subscription_id, "metadata": {"tier": "pro"}},
+        created=1_700_000_000,
+    )
+    updated = stripe_event(
+        "evt_updated",
+        "customer.subscription.updated",
+        {
+            "id": subscription_id,
+            "status": "past_due",
+            "metadata": {"tier": "enterprise"},
+            "current_period_end": 1_900_000_000,
+        },
+        created=1_700_000_060,
+    )
+    return checkout, updated
+
+
+def test_webhook_queues_signed_event(client: TestClient, clean_db: Any) -> None:
+    payload = encode(stripe_event("evt_1", "invoice.payment_succeeded", {"subscription": "sub_1"}, 1_700_000_000))
+
+    response = client.post(WEBHOOK, content=payload, headers={"stripe-signature": sign(payload)})
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "queued", "event": "invoice.payment_succeeded"}
+    assert queued(clean_db, "evt_1")["status"] == "pending"
+
+
+def test_webhook_rejects_bad_signature(client: TestClient, clean_db: Any) -> None:
+    payload = encode(stripe_event("evt_1", "invoice.payment_succeeded", {"subscription": "sub_1"}, 1_700_000_000))
+
+    response = client.post(WEBHOOK, content=payload, headers={"stripe-signature": sign(payload, "whsec_other")})
+
+    assert response.status_code == 400
+    assert queued(clean_db, "evt_1") is None
+
+
+def test_webhook_redelivery_is_duplicate(client: TestClient, clean_db: Any) -> None:
+    payload = encode(stripe_event("evt_1", "invoice.payment_succeeded", {"subscription": "sub_1"}, 1_700_000_000))
+
+    first = client.post(WEBHOOK, content=payload, headers={"stripe-signature": sign(payload)})
+    again = client.post(WEBHOOK, content=payload, headers={"stripe-signature": sign(payload)})
+
+    assert first.json()["status"] == "queued"
+    assert again.status_code == 200
+    assert again.json()["status"] == "duplicate"
+    assert clean_db.execute("SELECT COUNT(*) FROM stripe_events").fetchone()[0] == 1
+    clean_db.commit()
+
+
+def test_events_apply_in_created_order_when_claimed_out_of_order(clean_db: Any) -> None:
+    user_id = uuid4()
+    checkout, updated = subscription_events(user_id, "sub_1")
+    # Delivered newest first
+    assert enqueue_stripe_event(updated)
+    assert enqueue_stripe_event(checkout)
+    stub = StubStripe()
+
+    # Another worker holds the older event, so this one only claims the newer
+    other = connect(clean_db.info.dsn)
+    try:
+        other.execute(sql.SQL("SET search_path TO {}").format(sql.Identifier(TEST_SCHEMA)))
+        other.execute("SELECT 1 FROM stripe_events WHERE id = %s FOR UPDATE", (checkout["id"],))
+        counts = process_stripe_events(stripe_client=stub)
+    finally:
+        other.rollback()
+        other.close()
+
+    assert counts["claimed"] == 1
+    assert counts["deferred"] == 1
+    assert counts["processed"] == 0
+    assert queued(clean_db, updated["id"])["status"] == "pending"
+    assert user_subscription(clean_db, user_id) is None
+
+    counts = process_stripe_events(stripe_client=stub)
+
+    assert counts["processed"] == 2
+    assert stub.retrieved == ["sub_1"]
+    # Applied the other way round, the plan change would miss the user and leave "pro"
+    assert user_subscription(clean_db, user_id) == ("enterprise", "past_due", "sub_1")
+
+
+def test_later_event_waits_for_older_retry(clean_db: Any) -> None:
+    user_id = uuid4()
+    checkout, updated = subscription_events(user_id, "sub_1")
+    enqueue_stripe_event(updated)
+    enqueue_stripe_event(checkout)
+
+    counts = process_stripe_events(stripe_client=StubStripe(error=RuntimeError("stripe unavailable")))
+
+    assert counts["retried"] == 1
+    assert counts["deferred"] == 1
+    assert queued(clean_db, updated["id"])["attempts"] == 0
+    # The newer event is not claimable while the older one backs off
+    assert process_stripe_events(stripe_client=StubStripe())["claimed"] == 0
+
+    clean_db.execute("UPDATE stripe_events SET next_attempt_at = now() WHERE id = %s", (checkout["id"],))
+    clean_db.commit()
+    counts = process_stripe_events(stripe_client=StubStripe())
+
+    assert counts["processed"] == 2
+    assert user_subscription(clean_db, user_id) == ("enterprise", "past_due", "sub_1")
+
+
+def test_failing_event_backs_off_then_fails(clean_db: Any, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(subscriptions, "STRIPE_EVENTS_MAX_ATTEMPTS", 4)
+    monkeypatch.setattr(subscriptions, "STRIPE_EVENTS_RETRY_BASE_SECONDS", 30.0)
+    checkout, _ = subscription_events(uuid4(), "sub_1")
+    enqueue_stripe_event(checkout)
+    stub = StubStripe(error=RuntimeError("stripe unavailable"))
+
+    for attempt, delay in ((1, 30), (2, 60), (3, 120)):
+        counts = process_stripe_events(stripe_client=stub)
+        row = queued(clean_db, checkout["id"])
+        assert counts["retried"] == 1
+        assert row["status"] == "pending"
+        assert row["attempts"] == attempt
+        assert row["delay"] == pytest.approx(delay, abs=5)
+        assert row["last_error"] == "RuntimeError: stripe unavailable"
+        # Not due yet: nothing to claim until the delay passes
+        assert process_stripe_events(stripe_client=stub)["claimed"] == 0
+        clean_db.execute("UPDATE stripe_events SET next_attempt_at = now() WHERE id = %s", (checkout["id"],))
+        clean_db.commit()
+
+    counts = process_stripe_events(stripe_client=stub)
+
+    assert counts["failed"] == 1
+    row = queued(clean_db, checkout["id"])
+    assert row["status"] == "failed"
+    assert row["attempts"] == 4
+    assert len(stub.retrieved) == 4
+    assert process_stripe_events(stripe_client=stub)["claimed"] == 0
@@ -1,3 +1,6 @@
+-- Safe to re-run: every statement is idempotent, so `python scripts/setup_db.py`
+-- also upgrades an existing database.
+
 -- podcasts: unique shows
 CREATE TABLE IF NOT EXISTS podcasts (
   id TEXT PRIMARY KEY,
@@ -6,16 +9,23 @@ CREATE TABLE IF NOT EXISTS podcasts (
   category TEXT,
   rss_url TEXT,
   country TEXT,
+  content_hash TEXT,
   created_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- md5 of the columns ingest writes; rows whose hash matches are skipped
+ALTER TABLE podcasts ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
 -- Enable RLS on podcasts
 ALTER TABLE podcasts ENABLE ROW LEVEL SECURITY;
 
 -- Allow public read access to podcasts (for public API)
-CREATE POLICY "Allow public read access to podcasts" ON podcasts
-  FOR SELECT
-  USING (true);
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to podcasts" ON podcasts
+    FOR SELECT
+    USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 -- ranks_daily: raw daily ranks by source
 CREATE TABLE IF NOT EXISTS ranks_daily (
@@ -25,34 +35,81 @@ CREATE TABLE IF NOT EXISTS ranks_daily (
   country TEXT DEFAULT 'global',
   captured_on DATE NOT NULL,
   PRIMARY KEY (podcast_id, source, captured_on, country)
-);
+) PARTITION BY RANGE (captured_on);
 
 -- Enable RLS on ranks_daily
 ALTER TABLE ranks_daily ENABLE ROW LEVEL SECURITY;
 
 -- Allow public read access to ranks_daily
-CREATE POLICY "Allow public read access to ranks_daily" ON ranks_daily
-  FOR SELECT
-  USING (true);
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to ranks_daily" ON ranks_daily
+    FOR SELECT
+    USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- chart_memberships: every chart (category x country) a podcast ranked on each day.
+-- Category/country filters probe this instead of the single podcasts.category/country.
+CREATE TABLE IF NOT EXISTS chart_memberships (
+  podcast_id TEXT NOT NULL REFERENCES podcasts(id),
+  chart TEXT NOT NULL,  -- category slug, 'top' = overall chart
+  country TEXT NOT NULL,
+  captured_on DATE NOT NULL,
+  rank INTEGER NOT NULL,
+  PRIMARY KEY (podcast_id, captured_on, chart, country)
+);
+
+-- A filtered day is one range scan, already in chart order
+CREATE INDEX IF NOT EXISTS idx_chart_memberships_chart
+  ON chart_memberships(captured_on, chart, country, rank) INCLUDE (podcast_id);
+
+-- Seed history once from the per-podcast category/country ingest used to keep
+INSERT INTO chart_memberships (podcast_id, chart, country, captured_on, rank)
+SELECT r.podcast_id, p.category, r.country, r.captured_on, MIN(r.rank)
+FROM ranks_daily r
+JOIN podcasts p ON p.id = r.podcast_id
+WHERE p.category IS NOT NULL AND r.country IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM chart_memberships)
+GROUP BY r.podcast_id, p.category, r.country, r.captured_on;
+
+-- Enable RLS on chart_memberships
+ALTER TABLE chart_memberships ENABLE ROW LEVEL SECURITY;
+
+-- Allow public read access to chart_memberships
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to chart_memberships" ON chart_memberships
+    FOR SELECT
+    USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 -- metrics_daily: derived metrics
 CREATE TABLE IF NOT EXISTS metrics_daily (
   podcast_id TEXT REFERENCES podcasts(id),
   captured_on DATE NOT NULL,
   rank INTEGER,
+  delta_1d INTEGER,
   delta_7d INTEGER,
   delta_30d INTEGER,
+  delta_90d INTEGER,
   momentum_score DOUBLE PRECISION,
   PRIMARY KEY (podcast_id, captured_on)
-);
+) PARTITION BY RANGE (captured_on);
+
+-- One delta_<h>d column per METRICS_HORIZONS horizon (scripts/metrics.py)
+ALTER TABLE metrics_daily ADD COLUMN IF NOT EXISTS delta_1d INTEGER;
+ALTER TABLE metrics_daily ADD COLUMN IF NOT EXISTS delta_90d INTEGER;
 
 -- Enable RLS on metrics_daily
 ALTER TABLE metrics_daily ENABLE ROW LEVEL SECURITY;
 
 -- Allow public read access to metrics_daily
-CREATE POLICY "Allow public read access to metrics_daily" ON metrics_daily
-  FOR SELECT
-  USING (true);
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to metrics_daily" ON metrics_daily
+    FOR SELECT
+    USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 -- users: user accounts (using Supabase Auth, this is for additional data)
 CREATE TABLE IF NOT EXISTS users (
@@ -66,21 +123,32 @@ CREATE TABLE IF NOT EXISTS users (
   api_quota_monthly INTEGER DEFAULT 1000,  -- API calls per month
   api_calls_used INTEGER DEFAULT 0,
   api_reset_date DATE DEFAULT CURRENT_DATE,
+  export_bytes_used BIGINT DEFAULT 0,  -- bytes served by /api/export since export_reset_date
+  export_reset_date DATE DEFAULT date_trunc('month', CURRENT_DATE)::date,  -- month the export allowance counts from
   created_at TIMESTAMPTZ DEFAULT now(),
   updated_at TIMESTAMPTZ DEFAULT now()
 );
 
+ALTER TABLE users ADD COLUMN IF NOT EXISTS export_bytes_used BIGINT DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS export_reset_date DATE DEFAULT date_trunc('month', CURRENT_DATE)::date;
+
 -- Enable RLS on users
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 
 -- Users can only read/update their own data
-CREATE POLICY "Users can view own data" ON users
-  FOR SELECT
-  USING (auth.uid() = id);
-
-CREATE POLICY "Users can update own data" ON users
-  FOR UPDATE
-  USING (auth.uid() = id);
+DO $$ BEGIN
+  CREATE POLICY "Users can view own data" ON users
+    FOR SELECT
+    USING (auth.uid() = id);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+  CREATE POLICY "Users can update own data" ON users
+    FOR UPDATE
+    USING (auth.uid() = id);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 -- user_watchlists: podcasts users follow
 CREATE TABLE IF NOT EXISTS user_watchlists (
@@ -94,13 +162,19 @@ CREATE TABLE IF NOT EXISTS user_watchlists (
 ALTER TABLE user_watchlists ENABLE ROW LEVEL SECURITY;
 
 -- Users can only access their own watchlist
-CREATE POLICY "Users can view own watchlist" ON user_watchlists
-  FOR SELECT
-  USING (auth.uid() = user_id);
-
-CREATE POLICY "Users can manage own watchlist" ON user_watchlists
-  FOR ALL
-  USING (auth.uid() = user_id);
+DO $$ BEGIN
+  CREATE POLICY "Users can view own watchlist" ON user_watchlists
+    FOR SELECT
+    USING (auth.uid() = user_id);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+  CREATE POLICY "Users can manage own watchlist" ON user_watchlists
+    FOR ALL
+    USING (auth.uid() = user_id);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 -- user_alerts: alerts for rank changes
 CREATE TABLE IF NOT EXISTS user_alerts (
@@ -117,39 +191,55 @@ CREATE TABLE IF NOT EXISTS user_alerts (
 ALTER TABLE user_alerts ENABLE ROW LEVEL SECURITY;
 
 -- Users can only access their own alerts
-CREATE POLICY "Users can view own alerts" ON user_alerts
-  FOR SELECT
-  USING (auth.uid() = user_id);
-
-CREATE POLICY "Users can manage own alerts" ON user_alerts
-  FOR ALL
-  USING (auth.uid() = user_id);
+DO $$ BEGIN
+  CREATE POLICY "Users can view own alerts" ON user_alerts
+    FOR SELECT
+    USING (auth.uid() = user_id);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+  CREATE POLICY "Users can manage own alerts" ON user_alerts
+    FOR ALL
+    USING (auth.uid() = user_id);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 -- api_usage: track API usage for rate limiting
 CREATE TABLE IF NOT EXISTS api_usage (
   api_key TEXT NOT NULL,
   endpoint TEXT NOT NULL,
   called_at TIMESTAMPTZ DEFAULT now(),
-  user_id UUID REFERENCES users(id) ON DELETE SET NULL
+  user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+  bytes_sent BIGINT DEFAULT 0  -- bulk exports are metered by bytes, not calls
 );
 
+ALTER TABLE api_usage ADD COLUMN IF NOT EXISTS bytes_sent BIGINT DEFAULT 0;
+
 -- Enable RLS on api_usage
 ALTER TABLE api_usage ENABLE ROW LEVEL SECURITY;
 
 -- Users can only view their own API usage
-CREATE POLICY "Users can view own API usage" ON api_usage
-  FOR SELECT
-  USING (auth.uid() = user_id);
+DO $$ BEGIN
+  CREATE POLICY "Users can view own API usage" ON api_usage
+    FOR SELECT
+    USING (auth.uid() = user_id);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 -- Service role can insert API usage (for backend tracking)
-CREATE POLICY "Service role can insert API usage" ON api_usage
-  FOR INSERT
-  WITH CHECK (true);
+DO $$ BEGIN
+  CREATE POLICY "Service role can insert API usage" ON api_usage
+    FOR INSERT
+    WITH CHECK (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 CREATE INDEX IF NOT EXISTS idx_api_usage_key_date ON api_usage(api_key, called_at);
 CREATE INDEX IF NOT EXISTS idx_user_watchlists_user ON user_watchlists(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_alerts_user ON user_alerts(user_id);
 CREATE INDEX IF NOT EXISTS idx_metrics_daily_podcast ON metrics_daily(podcast_id, captured_on);
+CREATE INDEX IF NOT EXISTS idx_ranks_daily_source_date ON ranks_daily(source, captured_on) INCLUDE (podcast_id, rank);
 
 -- episodes: individual podcast episodes
 CREATE TABLE IF NOT EXISTS episodes (
@@ -160,17 +250,55 @@ CREATE TABLE IF NOT EXISTS episodes (
   audio_url TEXT,
   audio_length_seconds INTEGER,  -- Episode duration in seconds
   published_at TIMESTAMPTZ,  -- When episode was published
+  content_hash TEXT,
   created_at TIMESTAMPTZ DEFAULT now(),
   updated_at TIMESTAMPTZ DEFAULT now()
 );
 
+-- md5 of the columns ingest writes; rows whose hash matches are skipped
+ALTER TABLE episodes ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
 -- Enable RLS on episodes
 ALTER TABLE episodes ENABLE ROW LEVEL SECURITY;
 
 -- Allow public read access to episodes
-CREATE POLICY "Allow public read access to episodes" ON episodes
-  FOR SELECT
-  USING (true);
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to episodes" ON episodes
+    FOR SELECT
+    USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- episode_sync_state: when scripts/ingest_episodes.py last fetched each podcast's
+-- episodes; together with the current chart rank it decides who is refreshed first
+CREATE TABLE IF NOT EXISTS episode_sync_state (
+  podcast_id TEXT PRIMARY KEY REFERENCES podcasts(id) ON DELETE CASCADE,
+  status TEXT NOT NULL,  -- ok, unchanged (nothing new since the last sync), not_found, failed
+  episodes_seen INTEGER NOT NULL DEFAULT 0,  -- episodes returned by the last sync
+  last_error TEXT,
+  last_synced_at TIMESTAMPTZ,  -- last completed sync; NULL until one succeeds
+  latest_published_at TIMESTAMPTZ,  -- newest episode stored: incremental syncs page down to it
+  etag TEXT,  -- ETag of the newest page, sent back as If-None-Match
+  backfill_cursor BIGINT,  -- next_episode_pub_date the backfill resumes from; NULL = the newest page
+  backfilled_at TIMESTAMPTZ  -- set once the backfill reached the oldest episode
+);
+
+ALTER TABLE episode_sync_state ADD COLUMN IF NOT EXISTS latest_published_at TIMESTAMPTZ;
+ALTER TABLE episode_sync_state ADD COLUMN IF NOT EXISTS etag TEXT;
+ALTER TABLE episode_sync_state ADD COLUMN IF NOT EXISTS backfill_cursor BIGINT;
+ALTER TABLE episode_sync_state ADD COLUMN IF NOT EXISTS backfilled_at TIMESTAMPTZ;
+
+-- Seed high-water marks once from the episodes ingested before incremental sync
+INSERT INTO episode_sync_state (podcast_id, status, episodes_seen, latest_published_at)
+SELECT podcast_id, 'ok', COUNT(*), MAX(published_at)
+FROM episodes
+WHERE podcast_id IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM episode_sync_state WHERE latest_published_at IS NOT NULL)
+GROUP BY podcast_id
+ON CONFLICT (podcast_id) DO UPDATE SET latest_published_at = EXCLUDED.latest_published_at;
+
+-- Enable RLS on episode_sync_state (no policies: backend only)
+ALTER TABLE episode_sync_state ENABLE ROW LEVEL SECURITY;
 
 -- episode_metrics_daily: daily episode-level metrics
 CREATE TABLE IF NOT EXISTS episode_metrics_daily (
@@ -184,15 +312,18 @@ CREATE TABLE IF NOT EXISTS episode_metrics_daily (
   episode_age_days INTEGER,  -- Days since publication
   is_new_episode BOOLEAN DEFAULT false,  -- Published within last 7 days
   PRIMARY KEY (episode_id, captured_on)
-);
+) PARTITION BY RANGE (captured_on);
 
 -- Enable RLS on episode_metrics_daily
 ALTER TABLE episode_metrics_daily ENABLE ROW LEVEL SECURITY;
 
 -- Allow public read access to episode_metrics_daily
-CREATE POLICY "Allow public read access to episode_metrics_daily" ON episode_metrics_daily
-  FOR SELECT
-  USING (true);
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to episode_metrics_daily" ON episode_metrics_daily
+    FOR SELECT
+    USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 -- podcast_listen_metrics_daily: aggregated podcast-level listen metrics
 CREATE TABLE IF NOT EXISTS podcast_listen_metrics_daily (
@@ -209,15 +340,18 @@ CREATE TABLE IF NOT EXISTS podcast_listen_metrics_daily (
   -- Engagement score (composite metric)
   engagement_score DOUBLE PRECISION,  -- Composite score based on listen time, listeners, new episodes
   PRIMARY KEY (podcast_id, captured_on)
-);
+) PARTITION BY RANGE (captured_on);
 
 -- Enable RLS on podcast_listen_metrics_daily
 ALTER TABLE podcast_listen_metrics_daily ENABLE ROW LEVEL SECURITY;
 
 -- Allow public read access to podcast_listen_metrics_daily
-CREATE POLICY "Allow public read access to podcast_listen_metrics_daily" ON podcast_listen_metrics_daily
-  FOR SELECT
-  USING (true);
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to podcast_listen_metrics_daily" ON podcast_listen_metrics_daily
+    FOR SELECT
+    USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
 
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_episodes_podcast ON episodes(podcast_id);
@@ -226,3 +360,264 @@ CREATE INDEX IF NOT EXISTS idx_episode_metrics_date ON episode_metrics_daily(cap
 CREATE INDEX IF NOT EXISTS idx_episode_metrics_episode ON episode_metrics_daily(episode_id, captured_on);
 CREATE INDEX IF NOT EXISTS idx_podcast_listen_metrics_date ON podcast_listen_metrics_daily(captured_on);
 CREATE INDEX IF NOT EXISTS idx_podcast_listen_metrics_podcast ON podcast_listen_metrics_daily(podcast_id, captured_on);
+
+-- Monthly partitions of the daily tables, named <table>_pYYYY_MM (scripts/partitions.py).
+-- Rows for a month without a partition land in <table>_default; creating the month's
+-- partition moves them over. Tables created before partitioning stay plain until
+-- `python scripts/partitions.py migrate` converts them, and are skipped here.
+CREATE OR REPLACE FUNCTION ensure_month_partitions(parent regclass, first_day date, last_day date)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  parent_schema text;
+  parent_name text;
+  month date := date_trunc('month', first_day)::date;
+  next_month date;
+  part text;
+  created integer := 0;
+BEGIN
+  SELECT n.nspname, c.relname INTO parent_schema, parent_name
+  FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+  WHERE c.oid = parent AND c.relkind = 'p';
+  IF parent_name IS NULL THEN
+    RETURN 0;
+  END IF;
+
+  IF to_regclass(format('%I.%I', parent_schema, parent_name || '_default')) IS NULL THEN
+    EXECUTE format('CREATE TABLE %I.%I PARTITION OF %s DEFAULT', parent_schema, parent_name || '_default', parent);
+    -- Partitions are reachable directly through the API too; the parent's policies cover reads
+    EXECUTE format('ALTER TABLE %I.%I ENABLE ROW LEVEL SECURITY', parent_schema, parent_name || '_default');
+  END IF;
+
+  WHILE month <= last_day LOOP
+    next_month := (month + INTERVAL '1 month')::date;
+    part := parent_name || '_p' || to_char(month, 'YYYY_MM');
+    IF to_regclass(format('%I.%I', parent_schema, part)) IS NULL THEN
+      -- Built detached so the month's rows can be moved out of the default partition first
+      EXECUTE format('CREATE TABLE %I.%I (LIKE %s INCLUDING DEFAULTS)', parent_schema, part, parent);
+      EXECUTE format(
+        'WITH moved AS (DELETE FROM %I.%I WHERE captured_on >= %L AND captured_on < %L RETURNING *) '
+        'INSERT INTO %I.%I SELECT * FROM moved',
+        parent_schema, parent_name || '_default', month, next_month, parent_schema, part
+      );
+      EXECUTE format(
+        'ALTER TABLE %s ATTACH PARTITION %I.%I FOR VALUES FROM (%L) TO (%L)',
+        parent, parent_schema, part, month, next_month
+      );
+      EXECUTE format('ALTER TABLE %I.%I ENABLE ROW LEVEL SECURITY', parent_schema, part);
+      created := created + 1;
+    END IF;
+    month := next_month;
+  END LOOP;
+  RETURN created;
+END $$;
+
+SELECT ensure_month_partitions(t::regclass, (current_date - INTERVAL '1 month')::date, (current_date + INTERVAL '3 months')::date)
+FROM unnest(ARRAY['ranks_daily', 'metrics_daily', 'episode_metrics_daily', 'podcast_listen_metrics_daily']) AS t;
+
+-- Tiered retention (scripts/retention.py): daily rows older than RETENTION_DAILY_DAYS are
+-- folded into 'week' rows (Monday to Sunday, split where a month ends so months fold
+-- exactly), and week rows older than RETENTION_WEEKLY_DAYS into 'month' rows. A summary
+-- covers [period_start, period_end); `days` counts the daily rows it stands for, and
+-- averages are weighted by it when summaries are merged.
+CREATE TABLE IF NOT EXISTS metrics_rollup (
+  podcast_id TEXT REFERENCES podcasts(id),
+  grain TEXT NOT NULL CHECK (grain IN ('week', 'month')),
+  period_start DATE NOT NULL,
+  period_end DATE NOT NULL,
+  days INTEGER NOT NULL,
+  rank DOUBLE PRECISION,  -- mean daily rank
+  best_rank INTEGER,
+  delta_7d DOUBLE PRECISION,
+  delta_30d DOUBLE PRECISION,
+  momentum_score DOUBLE PRECISION,
+  PRIMARY KEY (podcast_id, grain, period_start)
+);
+
+CREATE TABLE IF NOT EXISTS ranks_rollup (
+  podcast_id TEXT REFERENCES podcasts(id),
+  source TEXT NOT NULL,
+  country TEXT NOT NULL,
+  grain TEXT NOT NULL CHECK (grain IN ('week', 'month')),
+  period_start DATE NOT NULL,
+  period_end DATE NOT NULL,
+  days INTEGER NOT NULL,
+  rank DOUBLE PRECISION,
+  best_rank INTEGER,
+  PRIMARY KEY (podcast_id, source, country, grain, period_start)
+);
+
+CREATE TABLE IF NOT EXISTS episode_metrics_rollup (
+  episode_id TEXT REFERENCES episodes(id) ON DELETE CASCADE,
+  grain TEXT NOT NULL CHECK (grain IN ('week', 'month')),
+  period_start DATE NOT NULL,
+  period_end DATE NOT NULL,
+  days INTEGER NOT NULL,
+  total_listen_time_seconds BIGINT,
+  unique_listeners INTEGER,  -- busiest day; listeners can't be summed across days
+  completion_rate DOUBLE PRECISION,
+  is_new_episode BOOLEAN,
+  PRIMARY KEY (episode_id, grain, period_start)
+);
+
+ALTER TABLE metrics_rollup ENABLE ROW LEVEL SECURITY;
+ALTER TABLE ranks_rollup ENABLE ROW LEVEL SECURITY;
+ALTER TABLE episode_metrics_rollup ENABLE ROW LEVEL SECURITY;
+
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to metrics_rollup" ON metrics_rollup FOR SELECT USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to ranks_rollup" ON ranks_rollup FOR SELECT USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to episode_metrics_rollup" ON episode_metrics_rollup FOR SELECT USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- stripe_events: verified webhook events queued for the subscription worker.
+-- Keyed by Stripe event id so redelivered events are stored once.
+CREATE TABLE IF NOT EXISTS stripe_events (
+  id TEXT PRIMARY KEY,  -- Stripe event id (evt_...)
+  type TEXT NOT NULL,
+  subscription_key TEXT NOT NULL,  -- events with the same key are applied in order
+  payload JSONB NOT NULL,
+  event_created TIMESTAMPTZ NOT NULL,  -- Stripe's event.created
+  status TEXT NOT NULL DEFAULT 'pending',  -- pending, processed, failed
+  attempts INTEGER NOT NULL DEFAULT 0,
+  last_error TEXT,
+  next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  received_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  processed_at TIMESTAMPTZ
+);
+
+-- Enable RLS on stripe_events (no policies: backend only)
+ALTER TABLE stripe_events ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_stripe_events_pending ON stripe_events(event_created, id) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_stripe_events_key ON stripe_events(subscription_key, event_created) WHERE status = 'pending';
+
+-- Partial index used by the alert engine to probe enabled alerts per podcast
+CREATE INDEX IF NOT EXISTS idx_user_alerts_enabled ON user_alerts(podcast_id, alert_type)
+  INCLUDE (threshold, user_id) WHERE enabled;
+
+-- alert_events: alerts fired by scripts/alerts.py, at most once per alert per day
+CREATE TABLE IF NOT EXISTS alert_events (
+  id BIGSERIAL PRIMARY KEY,
+  alert_id UUID NOT NULL REFERENCES user_alerts(id) ON DELETE CASCADE,
+  user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+  podcast_id TEXT REFERENCES podcasts(id) ON DELETE CASCADE,
+  alert_type TEXT NOT NULL,
+  fired_on DATE NOT NULL,
+  payload JSONB,  -- rank, momentum or episode details at the time it fired
+  created_at TIMESTAMPTZ DEFAULT now(),
+  delivered_at TIMESTAMPTZ,
+  UNIQUE (alert_id, fired_on)
+);
+
+-- Enable RLS on alert_events
+ALTER TABLE alert_events ENABLE ROW LEVEL SECURITY;
+
+-- Users can only view their own alert events
+DO $$ BEGIN
+  CREATE POLICY "Users can view own alert events" ON alert_events
+    FOR SELECT
+    USING (auth.uid() = user_id);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_alert_events_undelivered ON alert_events(id) WHERE delivered_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_alert_events_user ON alert_events(user_id, fired_on);
+
+-- metrics_dirty: rank rows written for past days whose downstream metrics
+-- (the days that use them as a reference) have not been recomputed yet.
+-- Drained by scripts/recompute.py dirty.
+CREATE TABLE IF NOT EXISTS metrics_dirty (
+  podcast_id TEXT NOT NULL,
+  captured_on DATE NOT NULL,  -- day whose rank changed
+  marked_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (podcast_id, captured_on)
+);
+
+-- Enable RLS on metrics_dirty (no policies: backend only)
+ALTER TABLE metrics_dirty ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_metrics_dirty_date ON metrics_dirty(captured_on, podcast_id);
+
+-- genres: ListenNotes genre tree, cached by scripts/genres.py
+CREATE TABLE IF NOT EXISTS genres (
+  id INTEGER PRIMARY KEY,  -- ListenNotes genre_id
+  name TEXT NOT NULL,
+  parent_id INTEGER,
+  depth INTEGER NOT NULL,  -- 1 = top-level genre
+  fetched_at TIMESTAMPTZ NOT NULL DEFAULT now(),  -- catalog refreshed after LISTENNOTES_GENRES_TTL_HOURS
+  last_ingested_on DATE  -- last day this genre's chart was ingested; drives the long-tail schedule
+);
+
+-- Enable RLS on genres
+ALTER TABLE genres ENABLE ROW LEVEL SECURITY;
+
+-- Allow public read access to genres
+DO $$ BEGIN
+  CREATE POLICY "Allow public read access to genres" ON genres
+    FOR SELECT
+    USING (true);
+EXCEPTION WHEN duplicate_object THEN NULL;
+END $$;
+
+-- ingest_runs / ingest_tasks: ledger of scripts/ingest.py runs, one task per
+-- region x category x page, so a failed run resumes where it stopped
+CREATE TABLE IF NOT EXISTS ingest_runs (
+  id BIGSERIAL PRIMARY KEY,
+  captured_on DATE NOT NULL,
+  status TEXT NOT NULL DEFAULT 'fetching',  -- fetching, fetched, loaded, complete
+  settings JSONB NOT NULL,  -- regions, categories, limit and depth the tasks were planned with
+  last_error TEXT,
+  started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  finished_at TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS ingest_tasks (
+  run_id BIGINT NOT NULL REFERENCES ingest_runs(id) ON DELETE CASCADE,
+  region TEXT NOT NULL,
+  genre_id INTEGER,  -- NULL = overall chart
+  category TEXT NOT NULL,
+  page INTEGER NOT NULL,
+  status TEXT NOT NULL DEFAULT 'pending',  -- pending, done, skipped, failed
+  attempts INTEGER NOT NULL DEFAULT 0,
+  payload JSONB,  -- API response, cleared once loaded
+  item_count INTEGER,
+  last_page BOOLEAN NOT NULL DEFAULT false,  -- short page: the chart ends here
+  last_error TEXT,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (run_id, region, category, page)
+);
+
+-- Enable RLS on the ingest ledger (no policies: backend only)
+ALTER TABLE ingest_runs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE ingest_tasks ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_ingest_runs_date ON ingest_runs(captured_on, id);
+CREATE INDEX IF NOT EXISTS idx_ingest_tasks_pending ON ingest_tasks(run_id) WHERE status = 'pending';
+
+-- ingest_run_stats: telemetry of each ingestion script invocation (scripts/telemetry.py)
+CREATE TABLE IF NOT EXISTS ingest_run_stats (
+  id BIGSERIAL PRIMARY KEY,
+  script TEXT NOT NULL,  -- ingest, ingest_episodes
+  run_id BIGINT REFERENCES ingest_runs(id) ON DELETE SET NULL,
+  captured_on DATE NOT NULL,
+  started_at TIMESTAMPTZ NOT NULL,
+  wall_seconds DOUBLE PRECISION NOT NULL,
+  status TEXT NOT NULL,  -- ok, incomplete, failed
+  stats JSONB NOT NULL  -- stages, db_seconds, http counters, rows written
+);
+
+-- Enable RLS on ingest_run_stats (no policies: backend only)
+ALTER TABLE ingest_run_stats ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_ingest_run_stats_started ON ingest_run_stats(started_at, script);
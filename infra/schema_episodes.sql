@@ -7,10 +7,13 @@ CREATE TABLE IF NOT EXISTS episodes (
   audio_url TEXT,
   audio_length_seconds INTEGER,  -- Episode duration in seconds
   published_at TIMESTAMPTZ,  -- When episode was published
+  content_hash TEXT,  -- md5 of the columns ingest writes
   created_at TIMESTAMPTZ DEFAULT now(),
   updated_at TIMESTAMPTZ DEFAULT now()
 );
 
+ALTER TABLE episodes ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
 -- Enable RLS on episodes
 ALTER TABLE episodes ENABLE ROW LEVEL SECURITY;
 
@@ -31,7 +34,13 @@ CREATE TABLE IF NOT EXISTS episode_metrics_daily (
   episode_age_days INTEGER,  -- Days since publication
   is_new_episode BOOLEAN DEFAULT false,  -- Published within last 7 days
   PRIMARY KEY (episode_id, captured_on)
-);
+) PARTITION BY RANGE (captured_on);
+
+-- Rows land here until scripts/partitions.py maintain creates their month
+DO $$ BEGIN
+  CREATE TABLE IF NOT EXISTS episode_metrics_daily_default PARTITION OF episode_metrics_daily DEFAULT;
+EXCEPTION WHEN wrong_object_type THEN NULL;  -- created unpartitioned; see partitions.py migrate
+END $$;
 
 -- Enable RLS on episode_metrics_daily
 ALTER TABLE episode_metrics_daily ENABLE ROW LEVEL SECURITY;
@@ -56,7 +65,13 @@ CREATE TABLE IF NOT EXISTS podcast_listen_metrics_daily (
   -- Engagement score (composite metric)
   engagement_score DOUBLE PRECISION,  -- Composite score based on listen time, listeners, new episodes
   PRIMARY KEY (podcast_id, captured_on)
-);
+) PARTITION BY RANGE (captured_on);
+
+-- Rows land here until scripts/partitions.py maintain creates their month
+DO $$ BEGIN
+  CREATE TABLE IF NOT EXISTS podcast_listen_metrics_daily_default PARTITION OF podcast_listen_metrics_daily DEFAULT;
+EXCEPTION WHEN wrong_object_type THEN NULL;  -- created unpartitioned; see partitions.py migrate
+END $$;
 
 -- Enable RLS on podcast_listen_metrics_daily
 ALTER TABLE podcast_listen_metrics_daily ENABLE ROW LEVEL SECURITY;